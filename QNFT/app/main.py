@@ -1,12 +1,29 @@
 import os
-from flask import Flask, request, jsonify, send_from_directory, render_template # Added render_template
+import time
+import datetime
+from flask import Flask, request, jsonify, send_from_directory, render_template, Response, stream_with_context, url_for # Added render_template
 # Corrected import path assuming 'app' is the root for Python's import resolution
 # when running from QNFT directory (e.g. python -m app.main)
 # or if QNFT/app is in PYTHONPATH.
 from .services.image_upload_service import handle_image_upload
 from .services.gif_generator import generate_nft_gif
 from .services.solana_service import mint_qnft as mint_qnft_service
-from .services.market_service import get_marketplace_nfts, get_price_chart_data, add_minted_nft_to_market # Added market service and add_minted_nft_to_market
+from .services.market_service import get_marketplace_nfts_filtered, iter_marketplace_nfts, get_marketplace_stats, get_rarest_nfts, get_leaderboard, get_wallet_leaderboard_entry, get_price_chart_data, add_minted_nft_to_market, configure_market_store, start_market_poller, DEFAULT_PAGE_SIZE, DEFAULT_CHART_POINTS # Added market service and add_minted_nft_to_market
+from .services.market_query import FILTER_KEYS as MARKET_FILTER_KEYS
+from .services.storage_service import get_storage
+from .services.price_fetcher import get_prices_with_age, get_price_fetcher_stats, start_price_refresher, configure_shared_cache as configure_shared_price_cache, configure_hedged_providers, SOL_USDC_KEY
+from .services.price_history import configure_price_history, get_price_ohlc, ROLLUP_RESOLUTIONS
+from .services.serial_allocator import configure_serial_allocator
+from .services.live_events import get_channel, PRICES_CHANNEL, MARKETPLACE_CHANNEL
+from .services.resumable_upload_service import init_resumable_upload, store_upload_chunk, get_upload_status, finalize_resumable_upload
+from .utils.wire_format import JSON_MIMETYPE, COLUMNAR_MIMETYPE, BINARY_MIMETYPE, columnar_records, columnar_chart, binary_chart
+from .utils.compression import compress_response
+from .utils.json_stream import stream_json_array
+from .utils.logging_config import configure_logging
+
+# Queue-based logging for the whole app: request threads never wait on log I/O.
+# Levels: QNFT_LOG_LEVEL (default INFO) and QNFT_LOG_LEVELS, e.g. "app.services.solana_service=DEBUG".
+configure_logging()
 
 app = Flask(__name__)
 
@@ -27,7 +44,52 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(STATIC_FOLDER_GIFS, exist_ok=True)
 
+# Background price refresher: keeps BTC/SOL prices warm so GIF rendering and minting
+# never wait on CoinGecko. Set QNFT_PRICE_REFRESHER=0 to disable it.
+app.config['PRICE_REFRESHER_ENABLED'] = os.environ.get('QNFT_PRICE_REFRESHER', '1') != '0'
+
+# Price cache shared by all worker processes on this node; it also keeps prices across
+# restarts. Set QNFT_PRICE_CACHE_DB to another path, or to an empty string to disable it.
+app.config['PRICE_CACHE_DB'] = os.environ.get('QNFT_PRICE_CACHE_DB', os.path.join(PROJECT_ROOT, 'data', 'price_cache.sqlite3'))
+# Every fetched price is recorded here and the price chart is served from it.
+app.config['PRICE_HISTORY_DIR'] = os.environ.get('QNFT_PRICE_HISTORY_DIR', os.path.join(PROJECT_ROOT, 'data', 'price_history'))
+# Minted NFTs, persisted and shared by all workers. Set QNFT_MARKET_DB to an empty string
+# to keep them in memory (with dummy NFTs for demos) instead. NFT serials ("QNFT #0042")
+# are reserved in the same database, so they stay unique across workers and restarts.
+app.config['MARKET_DB'] = os.environ.get('QNFT_MARKET_DB', os.path.join(PROJECT_ROOT, 'data', 'market.sqlite3'))
+
+@app.before_request
+def _configure_runtime_services():
+    # Configured lazily in the serving process (after gunicorn forks its workers), never in tests
+    if app.config.get('TESTING'):
+        return
+    configure_shared_price_cache(app.config['PRICE_CACHE_DB'] or None)
+    configure_hedged_providers() # QNFT_PRICE_PROVIDERS (optional)
+    configure_price_history(app.config['PRICE_HISTORY_DIR'] or None)
+    configure_market_store(app.config['MARKET_DB'] or None)
+    configure_serial_allocator(app.config['MARKET_DB'] or None)
+    if app.config['MARKET_DB']:
+        start_market_poller() # Other workers' mints reach this worker's live streams
+    if app.config['PRICE_REFRESHER_ENABLED']:
+        start_price_refresher()
+
 # --- HTML Serving Routes ---
+@app.after_request
+def _compress_response(response):
+    # gzip (or brotli, when installed) for API bodies, as the client accepts; streams are left alone
+    return compress_response(response, request.accept_encodings)
+
+def _negotiated_format(formats):
+    """The response format the client prefers among formats (JSON unless it asks for another)."""
+    return request.accept_mimetypes.best_match(formats, default=JSON_MIMETYPE) or JSON_MIMETYPE
+
+def _negotiated_response(body, mimetype):
+    """A response of body (JSON-encoded unless it is bytes) in the format negotiated from Accept."""
+    response = Response(body, mimetype=mimetype) if isinstance(body, bytes) else jsonify(body)
+    response.mimetype = mimetype
+    response.vary.add('Accept')
+    return response
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -71,6 +133,67 @@ def upload_image_route():
         else:
             return jsonify(result), 500
 
+# --- Resumable (chunked) uploads: init -> PUT chunks -> finalize ---
+def _resumable_error_status(result):
+    """Maps a resumable upload service error to an HTTP status code."""
+    message = result.get('message', '')
+    if "File type not allowed" in message:
+        return 415
+    if "exceeds maximum size" in message:
+        return 413
+    if "not found" in message:
+        return 404
+    if "incomplete" in message or "already finalized" in message:
+        return 409
+    if "Invalid" in message or "No file selected" in message:
+        return 400
+    return 500
+
+@app.route('/upload_image/resumable', methods=['POST'])
+def init_resumable_upload_route():
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'status': 'error', 'message': 'No JSON data provided.'}), 400
+
+    result = init_resumable_upload(
+        filename=data.get('filename'),
+        total_size=data.get('total_size'),
+        upload_folder=app.config['UPLOAD_FOLDER'],
+        allowed_extensions=ALLOWED_EXTENSIONS,
+        max_size_bytes=app.config['MAX_CONTENT_LENGTH'],
+        chunk_size=data.get('chunk_size')
+    )
+    if result['status'] == 'success':
+        return jsonify(result), 201
+    return jsonify(result), _resumable_error_status(result)
+
+@app.route('/upload_image/resumable/<upload_id>/chunks/<int:chunk_index>', methods=['PUT'])
+def upload_chunk_route(upload_id, chunk_index):
+    # The chunk is the raw request body (application/octet-stream)
+    result = store_upload_chunk(upload_id, chunk_index, request.get_data(), app.config['UPLOAD_FOLDER'])
+    if result['status'] == 'success':
+        return jsonify(result), 200
+    return jsonify(result), _resumable_error_status(result)
+
+@app.route('/upload_image/resumable/<upload_id>', methods=['GET'])
+def resumable_upload_status_route(upload_id):
+    result = get_upload_status(upload_id, app.config['UPLOAD_FOLDER'])
+    if result['status'] == 'success':
+        return jsonify(result), 200
+    return jsonify(result), _resumable_error_status(result)
+
+@app.route('/upload_image/resumable/<upload_id>/finalize', methods=['POST'])
+def finalize_resumable_upload_route(upload_id):
+    result = finalize_resumable_upload(
+        upload_id,
+        upload_folder=app.config['UPLOAD_FOLDER'],
+        allowed_extensions=ALLOWED_EXTENSIONS,
+        max_size_bytes=app.config['MAX_CONTENT_LENGTH']
+    )
+    if result['status'] == 'success':
+        return jsonify({'status': 'success', 'file_id': result['file_id'], 'message': 'Image uploaded successfully. Ready for GIF generation.'}), 200
+    return jsonify(result), _resumable_error_status(result)
+
 @app.route('/generate_gif/<image_id>', methods=['GET'])
 def generate_gif_route(image_id):
     if not image_id:
@@ -97,7 +220,8 @@ def generate_gif_route(image_id):
         return jsonify({
             'status': 'success',
             'message': 'GIF generated successfully.',
-            'gif_url': f"/static/{gif_result['relative_gif_path']}", # This is a common way to serve static files
+            # Remote stores (S3) hand out their own URL; local GIFs are served from the static folder
+            'gif_url': gif_result.get('gif_url') or f"/static/{gif_result['relative_gif_path']}",
             'gif_server_path': gif_result['gif_path'] # For reference or other uses
         }), 200
     else:
@@ -128,25 +252,27 @@ def mint_nft_route():
     if mint_type not in ["short", "long"]:
         return jsonify({'status': 'error', 'message': 'Invalid mint_type. Must be "short" or "long".'}), 400
 
-    # Construct the full local path to the GIF if not already full
+    # Both assets are looked up by name in their stores (local folders or S3 prefixes).
     # This logic assumes STATIC_FOLDER_GIFS is the base for these GIFs.
     # If gif_server_path_from_client is already an absolute path, os.path.join might not behave as expected on its own.
-    # A safer way: check if it's absolute. If not, join with STATIC_FOLDER_GIFS.
-    if not os.path.isabs(gif_server_path_from_client):
-        local_gif_path = os.path.join(STATIC_FOLDER_GIFS, os.path.basename(gif_server_path_from_client))
-    else:
+    # A safer way: check if it's absolute. If not, look it up by basename in the GIF store.
+    # (S3 locations like s3://bucket/generated_gifs/x.gif are not absolute paths, so they take this branch.)
+    if os.path.isabs(gif_server_path_from_client):
         # If client sends an absolute path, verify it's within the allowed directory to prevent security issues.
         if not gif_server_path_from_client.startswith(STATIC_FOLDER_GIFS):
             return jsonify({'status': 'error', 'message': 'Invalid gif_server_path.'}), 400
-        local_gif_path = gif_server_path_from_client
+    gif_store = get_storage(STATIC_FOLDER_GIFS)
+    gif_key = os.path.basename(gif_server_path_from_client)
+    local_gif_path = gif_store.uri(gif_key)
         
-    if not os.path.exists(local_gif_path):
+    if not gif_store.exists(gif_key):
          return jsonify({'status': 'error', 'message': f'GIF not found at specified path: {local_gif_path}'}), 404
 
     # We also need the original uploaded image path. image_id is typically the filename.
-    # The original image is in UPLOAD_FOLDER.
-    uploaded_image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_id)
-    if not os.path.exists(uploaded_image_path):
+    # The original image is in the upload store (UPLOAD_FOLDER locally).
+    upload_store = get_storage(app.config['UPLOAD_FOLDER'])
+    uploaded_image_path = upload_store.uri(image_id)
+    if not upload_store.exists(image_id):
          return jsonify({'status': 'error', 'message': f'Original uploaded image not found: {uploaded_image_path}'}), 404
 
     minting_result = mint_qnft_service(
@@ -167,10 +293,12 @@ def mint_nft_route():
             'name': raw_meta.get('name'),
             'gif_url': raw_meta.get('animation_url'), # This is the arweave/ipfs URL
             'mint_type': mint_type, # This was input to mint_nft_route
-            'mint_timestamp_iso': raw_meta.get('attributes', [{}])[1].get('value') if len(raw_meta.get('attributes',[])) > 1 else datetime.datetime.now(datetime.timezone.utc).isoformat(), # Extract from attributes or use now
+            'mint_timestamp_iso': minting_result.get('mint_timestamp_iso') or datetime.datetime.now(datetime.timezone.utc).isoformat(), # ISO-8601 UTC, as the chart and stats parse it
             'btc_price_at_mint': next((attr['value'] for attr in raw_meta.get('attributes', []) if attr.get('trait_type') == "BTC Price at Mint"), None),
             'sol_price_at_mint': next((attr['value'] for attr in raw_meta.get('attributes', []) if attr.get('trait_type') == "SOL Price at Mint"), None),
-            'original_image_url': raw_meta.get('properties', {}).get('files', [{},{}])[1].get('uri') if len(raw_meta.get('properties', {}).get('files',[])) > 1 else None
+            'original_image_url': raw_meta.get('properties', {}).get('files', [{},{}])[1].get('uri') if len(raw_meta.get('properties', {}).get('files',[])) > 1 else None,
+            'owner_wallet': minting_result.get('owner_wallet'), # Counted on the leaderboard
+            'mint_fee_sol': minting_result.get('mint_fee_sol')
         }
         # Ensure prices are floats if they are strings in metadata
         if market_nft_data['btc_price_at_mint'] is not None:
@@ -188,11 +316,126 @@ def mint_nft_route():
     else: # General internal errors during minting
         return jsonify(minting_result), 500
 
+@app.route('/prices/current', methods=['GET'])
+def current_prices_route():
+    # Always answered from cache (never waits on the price API); each price carries its age
+    return jsonify({'prices': get_prices_with_age()}), 200
+
+@app.route('/prices/stream', methods=['GET'])
+def price_stream_route():
+    # Server-sent events: a snapshot of current prices, then price ticks and mint events as they happen.
+    # EventSource reconnects with Last-Event-ID and receives only the events it missed.
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    stream = get_channel(PRICES_CHANNEL).stream(
+        last_event_id=last_event_id,
+        initial_events=[('snapshot', {'prices': get_prices_with_age()})]
+    )
+    return _event_stream_response(stream)
+
+def _event_stream_response(stream):
+    return Response(stream_with_context(stream), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # Don't let nginx buffer the stream
+    })
+
+@app.route('/prices/stats', methods=['GET'])
+def price_fetcher_stats_route():
+    # Circuit breaker state and upstream latency, for monitoring the price API dependency
+    return jsonify(get_price_fetcher_stats()), 200
+
 # --- Marketplace and Chart API Endpoints (already exist from previous step) ---
 @app.route('/marketplace/nfts', methods=['GET'])
 def marketplace_nfts_route():
-    nfts = get_marketplace_nfts()
-    return jsonify(nfts), 200
+    # Keyset-paginated: the body is one page (a list, newest first by default). The cursor for
+    # the following page is in the X-Next-Cursor header and a Link rel="next" header.
+    # Optional filters: mint_type (repeatable), btc_price_min/max, sol_price_min/max,
+    # minted_after/before (epoch ms), rarity_min/max (tier-gated by the `wallet` parameter).
+    sort_by = request.args.get('sort', 'mint_time')
+    order = request.args.get('order', 'desc')
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid limit. Must be an integer.'}), 400
+    filters = {}
+    if request.args.getlist('mint_type'):
+        filters['mint_type'] = request.args.getlist('mint_type')
+    for key in MARKET_FILTER_KEYS:
+        if key != 'mint_type' and key in request.args:
+            try:
+                filters[key] = float(request.args[key])
+            except ValueError:
+                return jsonify({'status': 'error', 'message': f'Invalid {key}. Must be a number.'}), 400
+
+    result = get_marketplace_nfts_filtered(filters=filters, sort_by=sort_by, user_wallet_address=request.args.get('wallet'),
+                                           order=order, limit=limit, cursor=request.args.get('cursor'))
+    if result['status'] != 'success':
+        return jsonify(result), 400
+    response_format = _negotiated_format((JSON_MIMETYPE, COLUMNAR_MIMETYPE))
+    response = _negotiated_response(columnar_records(result['items']) if response_format == COLUMNAR_MIMETYPE else result['items'], response_format)
+    if result['next_cursor']:
+        response.headers['X-Next-Cursor'] = result['next_cursor']
+        next_args = dict(request.args.to_dict(flat=False), cursor=result['next_cursor']) # Same filters and sort, next position
+        next_url = url_for('marketplace_nfts_route', **next_args)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response, 200
+
+@app.route('/marketplace/nfts/all', methods=['GET'])
+def marketplace_all_nfts_route():
+    # Every NFT, in mint order, as one JSON array streamed batch by batch from the store:
+    # memory stays one batch and the first bytes go out before the whole market is read
+    return Response(stream_with_context(stream_json_array(iter_marketplace_nfts())), mimetype='application/json')
+
+@app.route('/marketplace/stream', methods=['GET'])
+def marketplace_stream_route():
+    # Server-sent events: one 'nft' event per NFT added to the marketplace, so pages add new NFTs
+    # instead of reloading the list. EventSource reconnects with Last-Event-ID and receives only
+    # the NFTs it missed ('resync' if they are no longer buffered). Event ids are store seqs, so
+    # this works on any worker; other workers' NFTs arrive through the per-process market poller.
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    stream = get_channel(MARKETPLACE_CHANNEL).stream(last_event_id=last_event_id)
+    return _event_stream_response(stream)
+
+@app.route('/marketplace/rarest', methods=['GET'])
+def marketplace_rarest_route():
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid limit. Must be an integer.'}), 400
+    result = get_rarest_nfts(limit=limit)
+    if result['status'] != 'success':
+        return jsonify(result), 400
+    return jsonify(result['items']), 200
+
+@app.route('/leaderboard', methods=['GET'])
+def leaderboard_route():
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid limit. Must be an integer.'}), 400
+    if not 1 <= limit <= 100:
+        return jsonify({'status': 'error', 'message': 'Invalid limit. Must be between 1 and 100.'}), 400
+    return jsonify(get_leaderboard(limit=limit)), 200
+
+@app.route('/leaderboard/<wallet>', methods=['GET'])
+def wallet_leaderboard_route(wallet):
+    entry = get_wallet_leaderboard_entry(wallet)
+    if entry is None:
+        return jsonify({'status': 'error', 'message': 'Wallet has no minted NFTs.'}), 404
+    return jsonify(entry), 200
+
+@app.route('/marketplace/stats', methods=['GET'])
+def marketplace_stats_route():
+    # Window is start/end in epoch ms (both optional; default: the last 24 hours)
+    try:
+        start_ms = int(request.args['start']) if 'start' in request.args else None
+        end_ms = int(request.args['end']) if 'end' in request.args else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid start or end. Must be epoch milliseconds.'}), 400
+
+    result = get_marketplace_stats(start_ms=start_ms, end_ms=end_ms)
+    if result['status'] != 'success':
+        return jsonify(result), 400
+    return jsonify(result['stats']), 200
 
 @app.route('/chart/price_data', methods=['GET'])
 def price_chart_data_route():
@@ -203,9 +446,36 @@ def price_chart_data_route():
             return jsonify({'status': 'error', 'message': 'time_range_hours must be positive.'}), 400
     except ValueError:
         return jsonify({'status': 'error', 'message': 'Invalid time_range_hours format. Must be an integer.'}), 400
-    
-    chart_data = get_price_chart_data(time_range_hours=time_range_hours)
-    return jsonify(chart_data), 200
+    try:
+        max_points = int(request.args.get('max_points', DEFAULT_CHART_POINTS))
+        if max_points < 3:
+            return jsonify({'status': 'error', 'message': 'max_points must be at least 3.'}), 400
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid max_points format. Must be an integer.'}), 400
+
+    chart_data = get_price_chart_data(time_range_hours=time_range_hours, max_points=max_points)
+    # Plain JSON by default; columnar JSON or the binary typed-array format if the client asks for it
+    encoders = {JSON_MIMETYPE: lambda data: data, COLUMNAR_MIMETYPE: columnar_chart, BINARY_MIMETYPE: binary_chart}
+    response_format = _negotiated_format(tuple(encoders))
+    return _negotiated_response(encoders[response_format](chart_data), response_format), 200
+
+@app.route('/chart/ohlc', methods=['GET'])
+def price_ohlc_route():
+    """SOL/USDC OHLC bars: [[bar_start_ms, open, high, low, close], ...] at ?resolution= (1m, 15m, 1h, 1d)."""
+    resolutions = [name for name, _ in ROLLUP_RESOLUTIONS]
+    resolution = request.args.get('resolution', '1h')
+    if resolution not in resolutions:
+        return jsonify({'status': 'error', 'message': f"resolution must be one of: {', '.join(resolutions)}."}), 400
+    try:
+        time_range_hours = int(request.args.get('time_range_hours', '24'))
+        if time_range_hours <= 0:
+            return jsonify({'status': 'error', 'message': 'time_range_hours must be positive.'}), 400
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid time_range_hours format. Must be an integer.'}), 400
+
+    end_ts = time.time()
+    bars = get_price_ohlc(SOL_USDC_KEY, resolution, end_ts - time_range_hours * 3600, end_ts)
+    return jsonify({'resolution': resolution, 'bars': bars}), 200
 
 
 # Optional: A route to serve the generated GIFs if they are in app.static_folder
@@ -0,0 +1,109 @@
+# QNFT/app/services/chart_cache.py
+import threading
+import collections
+import numpy as np
+
+# In-memory cache of price chart responses for the ranges the chart page keeps reloading.
+# A response is split at the last closed 15-minute bucket boundary: everything up to it
+# (the window) is cached per (range, max_points), and only the open bucket after it is
+# read per request. When a bucket closes, the window slides: points and mint events that
+# fell out of the range are dropped and the closed bucket's are appended, instead of the
+# whole range being read again. Mints that land inside a cached window later (back-dated
+# NFTs, other workers) are picked up from the store's rows_after(seq) like the market indexes.
+BUCKET_SECONDS = 15 * 60
+MAX_WINDOWS = 32 # Least recently used windows are dropped beyond this
+
+
+class ChartWindow:
+    """Cached chart points and mint events of one range, up to a bucket boundary."""
+
+    def __init__(self, range_seconds, bucket_end, resolution, points, events, series, closed_points):
+        self.range_seconds = range_seconds
+        self.built_at = bucket_end # Once the window has slid a whole range, it is rebuilt
+        self.bucket_end = bucket_end
+        self.resolution = resolution # Price history resolution it was read from ('raw' or a rollup)
+        self.timestamps_ms, self.prices = points # Sorted NumPy arrays
+        self.events = events # Mint events, oldest first
+        self.series = series # The PriceSeries read, and how many of its points were at or before bucket_end
+        self.closed_points = closed_points
+        self.pending = [] # Format: [(seq, mint_ms)] for NFTs minted inside the window since it was read
+
+    @property
+    def start_ms(self):
+        return int((self.bucket_end - self.range_seconds) * 1000)
+
+    @property
+    def end_ms(self):
+        return int(self.bucket_end * 1000)
+
+    def add_points(self, points):
+        """Merges (timestamps_ms, prices) into the window's points, keeping them sorted and unique."""
+        timestamps_ms, first = np.unique(np.concatenate((self.timestamps_ms, points[0])), return_index=True)
+        self.timestamps_ms, self.prices = timestamps_ms, np.concatenate((self.prices, points[1]))[first]
+
+    def add_events(self, events):
+        new_events = [event for event in events if event not in self.events]
+        if new_events:
+            self.events = sorted(self.events + new_events, key=lambda event: event['timestamp'])
+
+    def slide(self, bucket_end, points, events, closed_points):
+        """Moves the window's end to bucket_end, appending the points and events of the buckets that closed."""
+        self.bucket_end = bucket_end
+        self.closed_points = closed_points
+        kept = np.searchsorted(self.timestamps_ms, self.start_ms)
+        self.timestamps_ms, self.prices = self.timestamps_ms[kept:], self.prices[kept:]
+        self.add_points(points)
+        self.events = [event for event in self.events if event['timestamp'] >= self.start_ms] + events
+        self.pending = [(seq, mint_ms) for seq, mint_ms in self.pending if mint_ms >= self.start_ms]
+
+    def snapshot(self):
+        """Returns (resolution, timestamps_ms, prices, events); later updates don't change it."""
+        return self.resolution, self.timestamps_ms, self.prices, list(self.events)
+
+
+class ChartCache:
+    """Chart windows by key, least recently used first. Callers hold `lock` while using a window."""
+
+    def __init__(self, max_windows=MAX_WINDOWS):
+        self.max_windows = max_windows
+        self.lock = threading.RLock()
+        self._windows = collections.OrderedDict()
+        self._last_seq = -1 # Newest store seq already checked against the windows
+
+    def __len__(self):
+        return len(self._windows)
+
+    def get(self, key):
+        with self.lock:
+            window = self._windows.get(key)
+            if window is not None:
+                self._windows.move_to_end(key)
+            return window
+
+    def put(self, key, window):
+        with self.lock:
+            self._windows[key] = window
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+
+    def sync(self, store):
+        """Notes, for every window, the NFTs added to store since the last sync that were minted inside it."""
+        with self.lock:
+            for seq, mint_ms, *_ in store.rows_after(self._last_seq):
+                self._last_seq = seq
+                if mint_ms is None:
+                    continue
+                for window in self._windows.values():
+                    if window.start_ms <= mint_ms <= window.end_ms:
+                        window.pending.append((seq, mint_ms))
+
+    def take_pending(self, window):
+        with self.lock:
+            pending, window.pending = window.pending, []
+            return pending
+
+    def clear(self):
+        with self.lock:
+            self._windows.clear()
+            self._last_seq = -1
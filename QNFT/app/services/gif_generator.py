@@ -1,27 +1,40 @@
 import os
+import logging
 from PIL import Image, ImageDraw, ImageFont # Pillow for image manipulation, ImageFont added
 import datetime # Added for timestamp
+import contextlib
 # Assuming utils are in the python path or PYTHONPATH is set up correctly for app.
 from app.utils.quantum_effects import apply_quantum_transformation, generate_quantum_surroundings, transform_elements
 from app.utils.animation_utils import apply_fibonacci_animation
-from app.services.price_fetcher import get_btc_usdc_price, get_sol_usdc_price # Added price fetcher
+from app.services.price_fetcher import get_price_snapshot, BTC_USDC_KEY, SOL_USDC_KEY # Added price fetcher
+from app.services.storage_service import get_storage
+
+logger = logging.getLogger(__name__)
 
 def generate_nft_gif(uploaded_image_id, uploads_folder, static_folder_gifs):
     """
     Generates a GIF with quantum effects and Fibonacci animation.
     Args:
         uploaded_image_id: Filename of the uploaded image (e.g., "uuid_original.png").
-        uploads_folder: Path to the directory where uploaded images are stored.
-        static_folder_gifs: Path to the directory where generated GIFs will be saved.
+        uploads_folder: Path to the directory where uploaded images are stored (names the upload store).
+        static_folder_gifs: Path to the directory where generated GIFs will be saved (names the GIF store).
     Returns:
         A dictionary with status and gif_path (on success) or error message.
+        gif_path is the GIF's location in the GIF store (a local path or an s3:// URI);
+        gif_url is set when the store serves files itself (e.g. a presigned S3 URL).
     """
+    upload_store = get_storage(uploads_folder)
+    gif_store = get_storage(static_folder_gifs)
     image_path = os.path.join(uploads_folder, uploaded_image_id)
 
-    if not os.path.exists(image_path):
+    if not upload_store.exists(uploaded_image_id):
         return {'status': 'error', 'message': f'Uploaded image not found: {uploaded_image_id}'}
 
+    # Holds the local copy of the upload (a temp download for remote stores) until we are done
+    local_files = contextlib.ExitStack()
     try:
+        image_path = local_files.enter_context(upload_store.local_copy(uploaded_image_id))
+
         # 1. Load the original image
         original_image = Image.open(image_path).convert("RGBA") # Use RGBA for compositing
 
@@ -51,7 +64,7 @@ def generate_nft_gif(uploaded_image_id, uploads_folder, static_folder_gifs):
         # So, we save the `transformed_image` (which is just a copy for now)
         # to a temporary path to pass to `apply_quantum_transformation`.
         
-        temp_base_image_for_quantum_effect = os.path.join(uploads_folder, f"temp_q_{uploaded_image_id}")
+        temp_base_image_for_quantum_effect = os.path.join(os.path.dirname(image_path), f"temp_q_{uploaded_image_id}")
         transformed_image.save(temp_base_image_for_quantum_effect, format=original_image.format or 'PNG')
 
         base_frames = apply_quantum_transformation(temp_base_image_for_quantum_effect, num_frames=50) # 50 frames for 5s @ 100ms/frame
@@ -86,16 +99,15 @@ def generate_nft_gif(uploaded_image_id, uploads_folder, static_folder_gifs):
             return {'status': 'error', 'message': 'Failed to apply Fibonacci animation.'}
 
         # 6. Save as GIF
-        os.makedirs(static_folder_gifs, exist_ok=True)
         gif_filename = f"final_{uploaded_image_id.split('.')[0]}.gif"
-        gif_path = os.path.join(static_folder_gifs, gif_filename)
 
         # Duration: target 5 seconds. If 50 frames, duration is 100ms per frame.
         # PIL save duration is in milliseconds.
 
         # --- Add Price and Timestamp Overlay ---
-        btc_price = get_btc_usdc_price()
-        sol_price = get_sol_usdc_price()
+        prices = get_price_snapshot() # One consistent BTC/SOL snapshot (single API request on a cold cache)
+        btc_price = prices.get(BTC_USDC_KEY)
+        sol_price = prices.get(SOL_USDC_KEY)
         timestamp_obj = datetime.datetime.now(datetime.timezone.utc) # Use timezone aware UTC
         timestamp_str = timestamp_obj.strftime("%Y-%m-%d %H:%M:%S UTC")
 
@@ -153,28 +165,35 @@ def generate_nft_gif(uploaded_image_id, uploads_folder, static_folder_gifs):
         if not final_frames_with_text:
             return {'status': 'error', 'message': 'Text overlay resulted in no frames.'}
             
-        final_frames_with_text[0].save(
-            gif_path,
-            save_all=True,
-            append_images=final_frames_with_text[1:],
-            duration=100,  # 100ms per frame for 50 frames = 5 seconds
-            loop=0,        # Loop indefinitely
-            optimize=False # Set to True for smaller files, but can be slower
-        )
+        # Written to the GIF store's folder directly (local) or to a temp file that is
+        # uploaded with parallel multipart transfers on exit (S3)
+        with gif_store.write_path(gif_filename) as gif_write_path:
+            final_frames_with_text[0].save(
+                gif_write_path,
+                save_all=True,
+                append_images=final_frames_with_text[1:],
+                duration=100,  # 100ms per frame for 50 frames = 5 seconds
+                loop=0,        # Loop indefinitely
+                optimize=False # Set to True for smaller files, but can be slower
+            )
         
-        return {'status': 'success', 'gif_path': gif_path, 'relative_gif_path': os.path.join('generated_gifs', gif_filename)}
+        return {
+            'status': 'success',
+            'gif_path': gif_store.uri(gif_filename),
+            'relative_gif_path': os.path.join('generated_gifs', gif_filename),
+            'gif_url': gif_store.public_url(gif_filename)
+        }
 
     except FileNotFoundError: # Specifically for the original image_path
          return {'status': 'error', 'message': f'Source image not found: {image_path}'}
     except ImportError as ie:
-        # Log the error in a real application
-        print(f"ImportError in GIF generation: {ie}")
+        logger.error("GIF_GENERATOR: ImportError in GIF generation: %s", ie)
         return {'status': 'error', 'message': f'Failed to generate GIF due to a missing library: {str(ie)}'}
     except Exception as e:
-        # Log the error in a real application: print(f"Error in GIF generation: {e}")
-        import traceback
-        traceback.print_exc() # Print full traceback for debugging
+        logger.exception("GIF_GENERATOR: Error in GIF generation: %s", e) # Full traceback, formatted off the request thread
         return {'status': 'error', 'message': f'Failed to generate GIF due to an internal error: {str(e)}'}
+    finally:
+        local_files.close()
 
 if __name__ == '__main__':
     # Example Usage (requires a dummy image in a dummy uploads folder)
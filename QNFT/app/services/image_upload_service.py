@@ -1,6 +1,10 @@
 import os
 import uuid
+import logging
 from werkzeug.utils import secure_filename
+from app.services.storage_service import get_storage
+
+logger = logging.getLogger(__name__)
 
 # ALLOWED_EXTENSIONS will be passed from the caller (e.g., Flask app)
 # MAX_CONTENT_LENGTH will be checked by Flask app's MAX_CONTENT_LENGTH config
@@ -15,7 +19,7 @@ def handle_image_upload(file_storage_object, upload_folder, allowed_extensions,
     Handles the image upload, validation, and saving.
     Args:
         file_storage_object: The file object from the request (e.g., request.files['file']).
-        upload_folder: The folder where valid files will be saved.
+        upload_folder: The folder where valid files will be saved (names the upload store, see storage_service).
         allowed_extensions: A set of allowed file extensions (e.g., {'png', 'jpg'}).
         max_size_bytes: Maximum allowed file size in bytes.
     Returns:
@@ -54,14 +58,12 @@ def handle_image_upload(file_storage_object, upload_folder, allowed_extensions,
     # new_filename = f"{unique_id}.{original_extension}"
 
 
-    save_path = os.path.join(upload_folder, new_filename)
+    upload_store = get_storage(upload_folder)
 
     try:
-        # Ensure the upload folder exists
-        os.makedirs(upload_folder, exist_ok=True)
-        file_storage_object.save(save_path)
+        # The local backend creates the upload folder if needed; S3 streams the file to the bucket
+        save_path = upload_store.save_fileobj(new_filename, file_storage_object)
         return {'status': 'success', 'file_id': new_filename, 'path': save_path}
     except Exception as e:
-        # In a real app, log this error
-        print(f"Error saving file: {e}")
+        logger.exception("IMAGE_UPLOAD: Error saving file %s: %s", new_filename, e)
         return {'status': 'error', 'message': 'Failed to save file due to an internal error.'}
@@ -0,0 +1,95 @@
+# QNFT/app/services/leaderboard.py
+import threading
+from app.utils.skiplist import IndexableSkipList
+
+# Live wallet leaderboard. Each wallet's totals (mints, SOL volume, rarity held) live in a
+# dict, and its ranking key (-score, wallet) in an indexable skiplist, so a mint moves one
+# key (O(log n)) and top-K / a wallet's rank are read straight from the skiplist without
+# sorting. Rarity points are the NFT's rarity score when it is indexed and are not revised
+# later, which keeps each mint an update of exactly one wallet.
+POINTS_PER_MINT = 100
+POINTS_PER_SOL_VOLUME = 50 # Per SOL paid in mint fees
+POINTS_PER_RARITY = 10 # Per unit of rarity_engine score (sum of -log(trait share))
+DEFAULT_TOP_K = 10
+
+
+def wallet_score(totals):
+    return round(
+        totals['mints'] * POINTS_PER_MINT
+        + totals['volume_sol'] * POINTS_PER_SOL_VOLUME
+        + totals['rarity_held'] * POINTS_PER_RARITY, 4
+    )
+
+
+class Leaderboard:
+    """Wallets ranked by score, kept up to date mint by mint."""
+
+    def __init__(self, rarity_score_fn=None):
+        self._rarity_score_fn = rarity_score_fn # seq -> rarity score of that NFT (or None)
+        self._ranking = IndexableSkipList() # Keys: (-score, wallet); best first
+        self._totals = {} # Format: {wallet: {'mints', 'volume_sol', 'rarity_held', 'score'}}
+        self._last_seq = -1 # Newest store seq already counted
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._totals)
+
+    def record_mint(self, wallet, volume_sol=0.0, rarity=0.0):
+        """Adds one minted NFT to wallet's totals and moves it in the ranking (O(log n))."""
+        with self._lock:
+            self._record_mint(wallet, volume_sol, rarity)
+
+    def _record_mint(self, wallet, volume_sol, rarity):
+        totals = self._totals.get(wallet)
+        if totals is None:
+            totals = self._totals[wallet] = {'mints': 0, 'volume_sol': 0.0, 'rarity_held': 0.0, 'score': None}
+        else:
+            self._ranking.remove((-totals['score'], wallet))
+        totals['mints'] += 1
+        totals['volume_sol'] += volume_sol or 0.0
+        totals['rarity_held'] += rarity or 0.0
+        totals['score'] = wallet_score(totals)
+        self._ranking.insert((-totals['score'], wallet))
+
+    def sync(self, store):
+        """Counts NFTs added to store since the last sync. NFTs without an owner_wallet are skipped."""
+        with self._lock:
+            for seq, nft in store.nfts_after(self._last_seq):
+                self._last_seq = seq
+                wallet = nft.get('owner_wallet')
+                if not isinstance(wallet, str) or not wallet:
+                    continue
+                volume_sol = nft.get('mint_fee_sol')
+                volume_sol = float(volume_sol) if isinstance(volume_sol, (int, float)) and not isinstance(volume_sol, bool) else 0.0
+                rarity = self._rarity_score_fn(seq) if self._rarity_score_fn else None
+                self._record_mint(wallet, volume_sol, rarity)
+
+    def clear(self):
+        with self._lock:
+            self._ranking = IndexableSkipList()
+            self._totals.clear()
+            self._last_seq = -1
+
+    def _entry(self, wallet, rank):
+        totals = self._totals[wallet]
+        return {
+            'user': wallet,
+            'rank': rank,
+            'score': totals['score'],
+            'mints': totals['mints'],
+            'volume_sol': round(totals['volume_sol'], 9),
+            'rarity_held': round(totals['rarity_held'], 4)
+        }
+
+    def top(self, k=DEFAULT_TOP_K):
+        """Returns the k best wallets, best first (O(log n + k))."""
+        with self._lock:
+            return [self._entry(wallet, rank) for rank, (_, wallet) in enumerate(self._ranking.slice(0, k), start=1)]
+
+    def wallet_rank(self, wallet):
+        """Returns the wallet's leaderboard entry (rank 1 is best), or None if it has no mints (O(log n))."""
+        with self._lock:
+            totals = self._totals.get(wallet)
+            if totals is None:
+                return None
+            return self._entry(wallet, self._ranking.rank((-totals['score'], wallet)) + 1)
@@ -0,0 +1,189 @@
+# QNFT/app/services/live_events.py
+import json
+import itertools
+import threading
+import collections
+from app.services import price_fetcher
+
+# Server-sent events fan-out. Every event is serialized once, when it is published, into
+# an SSE frame and stored with a sequence number in a bounded ring buffer. Each connected
+# client only remembers the last sequence number it sent, so a thousand clients cost a
+# thousand small writes of the same bytes, not a thousand JSON encodings or refetches.
+# A reconnecting browser sends Last-Event-ID and gets exactly the events it missed.
+# Sequence numbers are the channel's own counter, or ids given by the publisher (the
+# marketplace feed uses store seqs, which every worker and restart agree on).
+EVENT_BUFFER_SIZE = 1000 # Events kept for reconnecting clients
+HEARTBEAT_SECONDS = 15 # Comment line sent on idle connections so proxies keep them open
+CLIENT_RETRY_MS = 3000 # Reconnect delay suggested to EventSource
+
+def format_sse(event_type, data, event_id=None):
+    """Returns one SSE frame. data is JSON-encoded."""
+    frame = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{frame}event: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class EventChannel:
+    """One stream of events (e.g. 'prices'), shared by all of its subscribers."""
+
+    def __init__(self, name, buffer_size=EVENT_BUFFER_SIZE):
+        self.name = name
+        self._events = collections.deque(maxlen=buffer_size) # Format: (seq, frame)
+        self._last_seq = 0
+        self._dropped_seq = 0 # Newest seq no longer buffered: clients resuming before it must resync
+        self._condition = threading.Condition()
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    def publish(self, event_type, data, seq=None):
+        """
+        Serializes the event once, buffers it and wakes every waiting subscriber. seq defaults
+        to the next sequence number; a given one must be above every published one. Returns it.
+        """
+        with self._condition:
+            if seq is None:
+                seq = self._last_seq + 1
+            elif seq <= self._last_seq:
+                raise ValueError(f"Event seq {seq} is not above the channel's last seq {self._last_seq}.")
+            if len(self._events) == self._events.maxlen:
+                self._dropped_seq = self._events[0][0]
+            self._last_seq = seq
+            self._events.append((seq, format_sse(event_type, data, seq)))
+            self._condition.notify_all()
+            return seq
+
+    def restart_at(self, seq):
+        """Drops every buffered event and continues after seq (e.g. the feed's source was replaced)."""
+        with self._condition:
+            self._events.clear()
+            self._last_seq = self._dropped_seq = seq
+
+    def events_after(self, seq):
+        """
+        Returns (frames, complete) for every buffered event with a sequence number above seq.
+        complete is False if events after seq have already fallen out of the buffer.
+        """
+        with self._condition:
+            return self._events_after(seq)
+
+    def _events_after(self, seq):
+        if seq >= self._last_seq:
+            return [], True
+        # Walk back from the newest event: only the events returned are visited
+        newer = list(itertools.takewhile(lambda event: event[0] > seq, reversed(self._events)))
+        return [frame for _, frame in reversed(newer)], seq >= self._dropped_seq
+
+    def wait_for_events(self, seq, timeout):
+        """Blocks until there are events after seq (or timeout). Returns (frames, complete, last_seq)."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_seq > seq, timeout)
+            frames, complete = self._events_after(seq)
+            return frames, complete, self._last_seq
+
+    def stream(self, last_event_id=None, initial_events=None, heartbeat_seconds=HEARTBEAT_SECONDS):
+        """
+        Generator of SSE text for one client. A new client first receives initial_events
+        (e.g. a snapshot of current prices), then everything published after it connected.
+        A reconnecting client (last_event_id) receives the events it missed instead, or a
+        'resync' event if they are no longer buffered, telling it to reload full data.
+        """
+        yield f"retry: {CLIENT_RETRY_MS}\n\n"
+        seq = _parse_event_id(last_event_id)
+        if seq is None or seq > self._last_seq: # New client, or an id from before a server restart
+            seq = self._last_seq
+            for event_type, data in (initial_events or []):
+                yield format_sse(event_type, data)
+        while True:
+            frames, complete, last_seq = self.wait_for_events(seq, heartbeat_seconds)
+            if not complete:
+                yield format_sse('resync', {'last_event_id': last_seq}, last_seq)
+                seq = last_seq
+                continue
+            if not frames:
+                yield ": keepalive\n\n"
+                continue
+            yield "".join(frames)
+            seq = last_seq
+
+
+def _parse_event_id(last_event_id):
+    try:
+        return int(last_event_id) if last_event_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+def get_channel(name):
+    """Returns the named event channel, creating it on first use."""
+    with _channels_lock:
+        channel = _channels.get(name)
+        if channel is None:
+            channel = _channels[name] = EventChannel(name)
+        return channel
+
+def publish_event(channel_name, event_type, data, seq=None):
+    return get_channel(channel_name).publish(event_type, data, seq)
+
+def _reset_channels():
+    """Drops every channel and its buffered events (used by tests)."""
+    with _channels_lock:
+        _channels.clear()
+
+
+# --- Feeds ---
+PRICES_CHANNEL = 'prices'
+
+def publish_price_tick(prices, timestamp):
+    """Price listener: pushes {cache_key: price} fetched at timestamp to live clients."""
+    publish_event(PRICES_CHANNEL, 'price', {'prices': prices, 'timestamp': int(timestamp * 1000)})
+
+MARKETPLACE_CHANNEL = 'marketplace'
+
+
+class MarketplaceFeed:
+    """
+    Pushes every NFT added to the market store to live clients: an 'nft' event on the
+    marketplace channel, whose event id is the NFT's store seq (so a client can resume on
+    any worker, or after a restart), and a chart 'mint' event on the prices channel if it
+    has a mint time. market_service syncs it with its other indexes, so NFTs minted by
+    other workers sharing a SQLite store are pushed too.
+    """
+
+    def __init__(self, chart_event_fn):
+        self._chart_event_fn = chart_event_fn # (nft, mint_ms) -> chart nft_events entry
+        self._last_seq = -1 # Newest store seq already published
+        self._lock = threading.Lock()
+
+    def sync(self, store):
+        """Publishes the NFTs added to store since the last sync, each exactly once."""
+        with self._lock:
+            rows = store.rows_after(self._last_seq)
+            if not rows:
+                return
+            channel = get_channel(MARKETPLACE_CHANNEL)
+            if channel.last_seq != self._last_seq: # A new channel (only this feed publishes to it): number it like the store
+                channel.restart_at(self._last_seq)
+            for (seq, mint_ms, *_), nft in zip(rows, store.get_many([row[0] for row in rows])):
+                publish_event(MARKETPLACE_CHANNEL, 'nft', nft, seq)
+                if mint_ms is not None:
+                    publish_event(PRICES_CHANNEL, 'mint', self._chart_event_fn(nft, mint_ms))
+                self._last_seq = seq
+
+    def skip_existing(self, store):
+        """Marks every NFT already in store as published (e.g. a database opened at startup)."""
+        with self._lock:
+            rows = store.rows_after(self._last_seq)
+            if rows:
+                self._last_seq = rows[-1][0]
+            get_channel(MARKETPLACE_CHANNEL).restart_at(self._last_seq)
+
+    def clear(self):
+        with self._lock:
+            self._last_seq = -1
+            get_channel(MARKETPLACE_CHANNEL).restart_at(self._last_seq)
+
+# Ticks come from this worker's fetches and from prices other workers put in the shared cache
+price_fetcher.register_price_listener(publish_price_tick, include_shared=True)
@@ -0,0 +1,196 @@
+# QNFT/app/services/market_query.py
+import bisect
+import threading
+from app.services.market_store import SORT_COLUMNS, sort_position
+
+# Secondary indexes for filtered marketplace queries, kept next to the market store and fed
+# incrementally from its rows_after(seq) (the values parsed once, when the NFT was stored).
+# Mint type has a hash index ({type: [seq, ...]}), prices and mint time have sorted
+# [(value, seq)] indexes, and rarity percentiles come from the rarity_engine ranking, so
+# the number of NFTs matching any single filter is known from a dict lookup or two binary
+# searches. A query starts from the most selective filter and narrows it with the others:
+# small candidate sets are intersected, large ones are checked row by row against the (much
+# smaller) running result instead. Pages are read from sorted position lists per sort key
+# (like the stores'): a broad filter walks the list from the cursor until the page is full,
+# a selective one sorts just its (small) matching set.
+RANGE_FILTERS = { # Format: {indexed field: (lower bound filter, upper bound filter)}
+    'btc_price': ('btc_price_min', 'btc_price_max'),
+    'sol_price': ('sol_price_min', 'sol_price_max'),
+    'mint_time': ('minted_after', 'minted_before'), # Epoch ms
+    'rarity': ('rarity_min', 'rarity_max'), # Rarity percentile, 0 (most common) to 1 (rarest)
+}
+INDEXED_FIELDS = ('btc_price', 'sol_price', 'mint_time') # Range filters with an index of their own
+FILTER_KEYS = ('mint_type',) + tuple(key for bounds in RANGE_FILTERS.values() for key in bounds)
+PROBE_RATIO = 8 # Intersect with a filter's candidates only if it matches at most this many times the running result
+WALK_RATIO = 16 # Page by walking the sort order if the most selective filter matches at least 1/WALK_RATIO of all NFTs
+
+
+class _TypePredicate:
+    def __init__(self, index, mint_types):
+        self.index = index
+        self.mint_types = mint_types
+        self.count = sum(len(index._by_type.get(mint_type, ())) for mint_type in mint_types)
+
+    def candidates(self):
+        return {seq for mint_type in self.mint_types for seq in self.index._by_type.get(mint_type, ())}
+
+    def matches(self, seq):
+        return self.index._values[seq]['mint_type'] in self.mint_types
+
+
+class _RangePredicate:
+    def __init__(self, index, field, low, high):
+        self.index = index
+        self.field, self.low, self.high = field, low, high
+        ordering = index._ranges[field]
+        self._ordering = ordering
+        self._lo = 0 if low is None else bisect.bisect_left(ordering, (low, float('-inf')))
+        self._hi = len(ordering) if high is None else bisect.bisect_right(ordering, (high, float('inf')))
+        self.count = max(0, self._hi - self._lo)
+
+    def candidates(self):
+        return {seq for _, seq in self._ordering[self._lo:self._hi]}
+
+    def matches(self, seq):
+        value = self.index._values[seq][self.field]
+        return value is not None and (self.low is None or value >= self.low) and (self.high is None or value <= self.high)
+
+
+class _RarityPredicate:
+    def __init__(self, rarity_index, low, high):
+        self.rarity_index = rarity_index
+        self.low, self.high = low, high
+        self.count = rarity_index.count_between(low, high)
+
+    def candidates(self):
+        return self.rarity_index.seqs_between(self.low, self.high)
+
+    def matches(self, seq):
+        percentile = self.rarity_index.percentile(seq)
+        return percentile is not None and (self.low is None or percentile >= self.low) and (self.high is None or percentile <= self.high)
+
+
+def parse_filters(filters):
+    """
+    Validates a filters dict and returns it normalized: {'mint_type': set or None,
+    field: (low, high) for each range filter used}. Raises ValueError on bad filters.
+    """
+    filters = filters or {}
+    unknown = [key for key in filters if key not in FILTER_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(map(str, unknown))}. Supported: {', '.join(FILTER_KEYS)}")
+    parsed = {}
+    mint_type = filters.get('mint_type')
+    if mint_type is not None:
+        mint_types = [mint_type] if isinstance(mint_type, str) else mint_type
+        if not isinstance(mint_types, (list, tuple, set)) or not all(isinstance(item, str) for item in mint_types):
+            raise ValueError("Invalid mint_type filter. Must be a string or a list of strings.")
+        parsed['mint_type'] = set(mint_types)
+    for field, (low_key, high_key) in RANGE_FILTERS.items():
+        bounds = []
+        for key in (low_key, high_key):
+            value = filters.get(key)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise ValueError(f"Invalid {key} filter. Must be a number.")
+            bounds.append(value)
+        if bounds != [None, None]:
+            parsed[field] = tuple(bounds)
+    return parsed
+
+
+class MarketQueryIndex:
+    """Secondary indexes over the market store, and the filter planner that uses them."""
+
+    def __init__(self, rarity_index=None):
+        self._rarity_index = rarity_index # rarity_engine.RarityIndex answering rarity filters (kept in sync by the caller)
+        self._values = {} # Format: {seq: values}
+        self._by_type = {} # Format: {mint_type: [seq, ...]}, seqs ascending
+        self._ranges = {field: [] for field in INDEXED_FIELDS} # Format: {field: [(value, seq), ...]}, missing values not indexed
+        self._positions = {sort_by: [] for sort_by in SORT_COLUMNS} # Format: {sort_by: [sort_position, ...]}
+        self._last_seq = -1 # Newest store seq already indexed
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def sync(self, store):
+        """Indexes NFTs added to store since the last sync."""
+        with self._lock:
+            for seq, mint_ms, mint_type, btc_price, sol_price in store.rows_after(self._last_seq):
+                values = {'mint_time': mint_ms, 'mint_type': mint_type, 'btc_price': btc_price, 'sol_price': sol_price}
+                self._values[seq] = values
+                self._by_type.setdefault(values['mint_type'], []).append(seq)
+                for field, ordering in self._ranges.items():
+                    if values[field] is not None:
+                        bisect.insort(ordering, (values[field], seq))
+                for sort_by, positions in self._positions.items():
+                    bisect.insort(positions, sort_position(values[sort_by], seq))
+                self._last_seq = seq
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._by_type.clear()
+            for ordering in self._ranges.values():
+                ordering.clear()
+            for positions in self._positions.values():
+                positions.clear()
+            self._last_seq = -1
+
+    def _predicates(self, parsed_filters):
+        predicates = []
+        for field, condition in parsed_filters.items():
+            if field == 'mint_type':
+                predicates.append(_TypePredicate(self, condition))
+            elif field == 'rarity':
+                if self._rarity_index is None:
+                    raise ValueError("Rarity filters are not available.")
+                predicates.append(_RarityPredicate(self._rarity_index, *condition))
+            else:
+                predicates.append(_RangePredicate(self, field, *condition))
+        return sorted(predicates, key=lambda predicate: predicate.count) # Most selective first
+
+    def matching_seqs(self, parsed_filters):
+        """Returns the set of seqs matching every filter. Raises ValueError for filters it can't answer."""
+        with self._lock:
+            return self._matching_seqs(self._predicates(parsed_filters))
+
+    def _matching_seqs(self, predicates):
+        if not predicates:
+            return set(self._values)
+        candidates = predicates[0].candidates()
+        for predicate in predicates[1:]:
+            if not candidates:
+                break
+            if predicate.count <= PROBE_RATIO * len(candidates):
+                candidates &= predicate.candidates()
+            else:
+                candidates = {seq for seq in candidates if predicate.matches(seq)}
+        return candidates
+
+    def page(self, parsed_filters, sort_by, order, after, limit):
+        """
+        Returns ([(sort_position, seq)], has_more) for the matching NFTs following position
+        `after` (None: from the start) in sort_by/order, like the stores' page().
+        """
+        with self._lock:
+            predicates = self._predicates(parsed_filters)
+            if predicates and predicates[0].count * WALK_RATIO < len(self._values):
+                positions = sorted(sort_position(self._values[seq][sort_by], seq) for seq in self._matching_seqs(predicates))
+                predicates = [] # Every position matches already
+            else:
+                positions = self._positions[sort_by]
+            if order == 'asc':
+                start = bisect.bisect_right(positions, after) if after else 0
+                walk = range(start, len(positions))
+            else:
+                end = bisect.bisect_left(positions, after) if after else len(positions)
+                walk = range(end - 1, -1, -1)
+            selected = []
+            for i in walk:
+                position = positions[i]
+                if all(predicate.matches(position[1]) for predicate in predicates):
+                    selected.append(position)
+                    if len(selected) > limit:
+                        break
+        return [(position, position[1]) for position in selected[:limit]], len(selected) > limit
@@ -1,98 +1,392 @@
+import math
 import datetime
 import time # Not strictly needed here but often useful for time.time() if used
+import json
 import random
+import base64
 import logging
+import threading
+import numpy as np
+from app.services.price_fetcher import SOL_USDC_KEY
+from app.services.price_history import get_series
+from app.utils.downsampling import lttb_indices
+from app.services.live_events import MarketplaceFeed
+from app.services.market_store import InMemoryMarketStore, SQLiteMarketStore, SORT_COLUMNS
+from app.services.market_stats import MarketColumns
+from app.services.market_query import MarketQueryIndex, parse_filters
+from app.services.rarity_engine import RarityIndex
+from app.services.leaderboard import Leaderboard, DEFAULT_TOP_K
+from app.utils.logging_config import sampled_logger
+from app.services.chart_cache import ChartCache, ChartWindow, BUCKET_SECONDS as CHART_BUCKET_SECONDS
 
-# Configure basic logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+try:
+    from app.services.user_service import check_feature_access
+except ImportError: # Without user_service nobody can be granted tier-gated filters
+    check_feature_access = None
 
-_minted_nfts = [] # In-memory store
+logger = logging.getLogger(__name__)
+item_logger = sampled_logger(__name__ + '.items') # Per-NFT lines: debug level, 1 in DEFAULT_SAMPLE_EVERY
+
+_minted_nfts = [] # In-memory store, in insertion order (backs the default store)
+# Where NFTs live: in memory by default, or a SQLite file shared by every worker once
+# configure_market_store() is called. Mint times are parsed once, on insert, and both
+# stores index them, so chart range queries and marketplace pages never scan every NFT.
+_memory_store = InMemoryMarketStore(_minted_nfts)
+_store = _memory_store
+_columns = MarketColumns() # Columnar shadow of the current store for /marketplace/stats
+_rarity_index = RarityIndex() # Trait counters and rarity ranking of the current store
+_leaderboard = Leaderboard(_rarity_index.score_of) # Wallets ranked by mints, volume and rarity held
+_chart_cache = ChartCache() # Price chart responses of recently requested ranges
+
+# Keyset pagination for the marketplace. Each store keeps NFTs ordered by (sort_value, seq)
+# for every sort key. A cursor is the position of the last item served, so the next page
+# starts right after it, and mints arriving between requests never shift it.
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+STREAM_BATCH_SIZE = 500 # NFTs read from the store and serialized at a time when streaming the whole market
+SORT_KEYS = tuple(SORT_COLUMNS)
+SORT_ORDERS = ('asc', 'desc')
+DEFAULT_CHART_POINTS = 1000 # Price points sent to the chart at most (plus the ones NFT markers sit on)
+METADATA_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S UTC' # solana_service's "Timestamp" attribute, stored by older mints
+CHART_OVERSAMPLE = 4 # Long ranges are read from the finest OHLC rollup with at most this many bars per plotted point
+MARKET_POLL_SECONDS = 2.0 # How often live clients of a shared store see NFTs other workers added
+
+def _as_number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+def configure_market_store(db_path):
+    """
+    Stores NFTs in the SQLite database at db_path (None: back to the in-memory store).
+    Calling it again with the same path (or None again) is a no-op.
+    """
+    global _store
+    if getattr(_store, 'path', None) == (db_path or None):
+        return
+    _store = SQLiteMarketStore(db_path) if db_path else _memory_store
+    for index in _indexes():
+        index.clear()
+    _marketplace_feed.skip_existing(_store) # Live clients only get NFTs added from now on
+    _sync_indexes()
+    logger.info("MARKET_SERVICE: Using %s store (%s NFTs).", _store.backend_name, _store.count())
+
+def _parse_mint_time(nft):
+    """Returns the NFT's mint time as a timezone-aware datetime, or None (logged) if it is missing or malformed."""
+    mint_timestamp_iso_str = nft.get('mint_timestamp_iso')
+
+    if not isinstance(mint_timestamp_iso_str, str):
+        logger.warning("MARKET_SERVICE: NFT %s has malformed timestamp (not a string). Not shown on the chart.", nft.get('id'))
+        return None
+
+    try:
+        # Ensure the string is compatible with fromisoformat (e.g. no 'Z' if not supported by version)
+        # Python 3.7+ fromisoformat handles timezone offsets like +00:00
+        # If a 'Z' is present, it needs to be replaced for older Pythons or handled.
+        # Assuming timestamps are stored with timezone info compatible with fromisoformat.
+        nft_mint_time_dt = datetime.datetime.fromisoformat(mint_timestamp_iso_str)
+    except ValueError as e:
+        try:
+            return datetime.datetime.strptime(mint_timestamp_iso_str, METADATA_TIMESTAMP_FORMAT).replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            pass
+        logger.warning("MARKET_SERVICE: NFT %s timestamp '%s' parse error: %s. Not shown on the chart.", nft.get('id'), mint_timestamp_iso_str, e)
+        return None
+
+    # Chart ranges are timezone-aware (UTC), so the mint time must be too.
+    # fromisoformat should handle this if the string has timezone info. If not, it's naive.
+    # For simplicity, if it's naive, assume UTC.
+    if nft_mint_time_dt.tzinfo is None:
+        nft_mint_time_dt = nft_mint_time_dt.replace(tzinfo=datetime.timezone.utc)
+    return nft_mint_time_dt
+
+def _chart_event(nft, mint_ms):
+    """Formats an NFT minted at mint_ms (epoch ms) as a price chart mint event."""
+    return {
+        'timestamp': mint_ms,
+        'type': nft.get('mint_type'),
+        'nft_name': nft.get('name'),
+        'sol_price_at_mint': nft.get('sol_price_at_mint'), # Use SOL price for SOL chart
+        'id': nft.get('id'),
+        'gif_url': nft.get('gif_url')
+    }
+
+_marketplace_feed = MarketplaceFeed(_chart_event) # Pushes added NFTs to /marketplace/stream and /prices/stream clients
+_poller_thread = None
+_poller_stop = threading.Event()
+
+def _store_record(nft_data):
+    """Parses what the stores index (mint time and sort values) once, on insert."""
+    nft_mint_time_dt = _parse_mint_time(nft_data)
+    mint_ms = int(nft_mint_time_dt.timestamp() * 1000) if nft_mint_time_dt is not None else None
+    mint_type = nft_data.get('mint_type')
+    return {
+        'nft': nft_data,
+        'mint_ms': mint_ms,
+        'sort_values': {
+            'mint_time': mint_ms,
+            'btc_price': _as_number(nft_data.get('btc_price_at_mint')),
+            'sol_price': _as_number(nft_data.get('sol_price_at_mint')),
+            'mint_type': mint_type if isinstance(mint_type, str) else None
+        }
+    }
+
+_query_index = MarketQueryIndex(_rarity_index) # Secondary indexes for get_marketplace_nfts_filtered
+
+def _indexes():
+    return (_columns, _rarity_index, _query_index, _leaderboard, _chart_cache, _marketplace_feed) # Rarity first: the others read it; feed last: clients get NFTs already indexed
+
+def _sync_indexes():
+    """
+    Brings every in-process index up to date with the store: the NFTs added by this call's
+    insert, or by other workers sharing a SQLite store. Each index only reads what is new.
+    """
+    for index in _indexes():
+        index.sync(_store)
+
+def _market_poller_loop(interval_seconds):
+    while not _poller_stop.wait(interval_seconds):
+        try:
+            _sync_indexes()
+        except Exception as e: # Never let one failed sync kill the poller
+            logger.warning("MARKET_SERVICE: Market poller error: %s", e)
+
+def start_market_poller(interval_seconds=MARKET_POLL_SECONDS):
+    """
+    Starts a daemon thread that syncs the indexes with the store every interval_seconds, so
+    NFTs other workers add to a shared store reach this worker's live clients even when it
+    serves no other request. One thread per process, whatever the number of clients.
+    Calling it again while it runs is a no-op.
+    """
+    global _poller_thread
+    if _poller_thread is not None and _poller_thread.is_alive():
+        return _poller_thread
+    _poller_stop.clear()
+    _poller_thread = threading.Thread(target=_market_poller_loop, args=(interval_seconds,), name='market-poller', daemon=True)
+    _poller_thread.start()
+    return _poller_thread
+
+def stop_market_poller(timeout=None):
+    """Stops the poller started by start_market_poller()."""
+    global _poller_thread
+    _poller_stop.set()
+    if _poller_thread is not None:
+        _poller_thread.join(timeout)
+        _poller_thread = None
+
+def add_minted_nfts_to_market(nfts):
+    """Adds several NFTs in one batch (a single transaction with the SQLite store)."""
+    records = [_store_record(nft_data) for nft_data in nfts]
+    _store.add_many(records)
+    _sync_indexes() # Also pushes them to live clients (_marketplace_feed)
 
 def add_minted_nft_to_market(nft_data: dict):
-    """Appends nft_data to the _minted_nfts list."""
-    logging.info(f"MARKET_SERVICE: Adding NFT to market: {nft_data.get('name')}")
-    _minted_nfts.append(nft_data)
+    """Adds nft_data to the market store, indexes its mint time and pushes it to live chart and marketplace clients."""
+    item_logger.debug("MARKET_SERVICE: Adding NFT to market: %s", nft_data.get('name'))
+    add_minted_nfts_to_market([nft_data])
+
+def _clear_market_store():
+    """Removes every NFT and its index entries from the current store (used by tests)."""
+    _store.clear()
+    for index in _indexes():
+        index.clear()
+
+def _encode_cursor(sort_by, order, sort_value, seq):
+    payload = json.dumps([sort_by, order, list(sort_value), seq], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor, sort_by, order):
+    """Returns the (sort_value, seq) position encoded in cursor, or raises ValueError."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort_by, cursor_order, sort_value, seq = json.loads(base64.urlsafe_b64decode(padded))
+        present, value = sort_value
+        if present not in (0, 1):
+            raise ValueError('unknown value marker')
+        position = ((present, value), int(seq))
+    except (ValueError, TypeError) as e: # Bad base64 / JSON / shape
+        raise ValueError(f"Invalid cursor: {e}")
+    if (cursor_sort_by, cursor_order) != (sort_by, order):
+        raise ValueError("Invalid cursor: it belongs to a different sort order.")
+    return position
+
+def _parse_page_args(limit, cursor, sort_by, order):
+    """Returns (cursor position or None, None) for valid page arguments, or (None, error dict)."""
+    if sort_by not in SORT_KEYS:
+        return None, {'status': 'error', 'message': f"Invalid sort. Must be one of: {', '.join(SORT_KEYS)}"}
+    if order not in SORT_ORDERS:
+        return None, {'status': 'error', 'message': "Invalid order. Must be 'asc' or 'desc'."}
+    if not isinstance(limit, int) or not 1 <= limit <= MAX_PAGE_SIZE:
+        return None, {'status': 'error', 'message': f'Invalid limit. Must be between 1 and {MAX_PAGE_SIZE}.'}
+    try:
+        return (_decode_cursor(cursor, sort_by, order) if cursor else None), None
+    except ValueError as e:
+        return None, {'status': 'error', 'message': str(e)}
+
+def get_marketplace_page(limit=DEFAULT_PAGE_SIZE, cursor=None, sort_by='mint_time', order='desc'):
+    """
+    Returns one page of marketplace NFTs in sort_by/order, starting after cursor.
+    Returns {'status': 'success', 'items': [...], 'next_cursor': str or None} or an error dict.
+    Cost is O(log n + limit) regardless of how deep the page is.
+    """
+    position, error = _parse_page_args(limit, cursor, sort_by, order)
+    if error:
+        return error
+
+    try:
+        page, has_more = _store.page(sort_by, order, position, limit)
+    except TypeError: # A cursor value that can't be compared with this sort key's values
+        return {'status': 'error', 'message': 'Invalid cursor: it does not match this sort order.'}
+
+    next_cursor = _encode_cursor(sort_by, order, *page[-1][0]) if page and has_more else None
+    return {'status': 'success', 'items': [nft for _, nft in page], 'next_cursor': next_cursor}
+
+def _mint_events_between(start_ms, end_ms):
+    """Returns chart events for NFTs minted in [start_ms, end_ms], oldest first (O(log n + k))."""
+    return [_chart_event(nft, mint_ms) for mint_ms, nft in _store.minted_between(start_ms, end_ms)]
+
+def _attach_chart_prices(nft_events, series):
+    """
+    Sets each event's chart_price to the recorded price at (or just before) its mint time, so
+    the marker sits on the plotted line. Returns the (timestamps_ms, prices) of the points used.
+    """
+    points = series.points_at_or_before([event['timestamp'] / 1000 for event in nft_events])
+    anchors = {}
+    for event, point in zip(nft_events, points):
+        event['chart_price'] = point[1] if point else None
+        if point:
+            anchors[int(point[0] * 1000)] = point[1]
+    return np.fromiter(anchors, dtype=np.int64, count=len(anchors)), np.fromiter(anchors.values(), dtype=np.float64, count=len(anchors))
+
+def _chart_segment(series, resolution, start_ts, end_ts, max_points):
+    """
+    The (timestamps_ms, prices) in (start_ts, end_ts] read from resolution ('raw', or a rollup
+    whose bars are plotted at their closing point), LTTB-downsampled to max_points (None: all).
+    """
+    if resolution == 'raw':
+        timestamps, prices = series.range(start_ts, end_ts)
+    else:
+        bars = series.bars(resolution, start_ts, end_ts)
+        timestamps, prices = bars['last_ts'], bars['close']
+    timestamps, prices = np.frombuffer(timestamps, dtype=np.float64), np.frombuffer(prices, dtype=np.float64)
+    in_range = (timestamps > start_ts) & (timestamps <= end_ts) # The first bar may close before start_ts
+    timestamps, prices = timestamps[in_range], prices[in_range]
+    if max_points is not None and len(timestamps) > max_points:
+        indices = lttb_indices(timestamps, prices, max(3, max_points))
+        timestamps, prices = timestamps[indices], prices[indices]
+    return (timestamps * 1000).astype(np.int64), prices
+
+def _merge_points(*segments):
+    """Concatenates (timestamps_ms, prices) segments, sorted by time with each point once."""
+    timestamps_ms, first = np.unique(np.concatenate([segment[0] for segment in segments]), return_index=True)
+    return timestamps_ms, np.concatenate([segment[1] for segment in segments])[first]
+
+def _bucket_points(max_points, range_seconds):
+    """Plotted points per closed chart bucket, so a whole range stays about max_points."""
+    return max(3, math.ceil(max_points * CHART_BUCKET_SECONDS / range_seconds))
+
+def _chart_window(series, range_seconds, bucket_end, max_points):
+    """
+    Returns a snapshot of the cached chart window of (range_seconds, max_points) ending at
+    bucket_end: slid forward or extended with late mints if it is cached, read otherwise.
+    """
+    key = (range_seconds, max_points)
+    start_ts = bucket_end - range_seconds
+    bucket_points = _bucket_points(max_points, range_seconds)
+    with _chart_cache.lock:
+        window = _chart_cache.get(key)
+        if window is not None and (
+            window.series is not series # Price history was reconfigured
+            or series.count(float('-inf'), window.bucket_end) != window.closed_points # Points recorded late
+            or not window.bucket_end <= bucket_end < window.built_at + range_seconds # Fully turned over
+        ):
+            window = None
+        if window is None:
+            resolution = series.pick_resolution(start_ts, bucket_end, max_points * CHART_OVERSAMPLE)
+            points = _chart_segment(series, resolution, start_ts, bucket_end, max(3, max_points - bucket_points))
+            events = _mint_events_between(int(start_ts * 1000), int(bucket_end * 1000))
+            window = ChartWindow(range_seconds, bucket_end, resolution, points, events, series, series.count(float('-inf'), bucket_end))
+            window.add_points(_attach_chart_prices(events, series))
+            _chart_cache.put(key, window)
+            logger.debug("MARKET_SERVICE: Cached price chart window of %ss (%s prices, %s NFT events).", range_seconds, resolution, len(events))
+        elif bucket_end > window.bucket_end:
+            closed_buckets = round((bucket_end - window.bucket_end) / CHART_BUCKET_SECONDS)
+            points = _chart_segment(series, window.resolution, window.bucket_end, bucket_end, bucket_points * closed_buckets)
+            events = _mint_events_between(window.end_ms + 1, int(bucket_end * 1000))
+            window.slide(bucket_end, points, events, series.count(float('-inf'), bucket_end))
+            window.add_points(_attach_chart_prices(events, series))
+
+        pending = _chart_cache.take_pending(window)
+        if pending:
+            nfts = _store.get_many([seq for seq, _ in pending])
+            events = [_chart_event(nft, mint_ms) for (_, mint_ms), nft in zip(pending, nfts)]
+            window.add_points(_attach_chart_prices(events, series))
+            window.add_events(events)
+        return window.snapshot()
+
+def get_marketplace_stats(start_ms=None, end_ms=None):
+    """
+    Returns floor/average/max BTC and SOL price at mint, mints per hour and the long/short
+    ratio for NFTs minted in [start_ms, end_ms] (epoch ms; default: the last 24 hours).
+    """
+    now_ms = int(datetime.datetime.now(datetime.timezone.utc).timestamp() * 1000)
+    end_ms = now_ms if end_ms is None else end_ms
+    start_ms = end_ms - 24 * 3600 * 1000 if start_ms is None else start_ms
+    if start_ms > end_ms:
+        return {'status': 'error', 'message': 'start must not be after end.'}
+    _sync_indexes() # Picks up NFTs other workers added to a shared store
+    return {'status': 'success', 'stats': _columns.window_stats(start_ms, end_ms)}
+
+def iter_marketplace_nfts(batch_size=STREAM_BATCH_SIZE):
+    """Yields every NFT in the market, in insertion order, as lists of up to batch_size (memory stays one batch)."""
+    return _store.iter_batches(batch_size)
 
 def get_marketplace_nfts():
-    """Returns the current list of _minted_nfts."""
-    logging.info(f"MARKET_SERVICE: Fetching all marketplace NFTs. Count: {len(_minted_nfts)}")
-    return list(_minted_nfts) # Return a copy
+    """Returns every NFT in the market, in insertion order (prefer get_marketplace_page for large markets)."""
+    nfts = _store.all() # Always a copy
+    logger.debug("MARKET_SERVICE: Fetching all marketplace NFTs. Count: %s", len(nfts))
+    return nfts
 
-def get_price_chart_data(time_range_hours=24):
+def get_price_chart_data(time_range_hours=24, max_points=DEFAULT_CHART_POINTS):
     """
-    Generates sample time-series data for SOL/USDC and correlates with minted NFTs.
+    Returns the recorded SOL/USDC price history for the time range and correlates it with minted NFTs.
+    The history is downsampled (LTTB) to about max_points points (None: every point); NFT events never are.
+    Long ranges are read from the finest OHLC rollup that has at most CHART_OVERSAMPLE * max_points
+    bars there, each bar plotted at its closing point; 'resolution' says which one was used ('raw': none).
+    Everything up to the last closed 15-minute bucket comes from the chart cache (see chart_cache).
     """
-    logging.info(f"MARKET_SERVICE: Generating price chart data for time range: {time_range_hours} hours.")
+    logger.debug("MARKET_SERVICE: Generating price chart data for time range: %s hours.", time_range_hours)
     now_utc = datetime.datetime.now(datetime.timezone.utc)
-    start_time_dt = now_utc - datetime.timedelta(hours=time_range_hours)
-    
-    price_history = []
-    # Simulate SOL price starting point for the beginning of the time_range_hours
-    # This ensures the chart starts from a plausible historical value, not current price going backwards
-    initial_price_point_dt = start_time_dt 
-    current_price = random.uniform(15.0, 25.0) # Initial SOL price for simulation at start_time_dt
-
-    # Generate price points every 15 minutes within the time range
-    num_intervals = time_range_hours * 4  # 4 intervals per hour (every 15 minutes)
-    
-    for i in range(num_intervals + 1): # +1 to include the current time point or close to it
-        entry_time_dt = start_time_dt + datetime.timedelta(minutes=i * 15)
-        
-        if entry_time_dt > now_utc: # Don't project into the future
-            break
-        
-        # For the first point, use the initial price. For subsequent, vary it.
-        if i > 0:
-            current_price += random.uniform(-0.25, 0.25) # Simulate small price fluctuation
-            current_price = max(1.0, current_price) # Ensure price doesn't go below 1.0
+    range_seconds = time_range_hours * 3600
+    end_ts = now_utc.timestamp()
+    start_ms, end_ms = int((end_ts - range_seconds) * 1000), int(end_ts * 1000)
+    series = get_series(SOL_USDC_KEY)
 
-        price_history.append([int(entry_time_dt.timestamp() * 1000), round(current_price, 2)])
+    if max_points is None: # Every recorded point: nothing to cache
+        nft_events = _mint_events_between(start_ms, end_ms)
+        points = _merge_points(_chart_segment(series, 'raw', start_ms / 1000, end_ts, None), _attach_chart_prices(nft_events, series))
+        resolution = 'raw'
+    else:
+        _sync_indexes() # Mints other workers added may land inside cached windows
+        bucket_end = end_ts - end_ts % CHART_BUCKET_SECONDS
+        resolution, window_ms, window_prices, window_events = _chart_window(series, range_seconds, bucket_end, max_points)
+        # The open bucket is read per request: a few minutes of points and mints at most
+        open_events = _mint_events_between(int(bucket_end * 1000) + 1, end_ms)
+        open_points = _chart_segment(series, resolution, bucket_end, end_ts, _bucket_points(max_points, range_seconds))
+        points = _merge_points((window_ms, window_prices), open_points, _attach_chart_prices(open_events, series))
+        # The cached window starts up to one bucket before the requested range
+        nft_events = [event for event in window_events if event['timestamp'] >= start_ms] + open_events
+        first = np.searchsorted(points[0], start_ms)
+        points = (points[0][first:], points[1][first:])
+    logger.debug("MARKET_SERVICE: Found %s NFT events in time range (%s prices).", len(nft_events), resolution)
 
-    nft_events = []
-    logging.info(f"MARKET_SERVICE: Processing {len(_minted_nfts)} NFTs for chart events.")
-    for nft in _minted_nfts:
-        mint_timestamp_iso_str = nft.get('mint_timestamp_iso')
-        
-        if not isinstance(mint_timestamp_iso_str, str):
-            logging.warning(f"MARKET_SERVICE: NFT {nft.get('id')} has malformed timestamp (not a string). Skipping.")
-            continue 
-            
-        try:
-            # Ensure the string is compatible with fromisoformat (e.g. no 'Z' if not supported by version)
-            # Python 3.7+ fromisoformat handles timezone offsets like +00:00
-            # If a 'Z' is present, it needs to be replaced for older Pythons or handled.
-            # Assuming timestamps are stored with timezone info compatible with fromisoformat.
-            nft_mint_time_dt = datetime.datetime.fromisoformat(mint_timestamp_iso_str)
-        except ValueError as e:
-            logging.warning(f"MARKET_SERVICE: NFT {nft.get('id')} timestamp '{mint_timestamp_iso_str}' parse error: {e}. Skipping.")
-            continue
-
-        # Ensure nft_mint_time_dt is timezone-aware for comparison if start_time_dt is.
-        # If nft_mint_time_dt is naive, it should be localized or assumed to be UTC.
-        # Since now_utc and start_time_dt are timezone-aware (UTC), nft_mint_time_dt must also be.
-        # fromisoformat should handle this if the string has timezone info. If not, it's naive.
-        # For simplicity, if it's naive, assume UTC.
-        if nft_mint_time_dt.tzinfo is None:
-            nft_mint_time_dt = nft_mint_time_dt.replace(tzinfo=datetime.timezone.utc)
-
-
-        if start_time_dt <= nft_mint_time_dt <= now_utc:
-            nft_events.append({
-                'timestamp': int(nft_mint_time_dt.timestamp() * 1000),
-                'type': nft.get('mint_type'),
-                'nft_name': nft.get('name'),
-                'sol_price_at_mint': nft.get('sol_price_at_mint'), # Use SOL price for SOL chart
-                'id': nft.get('id'),
-                'gif_url': nft.get('gif_url')
-            })
-    logging.info(f"MARKET_SERVICE: Found {len(nft_events)} NFT events in time range.")
-            
-    return {'price_history': price_history, 'nft_events': nft_events}
+    price_history = [[timestamp, price] for timestamp, price in zip(points[0].tolist(), points[1].tolist())]
+    return {'price_history': price_history, 'nft_events': nft_events, 'resolution': resolution}
+
+DUMMY_OWNER_WALLETS = ["USER_PUBLIC_KEY_1", "USER_PUBLIC_KEY_2", "USER_DUMMY_PUBLIC_KEY_HERE_12345"]
 
 def _populate_dummy_nfts():
-    """Populates _minted_nfts with dummy data if it's empty."""
-    if not _minted_nfts:
-        logging.info("MARKET_SERVICE: No existing NFTs found, populating with dummy data.")
+    """Populates the market store with dummy data if it's empty."""
+    if _store.count() == 0:
+        logger.info("MARKET_SERVICE: No existing NFTs found, populating with dummy data.")
         # Use a fixed seed for dummy data generation for consistent testing if needed
         # random.seed(42) 
         
@@ -116,67 +410,90 @@ def _populate_dummy_nfts():
                 'mint_timestamp_iso': nft_time.isoformat(), # Standard ISO format
                 'btc_price_at_mint': round(60000 + random.uniform(-2000, 2000), 2), 
                 'sol_price_at_mint': round(20 + random.uniform(-7, 7), 2),
-                'original_image_url': f'/static/uploads/dummy_original_image_{i+1}.png'
+                'original_image_url': f'/static/uploads/dummy_original_image_{i+1}.png',
+                'owner_wallet': random.choice(DUMMY_OWNER_WALLETS),
+                'mint_fee_sol': 0.02
             }
             add_minted_nft_to_market(dummy_nft_data)
-        logging.info(f"MARKET_SERVICE: Populated {len(_minted_nfts)} dummy NFTs.")
+        logger.info("MARKET_SERVICE: Populated %s dummy NFTs.", _store.count())
     else:
-        logging.info("MARKET_SERVICE: NFTs already exist, skipping dummy data population.")
+        logger.info("MARKET_SERVICE: NFTs already exist, skipping dummy data population.")
 
 # Populate dummy data when the module is loaded if no NFTs are present
 _populate_dummy_nfts()
 
 
-# --- New Placeholders for Rarity & Leaderboard ---
-def get_marketplace_nfts_filtered(filters=None, sort_by=None, user_wallet_address=None):
-    '''Placeholder for advanced filtering and sorting.'''
-    global _minted_nfts # Ensure we are using the global list
-    
-    # Attempt to import for feature checking, handle if not available during testing
+# --- Filtering & Leaderboard ---
+RARITY_FILTERS = ('rarity_min', 'rarity_max') # Tier-gated ("rarity_filtering")
+
+def get_marketplace_nfts_filtered(filters=None, sort_by=None, user_wallet_address=None, order='desc', limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Returns one page of the NFTs matching filters (see market_query.FILTER_KEYS), sorted like
+    get_marketplace_page. Rarity filters are removed from filters (in place) and ignored for
+    wallets without the "rarity_filtering" feature.
+    Returns {'status': 'success', 'items': [...], 'next_cursor': str or None} or an error dict.
+    """
+    sort_by = sort_by or 'mint_time'
+    if filters and any(key in filters for key in RARITY_FILTERS):
+        allowed = check_feature_access is not None and user_wallet_address and check_feature_access(user_wallet_address, "rarity_filtering")
+        if not allowed:
+            logger.warning("MARKET_SERVICE: User %s denied rarity filtering access. Rarity filter ignored.", user_wallet_address)
+            for key in RARITY_FILTERS:
+                filters.pop(key, None) # Remove the filter they can't use
+
+    logger.debug("MARKET_SERVICE: Getting filtered NFTs with filters: %s, sort_by: %s", filters, sort_by)
     try:
-        from app.services.user_service import check_feature_access # Corrected import path
-        can_use_rarity_filter = True
-    except ImportError:
-        logging.warning("MARKET_SERVICE: user_service not available for filter check during get_marketplace_nfts_filtered.")
-        can_use_rarity_filter = False # Assume no access if service is missing
-
-    if user_wallet_address and filters and 'rarity_min' in filters:
-        if can_use_rarity_filter:
-            if not check_feature_access(user_wallet_address, "rarity_filtering"):
-                # In a real app, you might raise an exception or return a specific error structure
-                logging.warning(f"MARKET_SERVICE: User {user_wallet_address} denied rarity filtering access.")
-                # For now, just ignore the filter if access denied, or return error:
-                # return {"error": "VIP access required for rarity filtering"} 
-                # Let's return all NFTs but log it for this placeholder
-                filters.pop('rarity_min', None) # Remove the filter they can't use
-                logging.info("MARKET_SERVICE: Rarity filter ignored due to access level.")
-        else:
-            # If user_service itself is missing, we can't check.
-            # Depending on policy, either allow or deny. For placeholder, let's log and ignore.
-            filters.pop('rarity_min', None)
-            logging.info("MARKET_SERVICE: Rarity filter check skipped as user_service is unavailable.")
-
-
-    logging.info(f"MARKET_SERVICE: Getting filtered NFTs with filters: {filters}, sort_by: {sort_by}")
-    # Actual filtering logic would go here if implemented
-    # For now, just returns all NFTs as a placeholder
-    return list(_minted_nfts) # Return a copy
-
-def get_leaderboard():
-    '''Placeholder for generating a leaderboard.'''
-    logging.info("MARKET_SERVICE: Generating leaderboard (Placeholder).")
-    # Dummy leaderboard data
-    return [
-        {"user": "USER_PUBLIC_KEY_1", "score": 1500, "rank": 1, "tier": "vip"},
-        {"user": "USER_PUBLIC_KEY_2", "score": 1200, "rank": 2, "tier": "pro"},
-        {"user": "USER_DUMMY_PUBLIC_KEY_HERE_12345", "score": 800, "rank": 3, "tier": "basic"},
-        {"user": "EuSgddsfPspi1kkdnosEcndymiKE998zUqWfKBpDAbG2", "score": 500, "rank": 4, "tier": "admin"} # Admin might not be on leaderboard
-    ]
-# --- End New Placeholders ---
+        parsed_filters = parse_filters(filters)
+    except ValueError as e:
+        return {'status': 'error', 'message': str(e)}
+    if not parsed_filters:
+        return get_marketplace_page(limit=limit, cursor=cursor, sort_by=sort_by, order=order)
+
+    position, error = _parse_page_args(limit, cursor, sort_by, order)
+    if error:
+        return error
+
+    _sync_indexes() # Picks up NFTs other workers added to a shared store
+    try:
+        page, has_more = _query_index.page(parsed_filters, sort_by, order, position, limit)
+    except TypeError: # A cursor value that can't be compared with this sort key's values
+        return {'status': 'error', 'message': 'Invalid cursor: it does not match this sort order.'}
+    except ValueError as e:
+        return {'status': 'error', 'message': str(e)}
+
+    next_cursor = _encode_cursor(sort_by, order, *page[-1][0]) if page and has_more else None
+    return {'status': 'success', 'items': _store.get_many([seq for _, seq in page]), 'next_cursor': next_cursor}
+
+def get_rarest_nfts(limit=10):
+    """
+    Returns the `limit` rarest NFTs, rarest first, each with a 'rarity' entry
+    ({'score', 'percentile', 'rank'}). Served from the memoized rarity ranking.
+    """
+    if not isinstance(limit, int) or not 1 <= limit <= MAX_PAGE_SIZE:
+        return {'status': 'error', 'message': f'Invalid limit. Must be between 1 and {MAX_PAGE_SIZE}.'}
+    _sync_indexes()
+    seqs = _rarity_index.top(limit)
+    items = [dict(nft, rarity=_rarity_index.rarity(seq)) for seq, nft in zip(seqs, _store.get_many(seqs))]
+    return {'status': 'success', 'items': items}
+
+def get_leaderboard(limit=DEFAULT_TOP_K):
+    """
+    Returns the top `limit` wallets, best first:
+    [{'user', 'rank', 'score', 'mints', 'volume_sol', 'rarity_held'}, ...]
+    """
+    _sync_indexes() # Picks up NFTs other workers added to a shared store
+    return _leaderboard.top(limit)
+
+def get_wallet_leaderboard_entry(user_wallet_address):
+    """Returns the wallet's leaderboard entry (same format as get_leaderboard), or None if it has not minted."""
+    _sync_indexes()
+    return _leaderboard.wallet_rank(user_wallet_address)
 
 
 # For direct testing of this module:
 if __name__ == '__main__':
+    from app.utils.logging_config import configure_logging
+    configure_logging()
     print("--- Testing Market Service ---")
     
     print(f"\nInitial Marketplace NFTs (Total: {len(get_marketplace_nfts())}):")
@@ -235,19 +552,18 @@ if __name__ == '__main__':
 
     # Test new placeholder functions
     print("\n--- Testing New Market Service Placeholders ---")
-    print("\nTesting get_marketplace_nfts_filtered (no actual filter logic yet):")
+    print("\nTesting get_marketplace_nfts_filtered:")
     # Simulate a VIP user trying to use rarity filter
     vip_user = "USER_PUBLIC_KEY_1"
     basic_user = "USER_DUMMY_PUBLIC_KEY_HERE_12345"
 
     filtered_nfts_vip_allowed = get_marketplace_nfts_filtered(filters={'rarity_min': 0.8}, user_wallet_address=vip_user)
-    print(f"Filtered NFTs for VIP (rarity allowed, but filter not implemented): {len(filtered_nfts_vip_allowed)} items.")
+    print(f"Filtered NFTs for VIP (rarity filter applied): {len(filtered_nfts_vip_allowed['items'])} items.")
     
     # Simulate a basic user trying to use rarity filter
-    # The current placeholder removes the filter if access is denied or service unavailable.
+    # The rarity filter is removed if access is denied or user_service is unavailable.
     filtered_nfts_basic_denied = get_marketplace_nfts_filtered(filters={'rarity_min': 0.8}, user_wallet_address=basic_user)
-    print(f"Filtered NFTs for Basic User (rarity filter should be ignored): {len(filtered_nfts_basic_denied)} items.")
-    # To truly test the error return, you'd uncomment `return {"error": ...}` in the function.
+    print(f"Filtered NFTs for Basic User (rarity filter ignored): {len(filtered_nfts_basic_denied['items'])} items.")
 
     print("\nTesting get_leaderboard:")
     leaderboard_data = get_leaderboard()
@@ -0,0 +1,127 @@
+# QNFT/app/services/market_stats.py
+import threading
+import numpy as np
+
+# Columnar shadow of the marketplace for statistics. Mint time, BTC/SOL price at mint and
+# mint type of every NFT with a mint time sit in parallel NumPy arrays sorted by mint time,
+# so a window is two searchsorted() calls and every aggregate is a vectorized pass over
+# the slice instead of a loop over NFT dicts. Missing prices are NaN and are skipped.
+# The arrays grow by doubling and are fed incrementally from the store's rows_after(seq),
+# which also picks up NFTs that other workers added to a shared SQLite store.
+MINT_TYPE_CODES = {'long': 1, 'short': 2} # Any other mint type is stored as 0
+HOUR_MS = 3600 * 1000
+INITIAL_CAPACITY = 1024
+
+
+class MarketColumns:
+    """Append-mostly, mint-time-sorted columns of marketplace data."""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._size = 0
+        self._mint_ms = np.empty(capacity, dtype=np.int64)
+        self._btc_price = np.empty(capacity, dtype=np.float64)
+        self._sol_price = np.empty(capacity, dtype=np.float64)
+        self._mint_type = np.empty(capacity, dtype=np.int8)
+        self._last_seq = -1 # Newest store seq already loaded
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _columns(self):
+        return (self._mint_ms, self._btc_price, self._sol_price, self._mint_type)
+
+    def _reserve(self, extra):
+        capacity = len(self._mint_ms)
+        needed = self._size + extra
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        grown = []
+        for column in self._columns():
+            new_column = np.empty(capacity, dtype=column.dtype)
+            new_column[:self._size] = column[:self._size]
+            grown.append(new_column)
+        self._mint_ms, self._btc_price, self._sol_price, self._mint_type = grown
+
+    def _append(self, rows):
+        """Appends (mint_ms, mint_type, btc_price, sol_price) rows, keeping mint time order. Caller holds the lock."""
+        rows = [row for row in rows if row[0] is not None] # Without a mint time an NFT is in no window
+        if not rows:
+            return
+        mint_ms = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        mint_type = np.fromiter((MINT_TYPE_CODES.get(row[1], 0) for row in rows), dtype=np.int8, count=len(rows))
+        btc_price = np.array([np.nan if row[2] is None else row[2] for row in rows], dtype=np.float64)
+        sol_price = np.array([np.nan if row[3] is None else row[3] for row in rows], dtype=np.float64)
+
+        start = self._size
+        self._reserve(len(rows))
+        end = start + len(rows)
+        for column, values in zip(self._columns(), (mint_ms, btc_price, sol_price, mint_type)):
+            column[start:end] = values
+        self._size = end
+
+        # New mints are nearly always the latest, so this check is usually all the sorting needed
+        if np.any(np.diff(self._mint_ms[max(0, start - 1):end]) < 0):
+            order = np.argsort(self._mint_ms[:end], kind='stable')
+            for column in self._columns():
+                column[:end] = column[:end][order]
+
+    def sync(self, store):
+        """Loads NFTs added to store since the last sync."""
+        with self._lock:
+            rows = store.rows_after(self._last_seq)
+            if not rows:
+                return
+            self._last_seq = rows[-1][0]
+            self._append([row[1:] for row in rows])
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._last_seq = -1
+
+    def window_stats(self, start_ms, end_ms):
+        """Returns aggregate statistics for NFTs minted in [start_ms, end_ms]."""
+        with self._lock:
+            mint_ms = self._mint_ms[:self._size]
+            lo = int(np.searchsorted(mint_ms, start_ms, side='left'))
+            hi = int(np.searchsorted(mint_ms, end_ms, side='right'))
+            # Copies, so the aggregates below run without holding the lock
+            window_mint_ms = mint_ms[lo:hi].copy()
+            btc_price = self._btc_price[lo:hi].copy()
+            sol_price = self._sol_price[lo:hi].copy()
+            mint_type = self._mint_type[lo:hi].copy()
+
+        count = len(window_mint_ms)
+        long_count = int(np.count_nonzero(mint_type == MINT_TYPE_CODES['long']))
+        short_count = int(np.count_nonzero(mint_type == MINT_TYPE_CODES['short']))
+        hours = max(end_ms - start_ms, 1) / HOUR_MS
+        # Mints per clock hour; only hours with at least one mint are listed
+        hour_starts, hour_counts = np.unique(window_mint_ms // HOUR_MS * HOUR_MS, return_counts=True)
+        return {
+            'start': int(start_ms),
+            'end': int(end_ms),
+            'count': count,
+            'btc_price_at_mint': _price_stats(btc_price),
+            'sol_price_at_mint': _price_stats(sol_price),
+            'mints_per_hour': round(count / hours, 4),
+            'hourly_mints': [[int(hour), int(hour_count)] for hour, hour_count in zip(hour_starts, hour_counts)],
+            'long_count': long_count,
+            'short_count': short_count,
+            'long_short_ratio': round(long_count / short_count, 4) if short_count else None
+        }
+
+
+def _price_stats(prices):
+    """Floor, average and max of the known (non-NaN) prices, or None for each if there are none."""
+    known = prices[~np.isnan(prices)]
+    if not len(known):
+        return {'floor': None, 'average': None, 'max': None, 'count': 0}
+    return {
+        'floor': float(known.min()),
+        'average': round(float(known.mean()), 6),
+        'max': float(known.max()),
+        'count': int(len(known))
+    }
@@ -0,0 +1,236 @@
+# QNFT/app/services/market_store.py
+import json
+import bisect
+import sqlite3
+import threading
+from app.utils.sqlite_utils import get_connection
+
+# Storage backends for market_service. Both take "records" prepared by market_service:
+# {'nft': dict, 'mint_ms': int or None, 'sort_values': {sort_by: value or None}}
+# and hand out a per-store sequence number (seq) that orders NFTs by insertion.
+# rows_after(seq) and nfts_after(seq) hand newer NFTs to incremental consumers such as
+# market_stats and market_query; get_many(seqs) fetches NFTs by seq, and iter_batches(n)
+# walks the whole store n NFTs at a time. Sort positions are (sort_value, seq) pairs; a
+# missing value sorts before every present one (SQLite's NULL order), and seq breaks ties
+# so every position is unique.
+SORT_COLUMNS = {'mint_time': 'mint_ms', 'btc_price': 'btc_price', 'sol_price': 'sol_price', 'mint_type': 'mint_type'}
+
+def sort_position(value, seq):
+    return ((0, 0) if value is None else (1, value), seq)
+
+
+class InMemoryMarketStore:
+    """Process-local store: a list in insertion order plus sorted orderings per sort key."""
+    backend_name = 'memory'
+
+    def __init__(self, nfts=None):
+        self.nfts = nfts if nfts is not None else [] # Position in this list is the seq
+        self._mint_ms = [] # Sorted mint times of NFTs that have one...
+        self._mint_seqs = [] # ...and their seqs, in the same order
+        self._orderings = {sort_by: [] for sort_by in SORT_COLUMNS} # Format: {sort_by: [sort_position, ...]}
+        self._rows = [] # Format: [(seq, mint_ms, mint_type, btc_price, sol_price)], in seq order
+        self._lock = threading.Lock()
+
+    def add_many(self, records):
+        with self._lock:
+            for record in records:
+                seq = len(self.nfts)
+                self.nfts.append(record['nft'])
+                sort_values = record['sort_values']
+                self._rows.append((seq, record['mint_ms'], sort_values['mint_type'], sort_values['btc_price'], sort_values['sol_price']))
+                for sort_by, ordering in self._orderings.items():
+                    bisect.insort(ordering, sort_position(record['sort_values'][sort_by], seq))
+                if record['mint_ms'] is not None:
+                    # New mints are nearly always the latest, so this is usually an append
+                    position = bisect.bisect_right(self._mint_ms, record['mint_ms'])
+                    self._mint_ms.insert(position, record['mint_ms'])
+                    self._mint_seqs.insert(position, seq)
+
+    def count(self):
+        return len(self.nfts)
+
+    def all(self):
+        with self._lock:
+            return list(self.nfts)
+
+    def rows_after(self, seq):
+        """Returns [(seq, mint_ms, mint_type, btc_price, sol_price)] for NFTs added after seq."""
+        with self._lock:
+            return self._rows[seq + 1:]
+
+    def nfts_after(self, seq):
+        """Returns [(seq, nft)] for NFTs added after seq."""
+        with self._lock:
+            return [(i, self.nfts[i]) for i in range(max(seq + 1, 0), len(self.nfts))]
+
+    def iter_batches(self, batch_size):
+        """Yields every NFT in insertion order as lists of up to batch_size, taking the lock once per batch."""
+        seq = 0
+        while True:
+            with self._lock:
+                batch = self.nfts[seq:seq + batch_size]
+            if not batch:
+                return
+            yield batch
+            seq += len(batch)
+
+    def get_many(self, seqs):
+        """Returns the NFTs with the given seqs, in the same order."""
+        with self._lock:
+            return [self.nfts[seq] for seq in seqs]
+
+    def minted_between(self, start_ms, end_ms):
+        """Returns [(mint_ms, nft)] minted in [start_ms, end_ms], oldest first (O(log n + k))."""
+        with self._lock:
+            lo = bisect.bisect_left(self._mint_ms, start_ms)
+            hi = bisect.bisect_right(self._mint_ms, end_ms)
+            return [(mint_ms, self.nfts[seq]) for mint_ms, seq in zip(self._mint_ms[lo:hi], self._mint_seqs[lo:hi])]
+
+    def page(self, sort_by, order, after, limit):
+        """
+        Returns (items, has_more) where items are [(sort_position, nft)] following position
+        `after` (None: from the start) in the given order.
+        """
+        with self._lock:
+            ordering = self._orderings[sort_by]
+            if order == 'asc':
+                start = bisect.bisect_right(ordering, after) if after else 0
+                positions = ordering[start:start + limit]
+                has_more = start + limit < len(ordering)
+            else:
+                end = bisect.bisect_left(ordering, after) if after else len(ordering)
+                positions = ordering[max(0, end - limit):end][::-1]
+                has_more = end - limit > 0
+            return [(position, self.nfts[position[1]]) for position in positions], has_more
+
+    def clear(self):
+        with self._lock:
+            self.nfts.clear()
+            self._mint_ms.clear()
+            self._mint_seqs.clear()
+            self._rows.clear()
+            for ordering in self._orderings.values():
+                ordering.clear()
+
+
+class SQLiteMarketStore:
+    """
+    Persistent store shared by every worker process: one SQLite file in WAL mode, so readers
+    in all workers proceed while a single writer commits. Mint time, type and prices are
+    real columns with (column, seq) indexes for range queries and keyset pages; the full NFT
+    dict is kept as JSON. All SQL is fixed strings, so sqlite3's per-connection statement
+    cache prepares each one once.
+    """
+    backend_name = 'sqlite'
+
+    _SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS nfts (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            nft_id TEXT,
+            mint_ms INTEGER,
+            mint_type TEXT,
+            btc_price REAL,
+            sol_price REAL,
+            data TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_nfts_mint_ms ON nfts (mint_ms, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_nfts_mint_type ON nfts (mint_type, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_nfts_btc_price ON nfts (btc_price, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_nfts_sol_price ON nfts (sol_price, seq)",
+    ]
+    _INSERT_SQL = "INSERT INTO nfts (nft_id, mint_ms, mint_type, btc_price, sol_price, data) VALUES (?, ?, ?, ?, ?, ?)"
+    _COUNT_SQL = "SELECT COUNT(*) FROM nfts"
+    _ALL_SQL = "SELECT data FROM nfts ORDER BY seq"
+    _ROWS_AFTER_SQL = "SELECT seq, mint_ms, mint_type, btc_price, sol_price FROM nfts WHERE seq > ? ORDER BY seq"
+    _NFTS_AFTER_SQL = "SELECT seq, data FROM nfts WHERE seq > ? ORDER BY seq"
+    _BATCH_SQL = "SELECT seq, data FROM nfts WHERE seq > ? ORDER BY seq LIMIT ?"
+    _GET_MANY_SQL = "SELECT seq, data FROM nfts WHERE seq IN (SELECT value FROM json_each(?))" # One statement for any number of seqs
+    _RANGE_SQL = "SELECT mint_ms, data FROM nfts WHERE mint_ms BETWEEN ? AND ? ORDER BY mint_ms, seq"
+
+    def __init__(self, path):
+        self.path = path
+        conn = get_connection(path)
+        for statement in self._SCHEMA:
+            conn.execute(statement)
+        self._page_sql = self._build_page_sql()
+
+    @staticmethod
+    def _build_page_sql():
+        """
+        One keyset query per (sort key, order, cursor kind). NULLs sort first ascending, like
+        sort_position(); separate NULL/non-NULL cursor variants keep every comparison index-friendly.
+        """
+        queries = {}
+        for sort_by, column in SORT_COLUMNS.items():
+            select = f"SELECT {column}, seq, data FROM nfts"
+            asc = f"ORDER BY {column} ASC, seq ASC LIMIT ?"
+            desc = f"ORDER BY {column} DESC, seq DESC LIMIT ?"
+            queries[(sort_by, 'asc', 'start')] = f"{select} {asc}"
+            queries[(sort_by, 'asc', 'null')] = f"{select} WHERE ({column} IS NULL AND seq > :seq) OR {column} IS NOT NULL {asc}"
+            queries[(sort_by, 'asc', 'value')] = f"{select} WHERE {column} > :value OR ({column} = :value AND seq > :seq) {asc}"
+            queries[(sort_by, 'desc', 'start')] = f"{select} {desc}"
+            queries[(sort_by, 'desc', 'null')] = f"{select} WHERE {column} IS NULL AND seq < :seq {desc}"
+            queries[(sort_by, 'desc', 'value')] = f"{select} WHERE {column} < :value OR ({column} = :value AND seq < :seq) OR {column} IS NULL {desc}"
+        return {key: sql.replace('LIMIT ?', 'LIMIT :limit') for key, sql in queries.items()}
+
+    def _conn(self):
+        return get_connection(self.path)
+
+    def add_many(self, records):
+        """Inserts all records in one transaction (one fsync for the whole batch)."""
+        rows = [
+            (record['nft'].get('id'), record['mint_ms'], record['sort_values']['mint_type'],
+             record['sort_values']['btc_price'], record['sort_values']['sol_price'], json.dumps(record['nft']))
+            for record in records
+        ]
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(self._INSERT_SQL, rows)
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+
+    def count(self):
+        return self._conn().execute(self._COUNT_SQL).fetchone()[0]
+
+    def all(self):
+        return [json.loads(data) for (data,) in self._conn().execute(self._ALL_SQL)]
+
+    def rows_after(self, seq):
+        return self._conn().execute(self._ROWS_AFTER_SQL, (seq,)).fetchall()
+
+    def nfts_after(self, seq):
+        return [(row_seq, json.loads(data)) for row_seq, data in self._conn().execute(self._NFTS_AFTER_SQL, (seq,))]
+
+    def iter_batches(self, batch_size):
+        # One short keyset query per batch: no read transaction stays open while a slow client reads
+        seq = 0
+        while True:
+            rows = self._conn().execute(self._BATCH_SQL, (seq, batch_size)).fetchall()
+            if not rows:
+                return
+            yield [json.loads(data) for _, data in rows]
+            seq = rows[-1][0]
+
+    def get_many(self, seqs):
+        found = dict(self._conn().execute(self._GET_MANY_SQL, (json.dumps(list(seqs)),)))
+        return [json.loads(found[seq]) for seq in seqs if seq in found]
+
+    def minted_between(self, start_ms, end_ms):
+        return [(mint_ms, json.loads(data)) for mint_ms, data in self._conn().execute(self._RANGE_SQL, (start_ms, end_ms))]
+
+    def page(self, sort_by, order, after, limit):
+        if after is None:
+            kind, params = 'start', {}
+        else:
+            (present, value), seq = after
+            kind, params = ('value', {'value': value, 'seq': seq}) if present else ('null', {'seq': seq})
+        params['limit'] = limit + 1 # One extra row tells whether another page exists
+        rows = self._conn().execute(self._page_sql[(sort_by, order, kind)], params).fetchall()
+        items = [(sort_position(value, seq), json.loads(data)) for value, seq, data in rows[:limit]]
+        return items, len(rows) > limit
+
+    def clear(self):
+        self._conn().execute("DELETE FROM nfts")
@@ -1,16 +1,91 @@
+import os
+import sqlite3
+import logging
 import requests
 import time
+import random
+import threading
+import collections
+from requests.adapters import HTTPAdapter
+from app.utils.sqlite_utils import get_connection
+from app.services import price_providers
+
+logger = logging.getLogger(__name__)
 
 CACHE_DURATION_SECONDS = 180  # 3 minutes
+# Stale-while-revalidate: an expired price younger than this is still served immediately
+# while a background refresh runs; only older (or missing) prices make a caller wait.
+MAX_STALE_SECONDS = 600  # 10 minutes
+# The background refresher renews tracked prices well before they expire.
+REFRESH_INTERVAL_SECONDS = 60
+COINGECKO_SIMPLE_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+BTC_USDC_KEY = 'bitcoin_usdc'
+SOL_USDC_KEY = 'solana_usdc'
+# Every (coin_id, vs_currency) pair the app displays or stamps on NFTs.
+# A cache miss on any of them refreshes all of them with a single simple/price request.
+TRACKED_PAIRS = [('bitcoin', 'usdc'), ('solana', 'usdc')]
 _price_cache = {} # Format: {'coin_id_vs_currency': {'price': 123.45, 'timestamp': 1678886400}}
+# Guards _price_cache. Entries are replaced, never mutated, so a reader holding an entry
+# always sees a matching price/timestamp; the lock makes multi-key reads and writes atomic.
+_price_cache_lock = threading.RLock()
+
+# Single-flight: at most one API request per set of pairs is in flight; concurrent
+# callers that miss the cache wait for it and share its result.
+FETCH_WAIT_TIMEOUT_SECONDS = 15 # Upper bound for followers waiting on an in-flight fetch
+_inflight_fetches = {} # Format: {(('bitcoin', 'usdc'), ...): _Flight}
+_inflight_lock = threading.Lock()
+
+# Cross-process shared cache (SQLite in WAL mode), enabled with configure_shared_cache().
+# Each worker still answers hits from its own _price_cache; misses consult the shared
+# file first, so one worker's fetch serves every worker and a restart starts warm.
+# A short lease makes workers that miss at the same moment wait for one fetch.
+SHARED_FETCH_LEASE_SECONDS = 10 # Also the longest a worker waits for another worker's fetch
+SHARED_LEASE_POLL_SECONDS = 0.05
+_shared_cache_path = None
+
+_price_listeners = [] # Format: [(callback, include_shared)], see register_price_listener()
+
+# --- HTTP client: pooled keep-alive session, retries with jittered backoff, circuit breaker ---
+HTTP_CONNECT_TIMEOUT_SECONDS = 3.05
+HTTP_READ_TIMEOUT_SECONDS = 5
+HTTP_POOL_MAXSIZE = 10
+MAX_RETRIES = 2 # Extra attempts after the first one
+RETRY_BACKOFF_BASE_SECONDS = 0.25
+RETRY_BACKOFF_MAX_SECONDS = 2.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTIONS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+# All attempts and backoff of one fetch share this deadline. It stays below
+# FETCH_WAIT_TIMEOUT_SECONDS, so followers never give up while the leader still retries.
+FETCH_DEADLINE_SECONDS = 10
+MIN_ATTEMPT_SECONDS = 0.5 # No retry is started with less time than this left
+BREAKER_FAILURE_THRESHOLD = 5 # Consecutive failed fetches before the breaker opens
+BREAKER_RESET_TIMEOUT_SECONDS = 30 # How long the breaker stays open before a trial request
+LATENCY_SAMPLE_SIZE = 200
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# Hedged multi-provider fetching (see price_providers.py), enabled by configure_hedged_providers(),
+# e.g. QNFT_PRICE_PROVIDERS=coingecko,binance,coinbase. Unset, prices come from CoinGecko alone
+# through the pooled session above.
+_hedged_client = None
+_hedged_env_configured = False
+
+_background_refresh = None # Thread refreshing stale prices on behalf of readers, if any
+_background_refresh_lock = threading.Lock()
+_refresher_thread = None # Periodic refresher started by start_price_refresher()
+_refresher_stop = threading.Event()
+
+def _cache_key(coin_id, vs_currency):
+    return f"{coin_id}_{vs_currency}"
 
 def _get_cached_price(cache_key):
     """
     Retrieves a price from cache if it exists and is not expired.
     Returns the price or None.
     """
-    if cache_key in _price_cache:
-        cached_data = _price_cache[cache_key]
+    cached_data = _price_cache.get(cache_key)
+    if cached_data is not None:
         if time.time() - cached_data['timestamp'] < CACHE_DURATION_SECONDS:
             # print(f"Cache hit for {cache_key}") # For debugging
             return cached_data['price']
@@ -20,78 +95,592 @@ def _get_cached_price(cache_key):
         # print(f"Cache miss for {cache_key}")
     return None
 
-def _update_cache(cache_key, price):
-    """Updates the cache with the given price and current timestamp."""
-    _price_cache[cache_key] = {'price': price, 'timestamp': time.time()}
+def _update_cache(cache_key, price, timestamp=None):
+    """Updates the cache with the given price and timestamp (default: now)."""
+    with _price_cache_lock:
+        _price_cache[cache_key] = {'price': price, 'timestamp': timestamp if timestamp is not None else time.time()}
     # print(f"Cache updated for {cache_key} with price {price}") # For debugging
 
-def _fetch_price_from_api(coin_id, vs_currency='usdc'):
+def configure_shared_cache(path):
     """
-    Fetches the price for a given coin_id and vs_currency from CoinGecko API.
-    Returns the price as a float or None if an error occurs.
+    Enables the shared cache at path (None disables it) and loads every price it holds
+    into this process's cache, so a freshly started worker serves warm prices at once.
+    Calling it again with the same path is a no-op.
+    """
+    global _shared_cache_path
+    if path == _shared_cache_path:
+        return
+    _shared_cache_path = path
+    if path:
+        try:
+            conn = get_connection(path)
+            conn.execute("CREATE TABLE IF NOT EXISTS prices (cache_key TEXT PRIMARY KEY, price REAL NOT NULL, timestamp REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS fetch_leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+        except sqlite3.Error as e:
+            logger.warning("PRICE_FETCHER: Shared price cache unavailable at %s, using the in-process cache only: %s", path, e)
+            _shared_cache_path = None
+            return
+        _load_shared_prices()
+
+def _load_shared_prices(cache_keys=None):
+    """
+    Reads prices from the shared cache (all of them, or only cache_keys), copies any entry newer
+    than the in-process one into _price_cache and returns {cache_key: entry}. Empty if disabled.
+    """
+    if not _shared_cache_path:
+        return {}
+    try:
+        conn = get_connection(_shared_cache_path)
+        if cache_keys is None:
+            rows = conn.execute("SELECT cache_key, price, timestamp FROM prices").fetchall()
+        else:
+            placeholders = ','.join('?' * len(cache_keys))
+            rows = conn.execute(f"SELECT cache_key, price, timestamp FROM prices WHERE cache_key IN ({placeholders})", list(cache_keys)).fetchall()
+    except sqlite3.Error as e:
+        logger.warning("PRICE_FETCHER: Shared price cache read failed: %s", e)
+        return {}
+    entries = {}
+    updated_prices = {}
+    with _price_cache_lock:
+        for cache_key, price, timestamp in rows:
+            entries[cache_key] = {'price': price, 'timestamp': timestamp}
+            local_entry = _price_cache.get(cache_key)
+            if local_entry is None or local_entry['timestamp'] < timestamp:
+                _price_cache[cache_key] = entries[cache_key]
+                updated_prices[cache_key] = price
+    if updated_prices:
+        _notify_price_listeners(updated_prices, max(entries[key]['timestamp'] for key in updated_prices), from_shared=True)
+    return entries
+
+def _fresh_shared_prices(pairs, max_age_seconds):
+    """Returns {cache_key: price} if the shared cache holds all pairs younger than max_age_seconds, else None."""
+    cache_keys = [_cache_key(c, v) for c, v in pairs]
+    entries = _load_shared_prices(cache_keys)
+    now = time.time()
+    if all(key in entries and now - entries[key]['timestamp'] < max_age_seconds for key in cache_keys):
+        return {key: entries[key]['price'] for key in cache_keys}
+    return None
+
+def _publish_shared_prices(prices, timestamp):
+    """Writes freshly fetched prices to the shared cache (never replacing a newer entry)."""
+    if not _shared_cache_path or not prices:
+        return
+    try:
+        get_connection(_shared_cache_path).executemany(
+            "INSERT INTO prices (cache_key, price, timestamp) VALUES (?, ?, ?) "
+            "ON CONFLICT(cache_key) DO UPDATE SET price = excluded.price, timestamp = excluded.timestamp "
+            "WHERE excluded.timestamp > prices.timestamp",
+            [(cache_key, price, timestamp) for cache_key, price in prices.items()]
+        )
+    except sqlite3.Error as e:
+        logger.warning("PRICE_FETCHER: Shared price cache write failed: %s", e)
+
+def _acquire_shared_fetch_lease(lease_name):
+    """
+    Claims the right to fetch lease_name for every worker. Returns False while another
+    process holds an unexpired lease; True otherwise (including when sharing is disabled).
+    """
+    if not _shared_cache_path:
+        return True
+    now = time.time()
+    try:
+        cursor = get_connection(_shared_cache_path).execute(
+            "INSERT INTO fetch_leases (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE fetch_leases.expires_at <= ? OR fetch_leases.holder = excluded.holder",
+            (lease_name, str(os.getpid()), now + SHARED_FETCH_LEASE_SECONDS, now)
+        )
+        return cursor.rowcount == 1
+    except sqlite3.Error as e:
+        logger.warning("PRICE_FETCHER: Shared price cache lease failed: %s", e)
+        return True
+
+def _release_shared_fetch_lease(lease_name):
+    if not _shared_cache_path:
+        return
+    try:
+        get_connection(_shared_cache_path).execute(
+            "DELETE FROM fetch_leases WHERE name = ? AND holder = ?", (lease_name, str(os.getpid()))
+        )
+    except sqlite3.Error as e:
+        logger.warning("PRICE_FETCHER: Shared price cache lease release failed: %s", e)
+
+def register_price_listener(callback, include_shared=False):
+    """
+    Registers callback({cache_key: price}, timestamp) to be called after every successful
+    API fetch (e.g. the price history recorder). Cache hits do not trigger it. With
+    include_shared, it is also called when newer prices fetched by another worker are
+    picked up from the shared cache (e.g. to push them to this worker's live clients).
+    """
+    if all(registered is not callback for registered, _ in _price_listeners):
+        _price_listeners.append((callback, include_shared))
+
+def _notify_price_listeners(prices, timestamp, from_shared=False):
+    for callback, include_shared in list(_price_listeners):
+        if from_shared and not include_shared:
+            continue
+        try:
+            callback(prices, timestamp)
+        except Exception as e: # A broken listener must not break price fetching
+            logger.warning("PRICE_FETCHER: Price listener %s failed: %s", getattr(callback, '__name__', callback), e)
+
+def _unique(values):
+    """Returns values without duplicates, keeping first-seen order (keeps request URLs stable)."""
+    return list(dict.fromkeys(values))
+
+class _CircuitBreaker:
+    """
+    Fails fast while the price API is down. Opens after failure_threshold consecutive
+    failed fetches, lets a single trial request through after reset_timeout_seconds
+    (half-open), and closes again once a fetch succeeds.
+    """
+    def __init__(self, failure_threshold, reset_timeout_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.times_opened = 0
+            self.rejected_requests = 0
+            self._trial_in_flight = False
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.time() - self.opened_at >= self.reset_timeout_seconds:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected_requests += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'opened_at': self.opened_at,
+                'times_opened': self.times_opened,
+                'rejected_requests': self.rejected_requests
+            }
+
+_circuit_breaker = _CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT_SECONDS)
+
+_http_stats_lock = threading.Lock()
+_http_stats = {'requests': 0, 'failures': 0, 'retries': 0}
+_latency_samples_ms = collections.deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+def _reset_http_state():
+    """Resets breaker and latency stats (used by tests)."""
+    _circuit_breaker.reset()
+    with _http_stats_lock:
+        _http_stats.update(requests=0, failures=0, retries=0)
+        _latency_samples_ms.clear()
+
+def _get_http_session():
+    """Returns the shared keep-alive session (connection pooling instead of a new connection per fetch)."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                # Retries are handled in _request_with_retries so they can be jittered and counted
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Accept': 'application/json'})
+                _http_session = session
+    return _http_session
+
+def _record_request(started, failed):
+    with _http_stats_lock:
+        _http_stats['requests'] += 1
+        if failed:
+            _http_stats['failures'] += 1
+        _latency_samples_ms.append((time.perf_counter() - started) * 1000)
+
+def _backoff_delay(attempt):
+    """Full-jitter exponential backoff: uniform(0, min(max, base * 2**attempt))."""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def _request_with_retries(api_url):
+    """
+    GETs api_url on the pooled session. Timeouts, connection errors and retryable status
+    codes (429/5xx) are retried up to MAX_RETRIES times with jittered exponential backoff,
+    all within FETCH_DEADLINE_SECONDS (each attempt's timeouts are capped by the time left).
+    Returns the response or raises the last requests exception (HTTPError for bad statuses).
+    """
+    session = _get_http_session()
+    deadline = time.monotonic() + FETCH_DEADLINE_SECONDS
+    for attempt in range(MAX_RETRIES + 1):
+        remaining = max(deadline - time.monotonic(), MIN_ATTEMPT_SECONDS)
+        started = time.perf_counter()
+        delay = _backoff_delay(attempt)
+        try:
+            response = session.get(api_url, timeout=(min(HTTP_CONNECT_TIMEOUT_SECONDS, remaining), min(HTTP_READ_TIMEOUT_SECONDS, remaining)))
+        except requests.exceptions.RequestException as e:
+            _record_request(started, failed=True) # Every failed request counts, not only the retried kinds
+            if attempt == MAX_RETRIES or not isinstance(e, RETRYABLE_EXCEPTIONS) or _past_retry_deadline(deadline, delay):
+                raise
+        else:
+            retryable = response.status_code in RETRYABLE_STATUS_CODES
+            _record_request(started, failed=retryable)
+            if not retryable or attempt == MAX_RETRIES or _past_retry_deadline(deadline, delay):
+                response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
+                return response
+        with _http_stats_lock:
+            _http_stats['retries'] += 1
+        time.sleep(delay)
+
+def _past_retry_deadline(deadline, delay):
+    """True if a retry after sleeping delay would not have MIN_ATTEMPT_SECONDS left before deadline."""
+    return time.monotonic() + delay + MIN_ATTEMPT_SECONDS > deadline
+
+def configure_price_providers(client):
+    """Routes every API fetch through a price_providers.HedgedPriceClient (None: CoinGecko only)."""
+    global _hedged_client
+    _hedged_client = client
+
+def configure_hedged_providers():
+    """
+    Enables hedged fetching as set by QNFT_PRICE_PROVIDERS, QNFT_PRICE_HEDGE_MODE and
+    QNFT_PRICE_HEDGE_DEADLINE_MS. Invalid settings (or missing aiohttp) are logged and
+    CoinGecko alone is used. Only the first call reads the environment.
+    """
+    global _hedged_env_configured
+    if _hedged_env_configured:
+        return
+    _hedged_env_configured = True
+    names = [name.strip() for name in os.environ.get('QNFT_PRICE_PROVIDERS', '').split(',') if name.strip()]
+    if not names:
+        return
+    deadline_ms = os.environ.get('QNFT_PRICE_HEDGE_DEADLINE_MS')
+    deadline_seconds = price_providers.DEFAULT_DEADLINE_SECONDS
+    if deadline_ms:
+        try:
+            deadline_seconds = float(deadline_ms) / 1000
+            if deadline_seconds <= 0:
+                raise ValueError('must be positive')
+        except ValueError as e:
+            deadline_seconds = price_providers.DEFAULT_DEADLINE_SECONDS
+            logger.warning("PRICE_FETCHER: Invalid QNFT_PRICE_HEDGE_DEADLINE_MS '%s' (%s), using %s ms.", deadline_ms, e, deadline_seconds * 1000)
+    mode = os.environ.get('QNFT_PRICE_HEDGE_MODE', price_providers.DEFAULT_HEDGE_MODE)
+    try:
+        configure_price_providers(price_providers.build_hedged_client(names, mode=mode, deadline_seconds=deadline_seconds))
+    except (RuntimeError, ValueError) as e:
+        logger.warning("PRICE_FETCHER: Hedged price providers disabled, using CoinGecko only: %s", e)
+
+def _fetch_prices(pairs):
+    """
+    Fetches pairs from the hedged providers if configured, otherwise from CoinGecko. Returns
+    {cache_key: price}. Both go through the circuit breaker: an empty answer counts as a failure.
+    """
+    if _hedged_client is None:
+        return _fetch_prices_from_api(pairs)
+    if not _circuit_breaker.allow_request():
+        logger.info("PRICE_FETCHER: Circuit breaker open, skipping hedged fetch for %s.", pairs)
+        return {}
+    prices = _hedged_client.fetch_sync(pairs)
+    if prices:
+        _circuit_breaker.record_success()
+    else:
+        _circuit_breaker.record_failure()
+    return {_cache_key(coin_id, vs_currency): price for (coin_id, vs_currency), price in prices.items()}
+
+def get_price_fetcher_stats():
+    """Circuit breaker state and upstream request/latency statistics, for monitoring."""
+    with _http_stats_lock:
+        samples = sorted(_latency_samples_ms)
+        stats = dict(_http_stats)
+    def percentile(fraction):
+        return round(samples[min(len(samples) - 1, int(fraction * len(samples)))], 1) if samples else None
+    stats['latency_ms'] = {
+        'samples': len(samples),
+        'avg': round(sum(samples) / len(samples), 1) if samples else None,
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'max': round(samples[-1], 1) if samples else None
+    }
+    stats['circuit_breaker'] = _circuit_breaker.snapshot()
+    if _hedged_client is not None:
+        stats['providers'] = _hedged_client.stats()
+    return stats
+
+def _fetch_prices_from_api(pairs):
     """
-    api_url = f"https://api.coingecko.com/api/v3/simple/price?ids={coin_id}&vs_currencies={vs_currency}"
+    Fetches prices for several (coin_id, vs_currency) pairs from CoinGecko in one request.
+    Returns a dict {cache_key: price} containing every pair found in the response
+    (empty if the request fails or the circuit breaker is open).
+    """
+    coin_ids = ','.join(_unique(coin_id for coin_id, _ in pairs))
+    vs_currencies = ','.join(_unique(vs_currency for _, vs_currency in pairs))
+    api_url = f"{COINGECKO_SIMPLE_PRICE_URL}?ids={coin_ids}&vs_currencies={vs_currencies}"
     # print(f"Fetching from API: {api_url}") # For debugging
+    if not _circuit_breaker.allow_request():
+        logger.info("PRICE_FETCHER: Circuit breaker open, skipping API request for %s/%s.", coin_ids, vs_currencies)
+        return {}
     try:
-        response = requests.get(api_url, timeout=10) # 10 seconds timeout
-        response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
+        response = _request_with_retries(api_url)
+        _circuit_breaker.record_success() # The API answered; even a bad payload is not an outage
         data = response.json()
-        
-        price = data.get(coin_id, {}).get(vs_currency)
-        
-        if price is not None:
-            return float(price)
-        else:
-            # This case means the API call succeeded but the expected data structure was not found.
-            print(f"Error: Price not found for {coin_id}/{vs_currency} in API response. Data: {data}")
-            return None
+
+        prices = {}
+        for coin_id, vs_currency in pairs:
+            price = data.get(coin_id, {}).get(vs_currency)
+            if price is not None:
+                prices[_cache_key(coin_id, vs_currency)] = float(price)
+            else:
+                # This case means the API call succeeded but the expected data structure was not found.
+                logger.warning("PRICE_FETCHER: Error: Price not found for %s/%s in API response. Data: %s", coin_id, vs_currency, data)
+        return prices
     except requests.exceptions.Timeout:
-        print(f"API request timed out for {coin_id}/{vs_currency}: {api_url}")
-        return None
+        _circuit_breaker.record_failure()
+        logger.warning("PRICE_FETCHER: API request timed out for %s/%s: %s", coin_ids, vs_currencies, api_url)
+        return {}
     except requests.exceptions.HTTPError as e:
-        print(f"API request failed with HTTPError for {coin_id}/{vs_currency}: {e.response.status_code} - {e.response.text}")
-        return None
+        if e.response.status_code in RETRYABLE_STATUS_CODES:
+            _circuit_breaker.record_failure()
+        else:
+            _circuit_breaker.record_success() # A 4XX means the API is up; don't trip the breaker
+        logger.warning("PRICE_FETCHER: API request failed with HTTPError for %s/%s: %s - %s", coin_ids, vs_currencies, e.response.status_code, e.response.text)
+        return {}
     except requests.exceptions.RequestException as e:
         # Covers other network errors (DNS failure, connection refused, etc.)
-        print(f"API request failed with RequestException for {coin_id}/{vs_currency}: {e}")
-        return None
-    except ValueError as e: # Handles JSONDecodeError if response is not valid JSON, or float conversion error
-        print(f"Failed to parse API response or price for {coin_id}/{vs_currency}: {e}. Response text: {response.text if 'response' in locals() else 'N/A'}")
-        return None
+        _circuit_breaker.record_failure()
+        logger.warning("PRICE_FETCHER: API request failed with RequestException for %s/%s: %s", coin_ids, vs_currencies, e)
+        return {}
+    except (ValueError, AttributeError) as e: # JSONDecodeError, float conversion error or a non-dict payload
+        logger.warning("PRICE_FETCHER: Failed to parse API response or price for %s/%s: %s. Response text: %s", coin_ids, vs_currencies, e, response.text if 'response' in locals() else 'N/A')
+        return {}
     except Exception as e: # Catch any other unexpected errors
-        print(f"An unexpected error occurred while fetching price for {coin_id}/{vs_currency}: {e}")
-        return None
+        _circuit_breaker.record_failure()
+        logger.warning("PRICE_FETCHER: An unexpected error occurred while fetching prices for %s/%s: %s", coin_ids, vs_currencies, e)
+        return {}
+
+def _fetch_price_from_api(coin_id, vs_currency='usdc'):
+    """
+    Fetches the price for a given coin_id and vs_currency from CoinGecko API.
+    Returns the price as a float or None if an error occurs.
+    """
+    return _fetch_prices_from_api([(coin_id, vs_currency)]).get(_cache_key(coin_id, vs_currency))
+
+class _Flight:
+    """One in-flight API request that concurrent callers can wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = {}
+
+def _refresh_prices(pairs, force=False):
+    """
+    Fetches the given pairs in one request and stores every price found. Returns {cache_key: price}.
+    Concurrent calls for the same pairs are coalesced into a single request (single-flight).
+    Unless force is set, the request is skipped when another flight has just made all pairs fresh.
+    """
+    flight_key = tuple(pairs)
+    with _inflight_lock:
+        flight = _inflight_fetches.get(flight_key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _Flight()
+            _inflight_fetches[flight_key] = flight
 
+    if not is_leader:
+        flight.done.wait(FETCH_WAIT_TIMEOUT_SECONDS)
+        return flight.result
+
+    try:
+        # Another flight may have filled the cache between our miss and becoming leader
+        cached_prices = {_cache_key(c, v): _get_cached_price(_cache_key(c, v)) for c, v in pairs}
+        if not force and all(price is not None for price in cached_prices.values()):
+            flight.result = cached_prices
+        else:
+            # A forced renewal is satisfied by another worker's renewal within the last interval
+            max_age_seconds = REFRESH_INTERVAL_SECONDS if force else CACHE_DURATION_SECONDS
+            shared_prices = _fresh_shared_prices(pairs, max_age_seconds)
+            flight.result = shared_prices if shared_prices is not None else _fetch_and_share(pairs, max_age_seconds)
+    finally:
+        with _inflight_lock:
+            del _inflight_fetches[flight_key]
+        flight.done.set()
+    return flight.result
+
+def _fetch_and_share(pairs, max_age_seconds):
+    """
+    Fetches pairs from the API, stores them in this process's cache and publishes them to the
+    shared cache. If another worker is already fetching the same pairs, waits (up to
+    SHARED_FETCH_LEASE_SECONDS) for its result instead of sending a duplicate request.
+    """
+    lease_name = ','.join(_cache_key(c, v) for c, v in pairs)
+    holds_lease = _acquire_shared_fetch_lease(lease_name)
+    if not holds_lease:
+        deadline = time.time() + SHARED_FETCH_LEASE_SECONDS
+        while time.time() < deadline:
+            time.sleep(SHARED_LEASE_POLL_SECONDS)
+            shared_prices = _fresh_shared_prices(pairs, max_age_seconds)
+            if shared_prices is not None:
+                return shared_prices
+    try:
+        fetched_prices = _fetch_prices(pairs)
+        fetched_at = time.time()
+        with _price_cache_lock: # All keys from one response become visible together
+            for cache_key, price in fetched_prices.items():
+                _update_cache(cache_key, price, fetched_at)
+        _publish_shared_prices(fetched_prices, fetched_at)
+        if fetched_prices:
+            _notify_price_listeners(fetched_prices, fetched_at)
+        return fetched_prices
+    finally:
+        if holds_lease:
+            _release_shared_fetch_lease(lease_name)
+
+def _trigger_background_refresh(pairs):
+    """Starts a refresh of the given pairs on a background thread unless one is already running."""
+    global _background_refresh
+    with _background_refresh_lock:
+        if _background_refresh is None or not _background_refresh.is_alive():
+            _background_refresh = threading.Thread(target=_refresh_prices, args=(pairs,), name='price-revalidate', daemon=True)
+            _background_refresh.start()
+        return _background_refresh
+
+def _join_background_refresh(timeout=None):
+    """Waits for an in-flight background refresh (used by tests and shutdown)."""
+    refresh_thread = _background_refresh
+    if refresh_thread is not None:
+        refresh_thread.join(timeout)
+
+def get_price_snapshot(pairs=None):
+    """
+    Returns a consistent set of prices {cache_key: price or None} for the given pairs
+    (default: every tracked pair). Fresh cached prices are used as-is. Prices past
+    CACHE_DURATION_SECONDS but within MAX_STALE_SECONDS are returned immediately while
+    a background refresh renews them. Only if a pair is missing (or too stale) does the
+    caller wait: all tracked pairs plus the missing ones are then fetched in one request
+    and every cache key is filled together.
+    """
+    pairs = pairs or TRACKED_PAIRS
+    snapshot = {}
+    missing_pairs = []
+    stale_pairs = []
+    now = time.time()
+    with _price_cache_lock:
+        cached_entries = {_cache_key(c, v): _price_cache.get(_cache_key(c, v)) for c, v in pairs}
+    for coin_id, vs_currency in pairs:
+        cache_key = _cache_key(coin_id, vs_currency)
+        cached_data = cached_entries[cache_key]
+        age = now - cached_data['timestamp'] if cached_data else None
+        if cached_data is None or age >= MAX_STALE_SECONDS:
+            missing_pairs.append((coin_id, vs_currency))
+            snapshot[cache_key] = None
+        else:
+            if age >= CACHE_DURATION_SECONDS:
+                stale_pairs.append((coin_id, vs_currency))
+            snapshot[cache_key] = cached_data['price']
+
+    if missing_pairs:
+        fetched_prices = _refresh_prices(_unique(TRACKED_PAIRS + missing_pairs))
+        for coin_id, vs_currency in missing_pairs:
+            cache_key = _cache_key(coin_id, vs_currency)
+            # If the API is down (or the breaker is open), fall back to the last known price, however old
+            last_known = cached_entries[cache_key]
+            snapshot[cache_key] = fetched_prices.get(cache_key, last_known['price'] if last_known else None)
+    elif stale_pairs:
+        _trigger_background_refresh(_unique(TRACKED_PAIRS + stale_pairs))
+    return snapshot
+
+def get_prices_with_age(pairs=None):
+    """
+    Returns the last known price of each pair without ever waiting on the API:
+    {cache_key: {'price': float or None, 'age_seconds': float or None, 'stale': bool}}.
+    Missing or expired prices trigger a background refresh.
+    """
+    pairs = pairs or TRACKED_PAIRS
+    now = time.time()
+    result = {}
+    needs_refresh = []
+    with _price_cache_lock:
+        cached_entries = {_cache_key(c, v): _price_cache.get(_cache_key(c, v)) for c, v in pairs}
+    for coin_id, vs_currency in pairs:
+        cache_key = _cache_key(coin_id, vs_currency)
+        cached_data = cached_entries[cache_key]
+        if cached_data is None:
+            result[cache_key] = {'price': None, 'age_seconds': None, 'stale': True}
+            needs_refresh.append((coin_id, vs_currency))
+            continue
+        age = now - cached_data['timestamp']
+        result[cache_key] = {'price': cached_data['price'], 'age_seconds': round(age, 3), 'stale': age >= CACHE_DURATION_SECONDS}
+        if age >= CACHE_DURATION_SECONDS:
+            needs_refresh.append((coin_id, vs_currency))
+    if needs_refresh:
+        _trigger_background_refresh(_unique(TRACKED_PAIRS + needs_refresh))
+    return result
+
+def _price_refresher_loop(interval_seconds):
+    while not _refresher_stop.is_set():
+        try:
+            _refresh_prices(TRACKED_PAIRS, force=True) # Renew before expiry, even though still fresh
+        except Exception as e: # Never let one bad refresh kill the refresher
+            logger.warning("PRICE_FETCHER: Price refresher error: %s", e)
+        _refresher_stop.wait(interval_seconds)
+
+def start_price_refresher(interval_seconds=REFRESH_INTERVAL_SECONDS):
+    """
+    Starts a daemon thread that renews every tracked price every interval_seconds
+    (default well inside CACHE_DURATION_SECONDS), so user requests are served from
+    cache instead of waiting on CoinGecko. Calling it again while it runs is a no-op.
+    """
+    global _refresher_thread
+    if _refresher_thread is not None and _refresher_thread.is_alive():
+        return _refresher_thread
+    _refresher_stop.clear()
+    _refresher_thread = threading.Thread(target=_price_refresher_loop, args=(interval_seconds,), name='price-refresher', daemon=True)
+    _refresher_thread.start()
+    return _refresher_thread
+
+def stop_price_refresher(timeout=None):
+    """Stops the periodic refresher started by start_price_refresher()."""
+    global _refresher_thread
+    _refresher_stop.set()
+    if _refresher_thread is not None:
+        _refresher_thread.join(timeout)
+        _refresher_thread = None
 
 def get_btc_usdc_price():
     """
     Fetches the BTC/USDC price, using cache if available.
     Returns the price as a float or None.
     """
-    cache_key = 'bitcoin_usdc'
-    cached_price = _get_cached_price(cache_key)
-    if cached_price is not None:
-        return cached_price
-    
-    price = _fetch_price_from_api('bitcoin', 'usdc')
-    if price is not None:
-        _update_cache(cache_key, price)
-    return price
+    return get_price_snapshot([('bitcoin', 'usdc')])[BTC_USDC_KEY]
 
 def get_sol_usdc_price():
     """
     Fetches the SOL/USDC price, using cache if available.
     Returns the price as a float or None.
     """
-    cache_key = 'solana_usdc'
-    cached_price = _get_cached_price(cache_key)
-    if cached_price is not None:
-        return cached_price
-        
-    price = _fetch_price_from_api('solana', 'usdc')
-    if price is not None:
-        _update_cache(cache_key, price)
-    return price
+    return get_price_snapshot([('solana', 'usdc')])[SOL_USDC_KEY]
 
 if __name__ == '__main__':
     print("--- Testing Price Fetcher ---")
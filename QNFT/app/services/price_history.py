@@ -0,0 +1,254 @@
+# QNFT/app/services/price_history.py
+import os
+import array
+import bisect
+import struct
+import logging
+import threading
+from app.services import price_fetcher
+
+logger = logging.getLogger(__name__)
+
+# Every price fetched by price_fetcher is appended to a per-pair time series.
+# Points live in two parallel array('d') columns (timestamps in unix seconds, prices)
+# kept sorted by timestamp, so a range query is two binary searches plus a slice.
+# With a history directory configured, each series is also an append-only file of
+# fixed-size little-endian (timestamp, price) records. Several worker processes may
+# append to the same file; each one picks up the others' records before answering a query.
+# Every series also keeps OHLC bars at several resolutions, updated with each point, so
+# long ranges can be answered from a few hundred bars instead of every recorded point.
+RECORD = struct.Struct('<dd')
+ROLLUP_RESOLUTIONS = (('1m', 60), ('15m', 15 * 60), ('1h', 3600), ('1d', 24 * 3600)) # Finest first
+_BAR_COLUMNS = ('start', 'first_ts', 'last_ts', 'open', 'high', 'low', 'close')
+
+_series = {} # Format: {cache_key: PriceSeries}
+_series_lock = threading.Lock()
+_history_dir = None
+
+
+class OHLCRollup:
+    """Open/high/low/close bars of a fixed width (in seconds), updated point by point."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.columns = {name: array.array('d') for name in _BAR_COLUMNS} # Bars sorted by start
+
+    def __len__(self):
+        return len(self.columns['start'])
+
+    def add(self, timestamp, price):
+        starts = self.columns['start']
+        start = timestamp - timestamp % self.seconds
+        if not starts or start > starts[-1]:
+            index = len(starts) # The usual case: the point opens a new bar at the end
+        else:
+            index = bisect.bisect_left(starts, start)
+        if index == len(starts) or starts[index] != start:
+            bar = (start, timestamp, timestamp, price, price, price, price)
+            for name, value in zip(_BAR_COLUMNS, bar):
+                self.columns[name].insert(index, value)
+            return
+        bar = self.columns
+        bar['high'][index] = max(bar['high'][index], price)
+        bar['low'][index] = min(bar['low'][index], price)
+        if timestamp < bar['first_ts'][index]: # A late point can still be the bar's first
+            bar['first_ts'][index], bar['open'][index] = timestamp, price
+        if timestamp >= bar['last_ts'][index]:
+            bar['last_ts'][index], bar['close'][index] = timestamp, price
+
+    def _bounds(self, start_ts, end_ts):
+        starts = self.columns['start']
+        lo = bisect.bisect_left(starts, start_ts - start_ts % self.seconds) # Includes the bar start_ts falls in
+        hi = bisect.bisect_right(starts, end_ts)
+        return lo, max(lo, hi)
+
+    def count(self, start_ts, end_ts):
+        lo, hi = self._bounds(start_ts, end_ts)
+        return hi - lo
+
+    def range(self, start_ts, end_ts):
+        """Returns {'start', 'first_ts', 'last_ts', 'open', 'high', 'low', 'close'} array slices of the bars overlapping the range."""
+        lo, hi = self._bounds(start_ts, end_ts)
+        return {name: column[lo:hi] for name, column in self.columns.items()}
+
+
+class PriceSeries:
+    """Append-only, timestamp-sorted price series with OHLC rollups, optionally backed by a file."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.timestamps = array.array('d')
+        self.prices = array.array('d')
+        self.rollups = {name: OHLCRollup(seconds) for name, seconds in ROLLUP_RESOLUTIONS}
+        self._loaded_bytes = 0 # How much of the file is already in memory
+        self._lock = threading.Lock()
+        if path:
+            with self._lock:
+                self._sync_from_disk()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _insert(self, timestamp, price):
+        # Points nearly always arrive in order; an out-of-order point (another worker's
+        # record landing late) is inserted at its sorted position instead.
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.prices.append(price)
+        else:
+            index = bisect.bisect_right(self.timestamps, timestamp)
+            self.timestamps.insert(index, timestamp)
+            self.prices.insert(index, price)
+        for rollup in self.rollups.values():
+            rollup.add(timestamp, price)
+
+    def _sync_from_disk(self):
+        """Loads whole records appended to the file since the last sync. Caller holds the lock."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        new_records = (size - self._loaded_bytes) // RECORD.size
+        if new_records <= 0:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._loaded_bytes)
+            data = f.read(new_records * RECORD.size) # A half-written trailing record is left for later
+        for timestamp, price in RECORD.iter_unpack(data):
+            self._insert(timestamp, price)
+        self._loaded_bytes += len(data)
+
+    def append(self, timestamp, price):
+        with self._lock:
+            if self.path is None:
+                self._insert(timestamp, price)
+                return
+            # One small O_APPEND write per record, so concurrent writers never interleave bytes
+            with open(self.path, 'ab') as f:
+                f.write(RECORD.pack(timestamp, price))
+            self._sync_from_disk()
+
+    def range(self, start_ts, end_ts):
+        """Returns (timestamps, prices) array slices for start_ts <= timestamp <= end_ts."""
+        with self._lock:
+            if self.path:
+                self._sync_from_disk()
+            lo = bisect.bisect_left(self.timestamps, start_ts)
+            hi = bisect.bisect_right(self.timestamps, end_ts)
+            return self.timestamps[lo:hi], self.prices[lo:hi]
+
+    def count(self, start_ts, end_ts):
+        """Number of points with start_ts <= timestamp <= end_ts."""
+        with self._lock:
+            if self.path:
+                self._sync_from_disk()
+            return max(0, bisect.bisect_right(self.timestamps, end_ts) - bisect.bisect_left(self.timestamps, start_ts))
+
+    def pick_resolution(self, start_ts, end_ts, max_points=None):
+        """
+        Returns 'raw' if the range holds at most max_points points (or max_points is None),
+        otherwise the finest rollup with at most max_points bars there ('1d' if none fits).
+        """
+        with self._lock:
+            if self.path:
+                self._sync_from_disk()
+            if max_points is None:
+                return 'raw'
+            if bisect.bisect_right(self.timestamps, end_ts) - bisect.bisect_left(self.timestamps, start_ts) <= max_points:
+                return 'raw'
+            for name, rollup in self.rollups.items():
+                if rollup.count(start_ts, end_ts) <= max_points:
+                    return name
+            return name
+
+    def bars(self, resolution, start_ts, end_ts):
+        """Returns the bars of one rollup resolution overlapping the range (see OHLCRollup.range)."""
+        with self._lock:
+            if self.path:
+                self._sync_from_disk()
+            return self.rollups[resolution].range(start_ts, end_ts)
+
+    def points_at_or_before(self, timestamps):
+        """Returns, for each timestamp, the last (timestamp, price) recorded at or before it, or None."""
+        with self._lock:
+            if self.path:
+                self._sync_from_disk()
+            points = []
+            for timestamp in timestamps:
+                index = bisect.bisect_right(self.timestamps, timestamp) - 1
+                points.append((self.timestamps[index], self.prices[index]) if index >= 0 else None)
+            return points
+
+    def latest(self):
+        """Returns the most recent (timestamp, price), or None if the series is empty."""
+        with self._lock:
+            if self.path:
+                self._sync_from_disk()
+            if not self.timestamps:
+                return None
+            return self.timestamps[-1], self.prices[-1]
+
+
+def _series_path(cache_key):
+    return os.path.join(_history_dir, f"{cache_key}.bin") if _history_dir else None
+
+def configure_price_history(directory):
+    """
+    Persists every series under directory (None keeps history in memory only) and loads
+    what is already recorded there. Calling it again with the same directory is a no-op.
+    """
+    global _history_dir
+    if directory == _history_dir:
+        return
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _series_lock:
+        _history_dir = directory
+        _series.clear()
+        if directory:
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.bin'):
+                    cache_key = name[:-len('.bin')]
+                    _series[cache_key] = PriceSeries(_series_path(cache_key))
+    logger.info("PRICE_HISTORY: Recording to %s (%s series loaded).", directory or 'memory', len(_series))
+
+def get_series(cache_key):
+    """Returns the series for a cache key (e.g. 'solana_usdc'), creating it on first use."""
+    with _series_lock:
+        series = _series.get(cache_key)
+        if series is None:
+            series = _series[cache_key] = PriceSeries(_series_path(cache_key))
+        return series
+
+def record_prices(prices, timestamp):
+    """Price listener: appends each {cache_key: price} fetched at timestamp to its series."""
+    for cache_key, price in prices.items():
+        if price is not None:
+            get_series(cache_key).append(timestamp, price)
+
+def get_price_history(cache_key, start_ts, end_ts):
+    """Returns [[timestamp_ms, price], ...] recorded for cache_key between start_ts and end_ts (unix seconds)."""
+    timestamps, prices = get_series(cache_key).range(start_ts, end_ts)
+    return [[int(timestamp * 1000), price] for timestamp, price in zip(timestamps, prices)]
+
+def get_price_ohlc(cache_key, resolution, start_ts, end_ts):
+    """
+    Returns [[bar_start_ms, open, high, low, close], ...] for cache_key at one of the
+    ROLLUP_RESOLUTIONS between start_ts and end_ts (unix seconds). Raises KeyError for
+    an unknown resolution.
+    """
+    bars = get_series(cache_key).bars(resolution, start_ts, end_ts)
+    return [
+        [int(start * 1000), bar_open, high, low, close]
+        for start, bar_open, high, low, close in zip(bars['start'], bars['open'], bars['high'], bars['low'], bars['close'])
+    ]
+
+def _reset_price_history():
+    """Drops all in-memory series and disables persistence (used by tests)."""
+    global _history_dir
+    with _series_lock:
+        _series.clear()
+        _history_dir = None
+
+# Record every price fetched from the API from now on
+price_fetcher.register_price_listener(record_prices)
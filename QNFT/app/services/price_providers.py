@@ -0,0 +1,296 @@
+# QNFT/app/services/price_providers.py
+import os
+import abc
+import json
+import time
+import asyncio
+import logging
+import statistics
+import threading
+
+# Optional dependency: only needed when QNFT_PRICE_PROVIDERS enables hedged fetching
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+# Hedged fetching: the best-ranked providers are asked concurrently. In 'first' mode the
+# first complete, valid answer wins; in 'median' mode every answer that arrives before the
+# deadline is collected and the per-pair median is used. Providers still running at that
+# point are cancelled. A provider that fails is replaced by the next-ranked one.
+HEDGE_MODES = ('first', 'median')
+DEFAULT_HEDGE_MODE = 'median'
+DEFAULT_DEADLINE_SECONDS = 1.5
+DEFAULT_FANOUT = 3 # Providers queried at once; the rest are fallbacks
+# Providers are ranked by an EWMA of their latency, so slow ones get demoted.
+LATENCY_EWMA_ALPHA = 0.3
+INITIAL_LATENCY_SECONDS = 0.5 # Assumed latency of a provider that has not answered yet
+FAILURE_PENALTY_SECONDS = 2.0 # Added to the rank per consecutive failure
+CONNECTION_LIMIT = 20
+
+TICKER_SYMBOLS = {'bitcoin': 'BTC', 'solana': 'SOL', 'usdc': 'USDC', 'usdt': 'USDT', 'usd': 'USD'}
+
+
+class ProviderStats:
+    """Latency and failure tracking for one provider."""
+
+    def __init__(self):
+        self.ewma_latency = INITIAL_LATENCY_SECONDS
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cancelled = 0
+        self.last_error = None
+
+    def _observe(self, latency):
+        self.ewma_latency = LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.ewma_latency
+
+    def record_success(self, latency):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self._observe(latency)
+
+    def record_failure(self, latency, error):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        self._observe(latency)
+
+    def record_cancelled(self, elapsed):
+        # A cancelled straggler took at least `elapsed`; only count it if that is worse than usual
+        self.cancelled += 1
+        if elapsed > self.ewma_latency:
+            self._observe(elapsed)
+
+    def rank(self):
+        return self.ewma_latency + self.consecutive_failures * FAILURE_PENALTY_SECONDS
+
+    def snapshot(self):
+        return {
+            'ewma_latency_ms': round(self.ewma_latency * 1000, 1),
+            'successes': self.successes,
+            'failures': self.failures,
+            'cancelled': self.cancelled,
+            'last_error': self.last_error
+        }
+
+
+class PriceProvider(abc.ABC):
+    """Base class: fetch() returns {(coin_id, vs_currency): price} for whichever pairs the provider knows."""
+    name = None
+    default_base_url = None
+
+    def __init__(self, base_url=None):
+        self.base_url = (base_url or self.default_base_url).rstrip('/')
+        self.stats = ProviderStats()
+
+    @abc.abstractmethod
+    async def fetch(self, session, pairs):
+        """Returns {(coin_id, vs_currency): price}; raises if no pair could be fetched."""
+
+    @staticmethod
+    def _ticker(coin_id, vs_currency):
+        base, quote = TICKER_SYMBOLS.get(coin_id), TICKER_SYMBOLS.get(vs_currency)
+        return (base, quote) if base and quote else None
+
+    @staticmethod
+    async def _get_json(session, url, params=None):
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+
+class CoinGeckoProvider(PriceProvider):
+    name = 'coingecko'
+    default_base_url = 'https://api.coingecko.com'
+
+    async def fetch(self, session, pairs):
+        coin_ids = ','.join(dict.fromkeys(coin_id for coin_id, _ in pairs))
+        vs_currencies = ','.join(dict.fromkeys(vs_currency for _, vs_currency in pairs))
+        data = await self._get_json(session, f"{self.base_url}/api/v3/simple/price", {'ids': coin_ids, 'vs_currencies': vs_currencies})
+        return {
+            (coin_id, vs_currency): float(data[coin_id][vs_currency])
+            for coin_id, vs_currency in pairs
+            if vs_currency in data.get(coin_id, {})
+        }
+
+
+class BinanceProvider(PriceProvider):
+    name = 'binance'
+    default_base_url = 'https://api.binance.com'
+
+    async def fetch(self, session, pairs):
+        symbols = {}
+        for pair in pairs:
+            ticker = self._ticker(*pair)
+            if ticker:
+                symbols[''.join(ticker)] = pair
+        if not symbols:
+            return {}
+        data = await self._get_json(session, f"{self.base_url}/api/v3/ticker/price", {'symbols': json.dumps(list(symbols), separators=(',', ':'))})
+        return {symbols[item['symbol']]: float(item['price']) for item in data if item.get('symbol') in symbols}
+
+
+class CoinbaseProvider(PriceProvider):
+    name = 'coinbase'
+    default_base_url = 'https://api.coinbase.com'
+
+    async def _fetch_pair(self, session, pair, ticker):
+        data = await self._get_json(session, f"{self.base_url}/v2/prices/{ticker[0]}-{ticker[1]}/spot")
+        return pair, float(data['data']['amount'])
+
+    async def fetch(self, session, pairs):
+        # One request per pair, sent concurrently; a failed pair doesn't discard the others
+        requests_by_pair = [self._fetch_pair(session, pair, self._ticker(*pair)) for pair in pairs if self._ticker(*pair)]
+        results = await asyncio.gather(*requests_by_pair, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        prices = dict(result for result in results if not isinstance(result, BaseException))
+        if errors and not prices:
+            raise errors[0]
+        for error in errors:
+            logger.warning("PRICE_PROVIDERS: %s failed for one pair: %s", self.name, error)
+        return prices
+
+
+PROVIDER_CLASSES = {cls.name: cls for cls in (CoinGeckoProvider, BinanceProvider, CoinbaseProvider)}
+
+
+# --- Event loop: one background loop per process runs every hedged fetch ---
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+def _get_event_loop():
+    """Returns the background event loop, (re)starting it in a freshly forked worker."""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name='price-providers-loop', daemon=True).start()
+        return _loop
+
+
+class HedgedPriceClient:
+    """Queries several price providers concurrently and combines their answers."""
+
+    def __init__(self, providers, mode=DEFAULT_HEDGE_MODE, deadline_seconds=DEFAULT_DEADLINE_SECONDS, fanout=DEFAULT_FANOUT):
+        if mode not in HEDGE_MODES:
+            raise ValueError(f"Unknown hedge mode '{mode}'. Expected one of: {', '.join(HEDGE_MODES)}")
+        if not providers:
+            raise ValueError("At least one price provider is required.")
+        self.providers = list(providers)
+        self.mode = mode
+        self.deadline_seconds = deadline_seconds
+        self.fanout = max(1, fanout)
+        self._session = None
+        self._session_loop = None
+
+    async def _get_session(self):
+        # aiohttp sessions belong to the loop they were created on; keep one pooled session per loop
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=CONNECTION_LIMIT),
+                timeout=aiohttp.ClientTimeout(total=self.deadline_seconds * 2),
+                headers={'Accept': 'application/json'}
+            )
+            self._session_loop = loop
+        return self._session
+
+    def ranked_providers(self):
+        """Providers ordered fastest first (EWMA latency plus a penalty for recent failures)."""
+        return sorted(self.providers, key=lambda provider: provider.stats.rank())
+
+    async def _timed_fetch(self, provider, session, pairs):
+        """Runs one provider. Returns its valid prices, or None if it failed (never raises, except on cancel)."""
+        started = time.perf_counter()
+        try:
+            prices = await provider.fetch(session, pairs)
+            prices = {pair: price for pair, price in prices.items() if price is not None and price > 0}
+            if not prices:
+                raise ValueError('no valid prices in response')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            provider.stats.record_failure(time.perf_counter() - started, e)
+            logger.warning("PRICE_PROVIDERS: %s failed: %s", provider.name, e)
+            return None
+        provider.stats.record_success(time.perf_counter() - started)
+        return prices
+
+    async def fetch(self, pairs):
+        """Returns {(coin_id, vs_currency): price} for the pairs any provider answered in time."""
+        pairs = list(pairs)
+        session = await self._get_session()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.deadline_seconds
+        waiting_providers = self.ranked_providers()
+        running = {}
+        answers = []
+
+        def launch_next():
+            provider = waiting_providers.pop(0)
+            running[asyncio.ensure_future(self._timed_fetch(provider, session, pairs))] = provider
+
+        for _ in range(min(self.fanout, len(waiting_providers))):
+            launch_next()
+        try:
+            while running:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(running, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    running.pop(task)
+                    prices = task.result()
+                    if prices is None:
+                        if waiting_providers: # Hedge around the failure with the next-ranked provider
+                            launch_next()
+                        continue
+                    answers.append(prices)
+                    if self.mode == 'first' and all(pair in prices for pair in pairs):
+                        return prices
+        finally:
+            for task, provider in running.items(): # Stragglers
+                task.cancel()
+                provider.stats.record_cancelled(loop.time() - started)
+
+        if self.mode == 'first':
+            # Nobody answered every pair in time: take each pair from the fastest answer that has it
+            combined = {}
+            for prices in answers:
+                for pair, price in prices.items():
+                    combined.setdefault(pair, price)
+            return combined
+        return {
+            pair: statistics.median(prices[pair] for prices in answers if pair in prices)
+            for pair in pairs
+            if any(pair in prices for prices in answers)
+        }
+
+    def fetch_sync(self, pairs):
+        """Blocking wrapper for threaded callers. Returns {} if the background loop does not answer in time."""
+        future = asyncio.run_coroutine_threadsafe(self.fetch(pairs), _get_event_loop())
+        try:
+            return future.result(timeout=self.deadline_seconds + 1)
+        except Exception as e:
+            future.cancel()
+            logger.warning("PRICE_PROVIDERS: Hedged fetch failed: %s", e)
+            return {}
+
+    def stats(self):
+        return {provider.name: provider.stats.snapshot() for provider in self.ranked_providers()}
+
+
+def build_hedged_client(provider_names, mode=DEFAULT_HEDGE_MODE, deadline_seconds=DEFAULT_DEADLINE_SECONDS, fanout=DEFAULT_FANOUT):
+    """Creates a HedgedPriceClient from provider names such as ['coingecko', 'binance', 'coinbase']."""
+    if aiohttp is None:
+        raise RuntimeError("Hedged price fetching requires aiohttp (pip install aiohttp).")
+    unknown = [name for name in provider_names if name not in PROVIDER_CLASSES]
+    if unknown:
+        raise ValueError(f"Unknown price provider(s): {', '.join(unknown)}. Available: {', '.join(PROVIDER_CLASSES)}")
+    return HedgedPriceClient([PROVIDER_CLASSES[name]() for name in provider_names], mode=mode, deadline_seconds=deadline_seconds, fanout=fanout)
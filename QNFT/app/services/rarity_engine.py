@@ -0,0 +1,164 @@
+# QNFT/app/services/rarity_engine.py
+import bisect
+import math
+import threading
+import collections
+
+# Statistical rarity: an NFT's score is the sum over trait types of -log(share of NFTs with
+# its value), so rare trait values add more. Per-trait value counters are updated in
+# O(traits) per mint. Scores are only computed when asked for, once per distinct trait
+# combination, and memoized with the counters' version, so a burst of queries between two
+# mints reuses them. The sorted rarity ranking is rebuilt from those scores the same way.
+# A rarity percentile is the share of NFTs strictly less rare, from 0 (most common) to 1.
+BTC_PRICE_BAND = 1000.0 # Price traits are banded, otherwise every NFT would be unique
+SOL_PRICE_BAND = 5.0
+# Metadata attributes that are continuous values (covered by the banded traits) or unique per NFT
+IGNORED_ATTRIBUTES = {'Timestamp', 'BTC Price at Mint', 'SOL Price at Mint', 'Mint Type'}
+
+
+def _band(price, width):
+    if isinstance(price, bool) or not isinstance(price, (int, float)):
+        return None
+    return math.floor(price / width) * width
+
+def _hashable(value):
+    return value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+
+def nft_traits(nft):
+    """Returns the NFT's traits as a sorted tuple of (trait_type, value) pairs."""
+    mint_type = nft.get('mint_type')
+    traits = {
+        'Mint Type': mint_type if isinstance(mint_type, str) else None,
+        'BTC Price Band': _band(nft.get('btc_price_at_mint'), BTC_PRICE_BAND),
+        'SOL Price Band': _band(nft.get('sol_price_at_mint'), SOL_PRICE_BAND),
+    }
+    for attribute in nft.get('attributes') or []:
+        if isinstance(attribute, dict) and attribute.get('trait_type') not in IGNORED_ATTRIBUTES:
+            traits.setdefault(str(attribute.get('trait_type')), _hashable(attribute.get('value')))
+    return tuple(sorted(traits.items()))
+
+
+class RarityIndex:
+    """Trait counters, memoized rarity scores and the rarity ranking of the market's NFTs."""
+
+    def __init__(self):
+        self._trait_counts = {} # Format: {trait_type: Counter({value: count})}
+        self._trait_present = collections.Counter() # NFTs that have each trait type at all
+        self._groups = {} # Format: {traits: [seq, ...]}; NFTs with the same traits share a score
+        self._traits_of = {} # Format: {seq: traits}
+        self._version = 0 # Bumped on every added NFT; memoized scores from older versions are stale
+        self._scores = {} # Format: {traits: (version, score)}
+        self._ranking = None # Format: (version, seqs, scores, percentiles, {seq: position}), least rare first
+        self._last_seq = -1 # Newest store seq already counted
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._traits_of)
+
+    @property
+    def version(self):
+        return self._version
+
+    def _add(self, seq, nft):
+        traits = nft_traits(nft)
+        for trait_type, value in traits:
+            self._trait_counts.setdefault(trait_type, collections.Counter())[value] += 1
+            self._trait_present[trait_type] += 1
+        self._groups.setdefault(traits, []).append(seq)
+        self._traits_of[seq] = traits
+        self._version += 1
+
+    def sync(self, store):
+        """Counts the traits of NFTs added to store since the last sync (O(traits) per NFT)."""
+        with self._lock:
+            for seq, nft in store.nfts_after(self._last_seq):
+                self._add(seq, nft)
+                self._last_seq = seq
+
+    def clear(self):
+        with self._lock:
+            self._trait_counts.clear()
+            self._trait_present.clear()
+            self._groups.clear()
+            self._traits_of.clear()
+            self._scores.clear()
+            self._ranking = None
+            self._version += 1
+            self._last_seq = -1
+
+    def _score(self, traits):
+        """Rarity score of a trait combination at the current version. Caller holds the lock."""
+        memo = self._scores.get(traits)
+        if memo and memo[0] == self._version:
+            return memo[1]
+        total = len(self._traits_of)
+        values = dict(traits)
+        score = 0.0
+        for trait_type, counts in self._trait_counts.items():
+            # An NFT without a trait type shares the "missing" value with every other NFT lacking it
+            count = counts[values[trait_type]] if trait_type in values else total - self._trait_present[trait_type]
+            score += math.log(total / count)
+        self._scores[traits] = (self._version, score)
+        return score
+
+    def _ranked(self):
+        """Returns the ranking, rebuilt if NFTs were added since it was built. Caller holds the lock."""
+        if self._ranking is None or self._ranking[0] != self._version:
+            groups = sorted((self._score(traits), seqs) for traits, seqs in self._groups.items())
+            last_position = max(len(self._traits_of) - 1, 1)
+            seqs, scores, percentiles = [], [], []
+            for score, group_seqs in groups:
+                if not scores or score != scores[-1]: # Different traits with an equal score share a percentile
+                    percentile = len(seqs) / last_position # Share of NFTs strictly less rare
+                for seq in group_seqs:
+                    seqs.append(seq)
+                    scores.append(score)
+                    percentiles.append(percentile)
+            self._ranking = (self._version, seqs, scores, percentiles, {seq: i for i, seq in enumerate(seqs)})
+        return self._ranking
+
+    def score_of(self, seq):
+        """Returns an NFT's rarity score right now (O(traits), no ranking rebuild), or None if unknown."""
+        with self._lock:
+            traits = self._traits_of.get(seq)
+            return None if traits is None else self._score(traits)
+
+    def rarity(self, seq):
+        """Returns {'score', 'percentile', 'rank'} (rank 1 is the rarest; ties share a rank) for an NFT, or None if unknown."""
+        with self._lock:
+            _, seqs, scores, percentiles, position_of = self._ranked()
+            position = position_of.get(seq)
+            if position is None:
+                return None
+            rarer = len(seqs) - bisect.bisect_right(percentiles, percentiles[position])
+            return {'score': round(scores[position], 6), 'percentile': round(percentiles[position], 6), 'rank': rarer + 1}
+
+    def percentile(self, seq):
+        with self._lock:
+            _, _, _, percentiles, position_of = self._ranked()
+            position = position_of.get(seq)
+            return None if position is None else percentiles[position]
+
+    def top(self, limit):
+        """Returns the seqs of the `limit` rarest NFTs, rarest first (newest first among equally rare ones)."""
+        with self._lock:
+            seqs = self._ranked()[1]
+            return seqs[max(0, len(seqs) - limit):][::-1] if limit > 0 else []
+
+    def _percentile_bounds(self, low, high):
+        """Ranking positions [lo, hi) of NFTs with a percentile in [low, high]. Caller holds the lock."""
+        percentiles = self._ranked()[3]
+        lo = 0 if low is None else bisect.bisect_left(percentiles, low)
+        hi = len(percentiles) if high is None else bisect.bisect_right(percentiles, high)
+        return lo, max(lo, hi)
+
+    def count_between(self, low, high):
+        """Number of NFTs with a rarity percentile in [low, high] (None: unbounded)."""
+        with self._lock:
+            lo, hi = self._percentile_bounds(low, high)
+            return hi - lo
+
+    def seqs_between(self, low, high):
+        with self._lock:
+            lo, hi = self._percentile_bounds(low, high)
+            return set(self._ranked()[1][lo:hi])
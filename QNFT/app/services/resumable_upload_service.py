@@ -0,0 +1,224 @@
+# QNFT/app/services/resumable_upload_service.py
+import io
+import re
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+import weakref
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+from app.services.image_upload_service import allowed_file, handle_image_upload
+from app.services.storage_service import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Protocol: init -> upload numbered chunks (any order, retries allowed) -> finalize.
+# Every chunk is written straight through to the upload store under resumable/<upload_id>/,
+# next to a small manifest, so an interrupted client can ask which chunks are missing and
+# continue from any app node. Sessions older than SESSION_TTL_SECONDS (finished or not)
+# are treated as unknown and deleted, chunks included, by a sweep that runs when new
+# sessions start (at most once per SESSION_SWEEP_INTERVAL_SECONDS per process).
+DEFAULT_CHUNK_SIZE_BYTES = 1024 * 1024 # 1 MB, well below the per-request MAX_CONTENT_LENGTH
+MIN_CHUNK_SIZE_BYTES = 64 * 1024
+SESSION_PREFIX = 'resumable/'
+MANIFEST_NAME = 'manifest.json'
+_UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+SESSION_TTL_SECONDS = 24 * 3600
+SESSION_SWEEP_INTERVAL_SECONDS = 10 * 60
+
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+_finalize_locks = weakref.WeakValueDictionary() # Format: {upload_id: Lock}, held while a session is finalized
+_finalize_locks_lock = threading.Lock()
+
+def _session_prefix(upload_id):
+    return f"{SESSION_PREFIX}{upload_id}/"
+
+def _chunk_key(upload_id, index):
+    return f"{_session_prefix(upload_id)}chunk_{index:06d}"
+
+def _write_manifest(upload_store, upload_id, manifest):
+    data = json.dumps(manifest).encode('utf-8')
+    upload_store.save_fileobj(f"{_session_prefix(upload_id)}{MANIFEST_NAME}", io.BytesIO(data))
+
+def _load_manifest(upload_store, upload_id):
+    manifest_key = f"{_session_prefix(upload_id)}{MANIFEST_NAME}"
+    if not upload_store.exists(manifest_key):
+        return None
+    return json.loads(b"".join(upload_store.iter_chunks(manifest_key)).decode('utf-8'))
+
+def _is_expired(manifest, now=None):
+    return (now or time.time()) - manifest.get('created_at', 0) > SESSION_TTL_SECONDS
+
+def _read_manifest(upload_store, upload_id):
+    """Returns the session manifest, or None if the upload_id is unknown, malformed or expired."""
+    if not upload_id or not _UPLOAD_ID_PATTERN.match(upload_id):
+        return None
+    manifest = _load_manifest(upload_store, upload_id)
+    if manifest is None or _is_expired(manifest):
+        return None
+    return manifest
+
+def _delete_session(upload_store, upload_id):
+    """Deletes the session's manifest and chunks; returns False if there was nothing to delete."""
+    keys = upload_store.list_keys(_session_prefix(upload_id))
+    for key in keys:
+        upload_store.delete(key)
+    return bool(keys)
+
+def expire_upload_sessions(upload_folder, force=False):
+    """
+    Deletes every session (manifest and chunks) older than SESSION_TTL_SECONDS, and chunks
+    left without a manifest. Runs at most once per SESSION_SWEEP_INTERVAL_SECONDS unless
+    force is set. Returns the number of sessions deleted.
+    """
+    global _last_sweep
+    now = time.time()
+    with _sweep_lock:
+        if not force and now - _last_sweep < SESSION_SWEEP_INTERVAL_SECONDS:
+            return 0
+        _last_sweep = now
+    upload_store = get_storage(upload_folder)
+    upload_ids = {key[len(SESSION_PREFIX):].split('/')[0] for key in upload_store.list_keys(SESSION_PREFIX)}
+    expired = 0
+    for upload_id in filter(_UPLOAD_ID_PATTERN.match, upload_ids):
+        manifest = _load_manifest(upload_store, upload_id)
+        if (manifest is None or _is_expired(manifest, now)) and _delete_session(upload_store, upload_id):
+            expired += 1
+    if expired:
+        logger.info("RESUMABLE_UPLOAD: Deleted %s expired upload sessions.", expired)
+    return expired
+
+def _received_chunks(upload_store, upload_id):
+    prefix = f"{_session_prefix(upload_id)}chunk_"
+    return sorted(int(key[len(prefix):]) for key in upload_store.list_keys(_session_prefix(upload_id)) if key.startswith(prefix))
+
+def _expected_chunk_size(manifest, index):
+    if index < manifest['total_chunks'] - 1:
+        return manifest['chunk_size']
+    return manifest['total_size'] - manifest['chunk_size'] * (manifest['total_chunks'] - 1)
+
+def init_resumable_upload(filename, total_size, upload_folder, allowed_extensions, max_size_bytes, chunk_size=None):
+    """
+    Starts a resumable upload session.
+    The file name and total size are validated up front so clients fail fast before sending any chunk.
+    Returns a dictionary with status, upload_id, chunk_size and total_chunks (on success) or error message.
+    """
+    if not filename:
+        return {'status': 'error', 'message': 'No file selected.'}
+    filename = secure_filename(filename)
+    if not allowed_file(filename, allowed_extensions):
+        return {'status': 'error', 'message': f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}"}
+    if not isinstance(total_size, int) or total_size <= 0:
+        return {'status': 'error', 'message': 'Invalid total_size. Must be a positive integer.'}
+    if total_size > max_size_bytes:
+        return {'status': 'error', 'message': f'File exceeds maximum size of {max_size_bytes // (1024*1024)}MB.'}
+
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE_BYTES
+    if not isinstance(chunk_size, int) or not MIN_CHUNK_SIZE_BYTES <= chunk_size <= max_size_bytes:
+        return {'status': 'error', 'message': f'Invalid chunk_size. Must be between {MIN_CHUNK_SIZE_BYTES} and {max_size_bytes} bytes.'}
+
+    expire_upload_sessions(upload_folder)
+    upload_id = uuid.uuid4().hex
+    manifest = {
+        'filename': filename,
+        'total_size': total_size,
+        'chunk_size': chunk_size,
+        'total_chunks': -(-total_size // chunk_size), # Ceiling division
+        'created_at': time.time(),
+        'file_id': None
+    }
+    _write_manifest(get_storage(upload_folder), upload_id, manifest)
+    logger.info("RESUMABLE_UPLOAD: Started session %s for %s (%s bytes, %s chunks).", upload_id, filename, total_size, manifest['total_chunks'])
+    return {'status': 'success', 'upload_id': upload_id, 'chunk_size': chunk_size, 'total_chunks': manifest['total_chunks']}
+
+def store_upload_chunk(upload_id, index, data, upload_folder):
+    """
+    Writes one numbered chunk through to the upload store. Re-sending a chunk overwrites it,
+    so clients can simply retry whatever the status call reports as missing.
+    """
+    upload_store = get_storage(upload_folder)
+    manifest = _read_manifest(upload_store, upload_id)
+    if manifest is None:
+        return {'status': 'error', 'message': 'Upload session not found.'}
+    if manifest['file_id']:
+        return {'status': 'error', 'message': 'Upload session already finalized.'}
+    if not 0 <= index < manifest['total_chunks']:
+        return {'status': 'error', 'message': f"Invalid chunk index. Must be between 0 and {manifest['total_chunks'] - 1}."}
+    expected_size = _expected_chunk_size(manifest, index)
+    if len(data) != expected_size:
+        return {'status': 'error', 'message': f'Invalid chunk size for chunk {index}: expected {expected_size} bytes, got {len(data)}.'}
+
+    upload_store.save_fileobj(_chunk_key(upload_id, index), io.BytesIO(data))
+    return {'status': 'success', 'upload_id': upload_id, 'chunk_index': index}
+
+def get_upload_status(upload_id, upload_folder):
+    """Reports which chunks the store already holds, so a reconnecting client can resume."""
+    upload_store = get_storage(upload_folder)
+    manifest = _read_manifest(upload_store, upload_id)
+    if manifest is None:
+        return {'status': 'error', 'message': 'Upload session not found.'}
+    received = _received_chunks(upload_store, upload_id)
+    received_set = set(received)
+    return {
+        'status': 'success',
+        'upload_id': upload_id,
+        'filename': manifest['filename'],
+        'chunk_size': manifest['chunk_size'],
+        'total_chunks': manifest['total_chunks'],
+        'received_chunks': received,
+        'missing_chunks': [i for i in range(manifest['total_chunks']) if i not in received_set],
+        'file_id': manifest['file_id']
+    }
+
+def finalize_resumable_upload(upload_id, upload_folder, allowed_extensions, max_size_bytes):
+    """
+    Assembles the chunks and hands the result to handle_image_upload, so exactly the same
+    validation and naming as the single-shot upload route apply. Finalizing an already
+    finalized session returns the same file_id instead of storing the image twice; concurrent
+    finalizes of one session (in this process) run one after the other, so the second sees it.
+    """
+    if not upload_id or not _UPLOAD_ID_PATTERN.match(upload_id):
+        return {'status': 'error', 'message': 'Upload session not found.'}
+    with _finalize_locks_lock:
+        lock = _finalize_locks.setdefault(upload_id, threading.Lock())
+    with lock:
+        return _finalize_locked(upload_id, upload_folder, allowed_extensions, max_size_bytes)
+
+def _finalize_locked(upload_id, upload_folder, allowed_extensions, max_size_bytes):
+    upload_store = get_storage(upload_folder)
+    manifest = _read_manifest(upload_store, upload_id)
+    if manifest is None:
+        return {'status': 'error', 'message': 'Upload session not found.'}
+    if manifest['file_id']:
+        return {'status': 'success', 'file_id': manifest['file_id'], 'path': upload_store.uri(manifest['file_id'])}
+
+    received = _received_chunks(upload_store, upload_id)
+    if len(received) != manifest['total_chunks']:
+        return {'status': 'error', 'message': f"Upload incomplete: {len(received)} of {manifest['total_chunks']} chunks received."}
+
+    # Spooled to disk past 1 MB so assembling a large upload does not hold it all in memory
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as assembled:
+        for index in range(manifest['total_chunks']):
+            for piece in upload_store.iter_chunks(_chunk_key(upload_id, index)):
+                assembled.write(piece)
+        if assembled.tell() != manifest['total_size']:
+            return {'status': 'error', 'message': 'Upload incomplete: assembled size does not match total_size.'}
+        assembled.seek(0)
+        result = handle_image_upload(
+            file_storage_object=FileStorage(stream=assembled, filename=manifest['filename']),
+            upload_folder=upload_folder,
+            allowed_extensions=allowed_extensions,
+            max_size_bytes=max_size_bytes
+        )
+
+    if result['status'] == 'success':
+        manifest['file_id'] = result['file_id']
+        _write_manifest(upload_store, upload_id, manifest)
+        for index in range(manifest['total_chunks']):
+            upload_store.delete(_chunk_key(upload_id, index))
+        logger.info("RESUMABLE_UPLOAD: Finalized session %s as %s.", upload_id, result['file_id'])
+    return result
@@ -0,0 +1,98 @@
+# QNFT/app/services/serial_allocator.py
+import os
+import logging
+import threading
+from app.utils.sqlite_utils import get_connection
+
+logger = logging.getLogger(__name__)
+
+# NFT serial numbers ("QNFT #0042") that stay unique across threads and worker processes.
+# Serials are handed out hi/lo style: a process reserves a block of BLOCK_SIZE serials
+# with one write transaction on the shared SQLite database (the marketplace's), then
+# serves them from a local range iterator. next() on it is a single C call, so threads
+# need no lock on the hot path; the lock is only taken to reserve the next block. Serials
+# left in a block when a worker exits are skipped, so names are unique and increasing
+# per process, but not gapless. Without a database, blocks come from a process-local
+# counter (one process only, restarting at 1).
+BLOCK_SIZE = 100
+SERIAL_NAME = 'nft' # Row of the serial_blocks table used for NFT names
+
+
+class SerialAllocator:
+    """Hands out serials from blocks reserved in the database at path (None: in memory)."""
+
+    _SCHEMA = "CREATE TABLE IF NOT EXISTS serial_blocks (name TEXT PRIMARY KEY, next_serial INTEGER NOT NULL)"
+    _INIT_SQL = "INSERT OR IGNORE INTO serial_blocks (name, next_serial) VALUES (?, 1)"
+    _RESERVE_SQL = "UPDATE serial_blocks SET next_serial = next_serial + ? WHERE name = ?"
+    _READ_SQL = "SELECT next_serial FROM serial_blocks WHERE name = ?"
+
+    def __init__(self, path=None, name=SERIAL_NAME, block_size=BLOCK_SIZE):
+        self.path = path or None
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._block = iter(()) # Serials of the current block not handed out yet
+        self._next_local = 1 # In-memory mode only: first serial of the next block
+        if path:
+            get_connection(path).execute(self._SCHEMA)
+
+    def next_serial(self):
+        while True:
+            block = self._block
+            try:
+                return next(block)
+            except StopIteration:
+                with self._lock:
+                    if self._block is block: # Not replaced by another thread meanwhile
+                        self._block = iter(self._reserve_block())
+
+    def discard_block(self):
+        """Drops the rest of the current block (a forked child must not reuse its parent's)."""
+        self._block = iter(())
+
+    def _reserve_block(self):
+        if not self.path:
+            start, self._next_local = self._next_local, self._next_local + self.block_size
+            return range(start, start + self.block_size)
+        conn = get_connection(self.path)
+        conn.execute('BEGIN IMMEDIATE') # Serializes reservations across processes
+        try:
+            conn.execute(self._INIT_SQL, (self.name,))
+            conn.execute(self._RESERVE_SQL, (self.block_size, self.name))
+            (end,) = conn.execute(self._READ_SQL, (self.name,)).fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        logger.debug("SERIAL_ALLOCATOR: Reserved %s serials %s-%s.", self.name, end - self.block_size, end - 1)
+        return range(end - self.block_size, end)
+
+
+_allocator = SerialAllocator()
+
+def configure_serial_allocator(db_path, block_size=BLOCK_SIZE):
+    """
+    Reserves serials in the SQLite database at db_path (None: back to a process-local counter).
+    Calling it again with the same path (or None again) is a no-op, so the current block and
+    the in-memory counter are kept.
+    """
+    global _allocator
+    if _allocator.path == (db_path or None):
+        return
+    _allocator = SerialAllocator(db_path, block_size=block_size)
+    logger.info("SERIAL_ALLOCATOR: Reserving blocks of %s serials in %s.", block_size, db_path or 'memory')
+
+def next_nft_serial():
+    """Returns the next NFT serial number, unique across threads and (with a database) processes."""
+    return _allocator.next_serial()
+
+def _reset_serial_allocator():
+    """Back to a fresh in-memory allocator starting at 1 (used by tests)."""
+    global _allocator
+    _allocator = SerialAllocator()
+
+def _discard_block_in_child():
+    _allocator.discard_block()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_discard_block_in_child)
@@ -2,11 +2,12 @@ import os
 import json
 import datetime
 import logging
-from app.services.price_fetcher import get_btc_usdc_price, get_sol_usdc_price
+from app.services.price_fetcher import get_price_snapshot, BTC_USDC_KEY, SOL_USDC_KEY
 from app.utils.cryptography_utils import encrypt_metadata_kyber
+from app.services.storage_service import get_storage_for_uri
+from app.services.serial_allocator import next_nft_serial
 
-# Configure basic logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 # --- Configuration (Placeholders) ---
 ADMIN_WALLET_ADDRESS = "EuSgddsfPspi1kkdnosEcndymiKE998zUqWfKBpDAbG2" # For fee collection
@@ -17,7 +18,7 @@ SOLANA_RPC_URL = "https://api.devnet.solana.com" # Using Devnet for testing
 # --- Wallet Interaction (Conceptual Placeholders) ---
 def get_user_wallet_balance(user_wallet_address: str) -> float:
     """Placeholder: Simulates checking a user's SOL balance."""
-    logging.info(f"SOLANA_SERVICE: Checking balance for {user_wallet_address} (Placeholder).")
+    logger.debug("SOLANA_SERVICE: Checking balance for %s (Placeholder).", user_wallet_address)
     # In a real scenario, this would use Solana SDK:
     # from solana.rpc.api import Client
     # client = Client(SOLANA_RPC_URL)
@@ -25,24 +26,20 @@ def get_user_wallet_balance(user_wallet_address: str) -> float:
     #     balance_response = client.get_balance(user_wallet_address)
     #     return balance_response.value / 1_000_000_000  # Lamports to SOL
     # except Exception as e:
-    #     logging.error(f"SOLANA_SERVICE: Error fetching balance for {user_wallet_address}: {e}")
+    #     logger.error("SOLANA_SERVICE: Error fetching balance for %s: %s", user_wallet_address, e)
     #     return 0.0
     return 100.0  # Return a high dummy value for now
 
 def get_user_public_key() -> str:
     """Placeholder: Returns a dummy public key string."""
     # In a real app, this would come from user authentication / connected wallet
-    logging.info("SOLANA_SERVICE: Fetching user public key (Placeholder).")
+    logger.debug("SOLANA_SERVICE: Fetching user public key (Placeholder).")
     return "USER_DUMMY_PUBLIC_KEY_HERE_12345"
 
 # --- Metadata Preparation ---
-_nft_serial_number = 0 # In-memory serial, reset each run. Use DB/persistent storage in prod.
-
 def get_next_nft_serial() -> int:
-    """Generates a unique serial number for NFT naming. Placeholder, not for production."""
-    global _nft_serial_number
-    _nft_serial_number += 1
-    return _nft_serial_number
+    """Generates a unique serial number for NFT naming (see serial_allocator)."""
+    return next_nft_serial()
 
 def prepare_nft_metadata(
     gif_url: str, 
@@ -108,10 +105,10 @@ def prepare_nft_metadata(
     }
     
     metadata_json_string = json.dumps(metadata_dict, indent=2)
-    logging.info(f"SOLANA_SERVICE: Prepared Raw Metadata:\n{metadata_json_string}")
+    logger.debug("SOLANA_SERVICE: Prepared Raw Metadata:\n%s", metadata_json_string)
     
     encrypted_metadata_string = encrypt_metadata_kyber(metadata_json_string)
-    logging.info("SOLANA_SERVICE: Metadata 'encrypted' with Kyber placeholder.")
+    logger.debug("SOLANA_SERVICE: Metadata 'encrypted' with Kyber placeholder.")
     
     return encrypted_metadata_string, metadata_dict
 
@@ -119,36 +116,43 @@ def prepare_nft_metadata(
 # --- Core Minting Function (Placeholder for actual minting) ---
 def mint_qnft(
     user_choice_mint_type: str, 
-    generated_gif_local_path: str, # Local path from previous step
-    uploaded_image_local_path: str, # Local path from upload step
+    generated_gif_local_path: str, # Storage location from previous step (local path or s3:// URI)
+    uploaded_image_local_path: str, # Storage location from upload step (local path or s3:// URI)
     user_description: str = None
 ) -> dict:
     """
     Orchestrates the NFT minting process (Simulated).
     """
-    logging.info(f"SOLANA_SERVICE: Starting QNFT minting process for mint_type: {user_choice_mint_type}")
+    logger.info("SOLANA_SERVICE: Starting QNFT minting process for mint_type: %s", user_choice_mint_type)
 
     # Step 1: Upload Assets (Placeholder)
-    logging.info("SOLANA_SERVICE: Step 1 - Asset Upload (Placeholder)")
+    logger.debug("SOLANA_SERVICE: Step 1 - Asset Upload (Placeholder)")
     # In a real scenario, these files would be uploaded to Arweave/IPFS.
-    # The uploader would return permanent URLs.
+    # The uploader would stream each asset out of its store and return permanent URLs.
     # Example:
-    # gif_url = upload_to_arweave(generated_gif_local_path)
-    # original_image_url = upload_to_arweave(uploaded_image_local_path)
+    # gif_store, gif_key = get_storage_for_uri(generated_gif_local_path)
+    # gif_url = upload_to_arweave(gif_store.iter_chunks(gif_key))
+    for asset_location in (generated_gif_local_path, uploaded_image_local_path):
+        asset_store, asset_key = get_storage_for_uri(asset_location)
+        if asset_store.exists(asset_key):
+            logger.debug("SOLANA_SERVICE: Asset %s available in %s storage for upload.", asset_key, asset_store.backend_name)
+        else:
+            logger.warning("SOLANA_SERVICE: Asset %s not found in %s storage.", asset_location, asset_store.backend_name)
     gif_url = f"https://arweave.net/placeholder_gif_{os.path.basename(generated_gif_local_path)}"
     original_image_url = f"https://arweave.net/placeholder_img_{os.path.basename(uploaded_image_local_path)}"
-    logging.info(f"SOLANA_SERVICE: Simulated GIF URL: {gif_url}")
-    logging.info(f"SOLANA_SERVICE: Simulated Original Image URL: {original_image_url}")
+    logger.debug("SOLANA_SERVICE: Simulated GIF URL: %s", gif_url)
+    logger.debug("SOLANA_SERVICE: Simulated Original Image URL: %s", original_image_url)
 
     # Step 2: Fetch Prices & Timestamp
-    logging.info("SOLANA_SERVICE: Step 2 - Fetching Prices & Timestamp")
-    btc_price = get_btc_usdc_price()
-    sol_price = get_sol_usdc_price()
+    logger.debug("SOLANA_SERVICE: Step 2 - Fetching Prices & Timestamp")
+    prices = get_price_snapshot() # BTC and SOL from the same fetch, so the metadata is consistent
+    btc_price = prices.get(BTC_USDC_KEY)
+    sol_price = prices.get(SOL_USDC_KEY)
     timestamp_obj = datetime.datetime.now(datetime.timezone.utc)
     timestamp_str = timestamp_obj.strftime("%Y-%m-%d %H:%M:%S UTC")
 
     # Step 3: Prepare Metadata
-    logging.info("SOLANA_SERVICE: Step 3 - Preparing NFT Metadata")
+    logger.debug("SOLANA_SERVICE: Step 3 - Preparing NFT Metadata")
     try:
         encrypted_metadata, raw_metadata_dict = prepare_nft_metadata(
             gif_url=gif_url,
@@ -160,28 +164,28 @@ def mint_qnft(
             user_description=user_description
         )
     except Exception as e:
-        logging.error(f"SOLANA_SERVICE: Error preparing metadata: {e}")
+        logger.error("SOLANA_SERVICE: Error preparing metadata: %s", e)
         return {'status': 'error', 'message': f'Metadata preparation failed: {e}'}
 
     # Step 4: User Balance Check (Placeholder)
-    logging.info("SOLANA_SERVICE: Step 4 - User Balance Check (Placeholder)")
+    logger.debug("SOLANA_SERVICE: Step 4 - User Balance Check (Placeholder)")
     user_wallet_address = get_user_public_key() # Get current user's wallet
     user_balance = get_user_wallet_balance(user_wallet_address)
     if user_balance < MINT_FEE_SOL:
-        logging.warning(f"SOLANA_SERVICE: Insufficient balance for user {user_wallet_address}. Balance: {user_balance} SOL, Fee: {MINT_FEE_SOL} SOL")
+        logger.warning("SOLANA_SERVICE: Insufficient balance for user %s. Balance: %s SOL, Fee: %s SOL", user_wallet_address, user_balance, MINT_FEE_SOL)
         return {'status': 'error', 'message': 'Insufficient SOL balance for minting fee.'}
-    logging.info(f"SOLANA_SERVICE: User {user_wallet_address} has sufficient balance: {user_balance} SOL.")
+    logger.debug("SOLANA_SERVICE: User %s has sufficient balance: %s SOL.", user_wallet_address, user_balance)
 
     # Step 5: Collect Fee (Placeholder)
-    logging.info("SOLANA_SERVICE: Step 5 - Fee Collection (Placeholder)")
-    logging.info(f"SOLANA_SERVICE: Simulate transferring {MINT_FEE_SOL} SOL from {user_wallet_address} to admin {ADMIN_WALLET_ADDRESS}.")
+    logger.debug("SOLANA_SERVICE: Step 5 - Fee Collection (Placeholder)")
+    logger.debug("SOLANA_SERVICE: Simulate transferring %s SOL from %s to admin %s.", MINT_FEE_SOL, user_wallet_address, ADMIN_WALLET_ADDRESS)
     # In a real scenario, this would be part of the minting transaction or a separate transaction.
 
     # Step 6: Metaplex Minting (Critical Placeholder)
-    logging.info("SOLANA_SERVICE: Step 6 - Metaplex Minting (CRITICAL PLACEHOLDER)")
-    logging.info("SOLANA_SERVICE: This is where the actual Metaplex minting command or SDK call would occur.")
-    logging.info("SOLANA_SERVICE: This requires the user's keypair/signature for the transaction.")
-    logging.info(f"SOLANA_SERVICE: Metadata to be used (encrypted placeholder): {encrypted_metadata[:100]}...") # Log snippet
+    logger.debug("SOLANA_SERVICE: Step 6 - Metaplex Minting (CRITICAL PLACEHOLDER)")
+    logger.debug("SOLANA_SERVICE: This is where the actual Metaplex minting command or SDK call would occur.")
+    logger.debug("SOLANA_SERVICE: This requires the user's keypair/signature for the transaction.")
+    logger.debug("SOLANA_SERVICE: Metadata to be used (encrypted placeholder): %s...", encrypted_metadata[:100]) # Log snippet
     
     # Feasibility of Python-based Metaplex interaction:
     # As of my last update, direct, full-featured Metaplex minting via a simple Python SDK call
@@ -219,7 +223,7 @@ def mint_qnft(
     # metadata_uri_on_permanent_storage = upload_json_to_arweave(encrypted_metadata) 
     metadata_uri_on_permanent_storage = f"https://arweave.net/placeholder_metadata_{raw_metadata_dict['name'].replace(' ','_')}.json"
 
-    logging.info(f"SOLANA_SERVICE: Simulated minting with metadata URI: {metadata_uri_on_permanent_storage}")
+    logger.debug("SOLANA_SERVICE: Simulated minting with metadata URI: %s", metadata_uri_on_permanent_storage)
     
     # Actual minting would involve constructing a transaction with instructions like:
     # - Create Mint Account (for the NFT)
@@ -231,7 +235,7 @@ def mint_qnft(
     # All signed by the user and potentially a fee payer.
 
     fake_tx_id = f"fake_tx_id_{datetime.datetime.now().timestamp()}"
-    logging.info(f"SOLANA_SERVICE: Minting simulation successful. Transaction ID: {fake_tx_id}")
+    logger.info("SOLANA_SERVICE: Minting simulation successful. Transaction ID: %s", fake_tx_id)
 
     return {
         'status': 'success',
@@ -239,11 +243,16 @@ def mint_qnft(
         'transaction_id': fake_tx_id,
         'metadata_uri': metadata_uri_on_permanent_storage,
         'raw_metadata': raw_metadata_dict, # For client-side display or verification
+        'owner_wallet': user_wallet_address, # Receives the NFT and paid the fee
+        'mint_fee_sol': MINT_FEE_SOL,
+        'mint_timestamp_iso': timestamp_obj.isoformat(), # Same instant as the "Timestamp" attribute, machine-readable
         'encrypted_metadata_preview': encrypted_metadata[:200] + "..." # Preview of what would be on-chain
     }
 
 if __name__ == '__main__':
-    logging.info("--- Testing Solana Service ---")
+    from app.utils.logging_config import configure_logging
+    configure_logging()
+    logger.info("--- Testing Solana Service ---")
     
     # Test metadata preparation
     print("\nTesting Metadata Preparation...")
@@ -280,4 +289,4 @@ if __name__ == '__main__':
     os.remove(dummy_gif_path)
     os.remove(dummy_img_path)
     
-    logging.info("--- Solana Service Test Complete ---")
+    logger.info("--- Solana Service Test Complete ---")
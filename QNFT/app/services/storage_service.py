@@ -0,0 +1,253 @@
+# QNFT/app/services/storage_service.py
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import contextlib
+
+# Optional dependency: only needed when QNFT_STORAGE_BACKEND=s3
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# 'local' keeps files on this node's disk; 's3' stores them in an S3-compatible bucket
+# so several app nodes behind a load balancer see the same uploads and GIFs.
+STORAGE_BACKEND = os.environ.get('QNFT_STORAGE_BACKEND', 'local')
+S3_BUCKET = os.environ.get('QNFT_S3_BUCKET')
+S3_ENDPOINT_URL = os.environ.get('QNFT_S3_ENDPOINT_URL') # e.g. MinIO or another local S3 stand-in
+S3_REGION = os.environ.get('QNFT_S3_REGION', 'us-east-1')
+
+S3_MAX_POOL_CONNECTIONS = 32 # Shared HTTP connection pool for all S3 calls in this process
+S3_MULTIPART_THRESHOLD_BYTES = 8 * 1024 * 1024 # Files above this are uploaded in parts
+S3_MULTIPART_CHUNK_BYTES = 8 * 1024 * 1024
+S3_MAX_TRANSFER_CONCURRENCY = 8 # Parts uploaded/downloaded in parallel per file
+S3_PRESIGNED_URL_EXPIRY_SECONDS = 3600
+STREAM_CHUNK_BYTES = 64 * 1024
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+_storage_instances = {} # Format: {local_root: storage_backend}
+_storage_instances_lock = threading.Lock()
+
+
+class LocalStorage:
+    """Stores objects as files below a local directory (single-node deployments)."""
+    backend_name = 'local'
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def save_fileobj(self, key, fileobj):
+        """Saves a file-like object (or werkzeug FileStorage) under key."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hasattr(fileobj, 'save'):
+            fileobj.save(path)
+        else:
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(fileobj, f, STREAM_CHUNK_BYTES)
+        return path
+
+    def upload_file(self, key, local_path, content_type=None):
+        """Copies a file from local_path into the store (no-op if it is already there)."""
+        path = self._path(key)
+        if os.path.abspath(local_path) != os.path.abspath(path):
+            os.makedirs(self.root, exist_ok=True)
+            shutil.copyfile(local_path, path)
+        return path
+
+    def iter_chunks(self, key, chunk_size=STREAM_CHUNK_BYTES):
+        """Yields the object's bytes in chunks without loading it fully into memory."""
+        with open(self._path(key), 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    @contextlib.contextmanager
+    def local_copy(self, key):
+        """Yields a local filesystem path holding the object's content."""
+        yield self._path(key)
+
+    @contextlib.contextmanager
+    def write_path(self, key):
+        """Yields a local path to write to; the content is stored under key on exit."""
+        os.makedirs(self.root, exist_ok=True)
+        yield self._path(key)
+
+    def list_keys(self, prefix):
+        """Returns the sorted keys stored below the given 'directory' prefix (e.g. 'resumable/abc/')."""
+        directory = self._path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f"{prefix}{name}" for name in os.listdir(directory))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def uri(self, key):
+        return self._path(key)
+
+    def public_url(self, key):
+        """Local files are served by Flask's static route, so no separate URL is needed."""
+        return None
+
+
+class S3Storage:
+    """Stores objects in an S3-compatible bucket using a pooled client and parallel multipart transfers."""
+    backend_name = 's3'
+
+    def __init__(self, bucket, prefix='', client=None, transfer_config=None):
+        if boto3 is None:
+            raise RuntimeError("The S3 storage backend requires boto3 (pip install boto3).")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client or _get_s3_client()
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD_BYTES,
+            multipart_chunksize=S3_MULTIPART_CHUNK_BYTES,
+            max_concurrency=S3_MAX_TRANSFER_CONCURRENCY,
+            use_threads=True
+        )
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def save_fileobj(self, key, fileobj):
+        """Streams a file-like object (or werkzeug FileStorage) into the bucket."""
+        stream = getattr(fileobj, 'stream', fileobj)
+        self.client.upload_fileobj(stream, self.bucket, self._key(key), Config=self.transfer_config)
+        return self.uri(key)
+
+    def upload_file(self, key, local_path, content_type=None):
+        """Uploads a local file; large files go up as parallel multipart uploads."""
+        extra_args = {'ContentType': content_type} if content_type else None
+        self.client.upload_file(local_path, self.bucket, self._key(key), ExtraArgs=extra_args, Config=self.transfer_config)
+        return self.uri(key)
+
+    def iter_chunks(self, key, chunk_size=STREAM_CHUNK_BYTES):
+        """Streams the object body from S3 in chunks."""
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+        try:
+            for chunk in body.iter_chunks(chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    @contextlib.contextmanager
+    def local_copy(self, key):
+        """Downloads the object (ranged, parallel for large objects) to a temp file and yields its path."""
+        temp_dir = tempfile.mkdtemp(prefix='qnft_s3_')
+        path = os.path.join(temp_dir, os.path.basename(key))
+        try:
+            self.client.download_file(self.bucket, self._key(key), path, Config=self.transfer_config)
+            yield path
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def write_path(self, key):
+        """Yields a temp path to write to and uploads it under key on successful exit."""
+        temp_dir = tempfile.mkdtemp(prefix='qnft_s3_')
+        path = os.path.join(temp_dir, os.path.basename(key))
+        try:
+            yield path
+            content_type = 'image/gif' if key.lower().endswith('.gif') else None
+            self.upload_file(key, path, content_type=content_type)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def list_keys(self, prefix):
+        """Returns the sorted keys stored below the given prefix (relative to this store's prefix)."""
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            keys.extend(obj['Key'][len(self.prefix):] for obj in page.get('Contents', []))
+        return sorted(keys)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def uri(self, key):
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+    def public_url(self, key):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._key(key)},
+            ExpiresIn=S3_PRESIGNED_URL_EXPIRY_SECONDS
+        )
+
+
+def _get_s3_client():
+    """Returns the process-wide S3 client (boto3 clients are thread-safe and pool connections)."""
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                if boto3 is None:
+                    raise RuntimeError("The S3 storage backend requires boto3 (pip install boto3).")
+                _s3_client = boto3.client(
+                    's3',
+                    endpoint_url=S3_ENDPOINT_URL,
+                    region_name=S3_REGION,
+                    config=BotoConfig(
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': 3, 'mode': 'standard'}
+                    )
+                )
+                logger.info("STORAGE_SERVICE: Created pooled S3 client (endpoint: %s).", S3_ENDPOINT_URL or 'AWS default')
+    return _s3_client
+
+def get_storage(local_root):
+    """
+    Returns the storage backend for a logical folder.
+    With the local backend, objects live directly in local_root. With the S3 backend,
+    the folder's name (e.g. 'uploads', 'generated_gifs') becomes the key prefix in S3_BUCKET.
+    """
+    with _storage_instances_lock:
+        storage = _storage_instances.get(local_root)
+        if storage is None:
+            if STORAGE_BACKEND == 's3':
+                if not S3_BUCKET:
+                    raise RuntimeError("QNFT_S3_BUCKET must be set when QNFT_STORAGE_BACKEND=s3.")
+                prefix = os.path.basename(os.path.normpath(local_root)) + '/'
+                storage = S3Storage(S3_BUCKET, prefix=prefix)
+            else:
+                storage = LocalStorage(local_root)
+            _storage_instances[local_root] = storage
+        return storage
+
+def get_storage_for_uri(uri):
+    """Splits a URI returned by a backend's uri() into (storage, key)."""
+    if uri.startswith('s3://'):
+        bucket, _, key = uri[len('s3://'):].partition('/')
+        return S3Storage(bucket), key
+    return get_storage(os.path.dirname(uri)), os.path.basename(uri)
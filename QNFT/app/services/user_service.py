@@ -1,4 +1,8 @@
 # QNFT/app/services/user_service.py
+import logging
+
+logger = logging.getLogger(__name__)
+
 _user_tiers = {
     "EuSgddsfPspi1kkdnosEcndymiKE998zUqWfKBpDAbG2": "admin", # Admin wallet from solana_service
     "USER_PUBLIC_KEY_1": "vip",
@@ -9,14 +13,14 @@ _user_tiers = {
 def get_user_tier(user_wallet_address: str) -> str:
     '''Placeholder for Wallet Tier System.'''
     tier = _user_tiers.get(user_wallet_address, "basic") # Default to 'basic' if not found
-    print(f"User Service: Wallet {user_wallet_address} is tier '{tier}'.")
+    logger.debug("User Service: Wallet %s is tier '%s'.", user_wallet_address, tier)
     return tier
 
 def check_feature_access(user_wallet_address: str, feature_name: str) -> bool:
     '''Placeholder for checking feature access based on tier.'''
     tier = get_user_tier(user_wallet_address)
     
-    print(f"User Service: Checking access for feature '{feature_name}' for tier '{tier}'.")
+    logger.debug("User Service: Checking access for feature '%s' for tier '%s'.", feature_name, tier)
     
     if feature_name == "advanced_gif_styles":
         # Allows pro, vip, and admin to access advanced styles
@@ -26,7 +30,7 @@ def check_feature_access(user_wallet_address: str, feature_name: str) -> bool:
         return tier in ["vip", "admin"]
     
     # Default: all other features are accessible by anyone
-    print(f"User Service: Feature '{feature_name}' has default access (True).")
+    logger.debug("User Service: Feature '%s' has default access (True).", feature_name)
     return True
 
 if __name__ == '__main__':
@@ -16,48 +16,123 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentGeneratedGifPath = null; // Server path of the GIF
     let currentGeneratedGifUrl = null;  // URL to display the GIF
 
-    // --- Price Fetching for Index Page ---
-    async function fetchPricesForDisplay() {
+    // --- Price Display for Index Page ---
+    // Prices are pushed over /prices/stream (server-sent events): one snapshot on connect, then
+    // small ticks whenever the server's refresher fetches new prices. EventSource reconnects on its own.
+    const livePrices = {}; // Format: {cache_key: {price, timestamp_ms, stale}}
+    let priceStream = null;
+
+    function renderPrices() {
         const btcElem = document.getElementById('btcPrice');
         const solElem = document.getElementById('solPrice');
         const tsElem = document.getElementById('timestamp');
+        if (!btcElem || !solElem || !tsElem) return;
 
-        if (!btcElem || !solElem || !tsElem) return; // Only run on index page
+        const formatPrice = (entry) => {
+            if (!entry || entry.price === null) return 'N/A';
+            return `${entry.price.toFixed(2)}${entry.stale ? ' (updating...)' : ''}`;
+        };
+        btcElem.textContent = `BTC/USDC: ${formatPrice(livePrices.bitcoin_usdc)}`;
+        solElem.textContent = `SOL/USDC: ${formatPrice(livePrices.solana_usdc)}`;
+        const times = Object.values(livePrices).map(p => p.timestamp_ms).filter(t => t);
+        const priceTime = times.length ? new Date(Math.min(...times)) : new Date();
+        tsElem.textContent = `Timestamp: ${priceTime.toLocaleString()}`;
+    }
 
-        try {
-            // Note: price_fetcher.py is a service, not directly exposed via Flask route yet.
-            // For now, we'll simulate or assume these prices might come from another source
-            // or that we'd need to add a route to expose get_btc_usdc_price and get_sol_usdc_price.
-            // SIMULATING for now as direct service call from JS is not possible.
-            // In a real setup, you'd fetch from an API endpoint that calls these services.
-            // Let's assume we add a Flask route /api/current_prices that returns this.
-            // For now, using placeholder values.
-            
-            // const response = await fetch('/api/current_prices'); // Hypothetical endpoint
-            // if (!response.ok) throw new Error('Failed to fetch prices');
-            // const prices = await response.json();
-            // btcElem.textContent = `BTC/USDC: ${prices.btc_usdc || 'N/A'}`;
-            // solElem.textContent = `SOL/USDC: ${prices.sol_usdc || 'N/A'}`;
-            // tsElem.textContent = `Timestamp: ${new Date(prices.timestamp).toLocaleString()}`;
-            
-            // Placeholder implementation until an endpoint is made:
-            btcElem.textContent = `BTC/USDC: Fetching... (dummy)`;
-            solElem.textContent = `SOL/USDC: Fetching... (dummy)`;
-            tsElem.textContent = `Timestamp: ${new Date().toLocaleString()}`;
-            // Simulate a delay then update with dummy values
-            setTimeout(() => {
-                btcElem.textContent = `BTC/USDC: ${(Math.random() * 10000 + 50000).toFixed(2)} (dummy)`;
-                solElem.textContent = `SOL/USDC: ${(Math.random() * 50 + 100).toFixed(2)} (dummy)`;
-            }, 1000);
+    function applyPriceSnapshot(prices) {
+        for (const [key, entry] of Object.entries(prices)) {
+            livePrices[key] = {
+                price: entry.price,
+                timestamp_ms: entry.age_seconds === null ? null : Date.now() - entry.age_seconds * 1000,
+                stale: entry.stale
+            };
+        }
+    }
 
+    function subscribeToPriceStream(handlers) {
+        if (priceStream || typeof EventSource === 'undefined') return priceStream;
+        priceStream = new EventSource('/prices/stream');
+        priceStream.addEventListener('snapshot', (e) => handlers.snapshot && handlers.snapshot(JSON.parse(e.data)));
+        priceStream.addEventListener('price', (e) => handlers.price && handlers.price(JSON.parse(e.data)));
+        priceStream.addEventListener('mint', (e) => handlers.mint && handlers.mint(JSON.parse(e.data)));
+        // Too many missed events to replay: reload the full state instead
+        priceStream.addEventListener('resync', () => handlers.resync && handlers.resync());
+        return priceStream;
+    }
+
+    async function fetchPricesForDisplay() {
+        if (!document.getElementById('btcPrice')) return; // Only run on index page
+        try {
+            // Served from the server's price cache, which a background refresher keeps warm
+            const response = await fetch('/prices/current');
+            if (!response.ok) throw new Error('Failed to fetch prices');
+            const { prices } = await response.json();
+            applyPriceSnapshot(prices);
+            renderPrices();
         } catch (error) {
             console.error('Error fetching prices:', error);
+            const btcElem = document.getElementById('btcPrice');
+            const solElem = document.getElementById('solPrice');
             if (btcElem) btcElem.textContent = 'BTC/USDC: Error';
             if (solElem) solElem.textContent = 'SOL/USDC: Error';
-            if (tsElem) tsElem.textContent = `Timestamp: ${new Date().toLocaleString()}`;
         }
     }
 
+    if (document.getElementById('btcPrice')) {
+        subscribeToPriceStream({
+            snapshot: ({ prices }) => { applyPriceSnapshot(prices); renderPrices(); },
+            price: ({ prices, timestamp }) => {
+                for (const [key, price] of Object.entries(prices)) {
+                    livePrices[key] = { price, timestamp_ms: timestamp, stale: false };
+                }
+                renderPrices();
+            },
+            resync: fetchPricesForDisplay
+        });
+    }
+
+
+    // --- Resumable Upload (init -> chunks -> finalize) ---
+    // Large images are sent in chunks so a dropped connection only costs the chunk in flight.
+    const RESUMABLE_UPLOAD_THRESHOLD_BYTES = 1024 * 1024;
+    const MAX_CHUNK_RETRIES = 5;
+
+    async function uploadImageResumable(imageFile, onProgress) {
+        const initResponse = await fetch('/upload_image/resumable', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: imageFile.name, total_size: imageFile.size })
+        });
+        const session = await initResponse.json();
+        if (!initResponse.ok) throw new Error(session.message || 'Could not start upload.');
+
+        let missing = [...Array(session.total_chunks).keys()];
+        for (let attempt = 0; missing.length > 0; attempt++) {
+            if (attempt > MAX_CHUNK_RETRIES) throw new Error('Upload failed after several retries.');
+            for (const index of missing) {
+                const start = index * session.chunk_size;
+                try {
+                    await fetch(`/upload_image/resumable/${session.upload_id}/chunks/${index}`, {
+                        method: 'PUT',
+                        headers: { 'Content-Type': 'application/octet-stream' },
+                        body: imageFile.slice(start, start + session.chunk_size)
+                    });
+                } catch (error) {
+                    console.warn(`Chunk ${index} failed, will resume:`, error);
+                }
+            }
+            // Ask the server what actually arrived and only resend the rest
+            try {
+                const status = await (await fetch(`/upload_image/resumable/${session.upload_id}`)).json();
+                missing = status.missing_chunks;
+                if (onProgress) onProgress(status.received_chunks.length, session.total_chunks);
+            } catch (error) {
+                await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
+            }
+        }
+
+        return fetch(`/upload_image/resumable/${session.upload_id}/finalize`, { method: 'POST' });
+    }
 
     // --- Index Page Logic (Upload, GIF Gen, Mint) ---
     const uploadForm = document.getElementById('uploadForm');
@@ -80,11 +155,17 @@ document.addEventListener('DOMContentLoaded', () => {
             if (gifMintSection) gifMintSection.style.display = 'none';
             if (generatedGifImg) generatedGifImg.style.display = 'none';
 
-            const formData = new FormData();
-            formData.append('file', imageFile);
-
             try {
-                const response = await fetch('/upload_image', { method: 'POST', body: formData });
+                let response;
+                if (imageFile.size > RESUMABLE_UPLOAD_THRESHOLD_BYTES) {
+                    response = await uploadImageResumable(imageFile, (received, total) => {
+                        updateStatus(uploadStatusEl, `Uploading image... ${received}/${total} chunks`, false, true);
+                    });
+                } else {
+                    const formData = new FormData();
+                    formData.append('file', imageFile);
+                    response = await fetch('/upload_image', { method: 'POST', body: formData });
+                }
                 const result = await response.json();
 
                 if (response.ok && result.status === 'success') {
@@ -164,48 +245,125 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // --- Marketplace Page Logic ---
+    // Infinite scroll over the keyset-paginated /marketplace/nfts: each page's X-Next-Cursor
+    // header is passed back for the next one, loaded when the sentinel below the grid scrolls into view.
+    // NFTs minted while the page is open arrive over /marketplace/stream and are added to the top
+    // when sorted newest first, so the list is never downloaded again just to show them.
     const nftGrid = document.getElementById('nftGrid');
     if (nftGrid) {
         const marketplaceStatusEl = 'marketplaceStatus';
-        updateStatus(marketplaceStatusEl, 'Loading NFTs...', false, true);
-        fetch('/marketplace/nfts')
-            .then(response => {
+        const MARKETPLACE_PAGE_SIZE = 24;
+        const sortSelect = document.getElementById('marketSort');
+        const sentinel = document.getElementById('nftGridSentinel');
+        let nextCursor = null;
+        let hasMore = true;
+        let loading = false;
+        let generation = 0; // Bumped on sort change so late responses for the old sort are dropped
+        const shownIds = new Set(); // NFTs already in the grid (a page and the stream may both deliver one)
+
+        function renderNftCard(nft) {
+            const card = document.createElement('div');
+            card.className = 'nft-card';
+            card.innerHTML = `
+                <img src="${nft.gif_url}" alt="${nft.name}" loading="lazy" onerror="this.src='/static/images/placeholder.png'; this.onerror=null;">
+                <h3>${nft.name}</h3>
+                <p><strong>ID:</strong> ${nft.id || 'N/A'}</p>
+                <p><strong>Mint Type:</strong> ${nft.mint_type || 'N/A'}</p>
+                <p><strong>Timestamp:</strong> ${nft.mint_timestamp_iso ? new Date(nft.mint_timestamp_iso).toLocaleString() : 'N/A'}</p>
+                <p><strong>BTC at Mint:</strong> ${nft.btc_price_at_mint !== undefined ? nft.btc_price_at_mint : 'N/A'}</p>
+                <p><strong>SOL at Mint:</strong> ${nft.sol_price_at_mint !== undefined ? nft.sol_price_at_mint : 'N/A'}</p>
+                ${nft.original_image_url ? `<p><a href="${nft.original_image_url}" target="_blank">View Original Image</a></p>` : ''}
+            `;
+            return card;
+        }
+
+        async function loadNextPage() {
+            if (loading || !hasMore) return;
+            loading = true;
+            const requestGeneration = generation;
+            const [sort, order] = (sortSelect ? sortSelect.value : 'mint_time:desc').split(':');
+            const params = new URLSearchParams({ limit: MARKETPLACE_PAGE_SIZE, sort, order });
+            if (nextCursor) params.set('cursor', nextCursor);
+            if (!nftGrid.children.length) updateStatus(marketplaceStatusEl, 'Loading NFTs...', false, true);
+            try {
+                const response = await fetch(`/marketplace/nfts?${params}`);
                 if (!response.ok) throw new Error(`HTTP error ${response.status}`);
-                return response.json();
-            })
-            .then(nfts => {
+                const nfts = await response.json();
+                if (requestGeneration !== generation) return;
                 updateStatus(marketplaceStatusEl, ''); // Clear loading message
-                if (nfts && nfts.length > 0) {
-                    nftGrid.innerHTML = ''; // Clear previous content
-                    nfts.forEach(nft => {
-                        const card = document.createElement('div');
-                        card.className = 'nft-card';
-                        card.innerHTML = `
-                            <img src="${nft.gif_url}" alt="${nft.name}" onerror="this.src='/static/images/placeholder.png'; this.onerror=null;">
-                            <h3>${nft.name}</h3>
-                            <p><strong>ID:</strong> ${nft.id || 'N/A'}</p>
-                            <p><strong>Mint Type:</strong> ${nft.mint_type || 'N/A'}</p>
-                            <p><strong>Timestamp:</strong> ${nft.mint_timestamp_iso ? new Date(nft.mint_timestamp_iso).toLocaleString() : 'N/A'}</p>
-                            <p><strong>BTC at Mint:</strong> ${nft.btc_price_at_mint !== undefined ? nft.btc_price_at_mint : 'N/A'}</p>
-                            <p><strong>SOL at Mint:</strong> ${nft.sol_price_at_mint !== undefined ? nft.sol_price_at_mint : 'N/A'}</p>
-                            ${nft.original_image_url ? `<p><a href="${nft.original_image_url}" target="_blank">View Original Image</a></p>` : ''}
-                        `;
-                        nftGrid.appendChild(card);
-                    });
-                } else {
+                const fragment = document.createDocumentFragment();
+                nfts.filter(nft => !shownIds.has(nft.id)).forEach(nft => {
+                    shownIds.add(nft.id);
+                    fragment.appendChild(renderNftCard(nft));
+                });
+                nftGrid.appendChild(fragment);
+                nextCursor = response.headers.get('X-Next-Cursor');
+                hasMore = Boolean(nextCursor);
+                if (!nftGrid.children.length) {
                     updateStatus(marketplaceStatusEl, 'No NFTs found in the marketplace yet.', false, false);
                 }
-            })
-            .catch(error => {
+            } catch (error) {
                 console.error('Error fetching marketplace NFTs:', error);
                 updateStatus(marketplaceStatusEl, `Error fetching NFTs: ${error.message}`, true);
+            } finally {
+                if (requestGeneration === generation) loading = false;
+            }
+            // A short page may leave the sentinel visible without a new intersection event
+            if (hasMore && sentinel && sentinel.getBoundingClientRect().top < window.innerHeight) loadNextPage();
+        }
+
+        function resetMarketplace() {
+            generation += 1;
+            nftGrid.innerHTML = '';
+            shownIds.clear();
+            nextCursor = null;
+            hasMore = true;
+            loading = false;
+            loadNextPage();
+        }
+
+        function subscribeToMarketplaceStream() {
+            if (typeof EventSource === 'undefined') return;
+            const stream = new EventSource('/marketplace/stream');
+            stream.addEventListener('nft', (e) => {
+                const nft = JSON.parse(e.data);
+                const sortValue = sortSelect ? sortSelect.value : 'mint_time:desc';
+                // In any other order the new NFT's place is unknown until that page is loaded
+                if (sortValue !== 'mint_time:desc' || shownIds.has(nft.id)) return;
+                shownIds.add(nft.id);
+                nftGrid.prepend(renderNftCard(nft));
+                updateStatus(marketplaceStatusEl, '');
             });
+            // Too many missed NFTs to replay: reload the list instead
+            stream.addEventListener('resync', resetMarketplace);
+        }
+
+        if (sortSelect) sortSelect.addEventListener('change', resetMarketplace);
+        if (sentinel && 'IntersectionObserver' in window) {
+            new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) loadNextPage();
+            }, { rootMargin: '400px' }).observe(sentinel);
+        }
+        subscribeToMarketplaceStream(); // Before the first page, so no NFT minted in between is missed
+        loadNextPage();
     }
 
     // --- Price Chart Page Logic ---
     const priceChartCanvas = document.getElementById('priceChartCanvas');
     let currentChartInstance = null; // To manage chart updates
 
+    // Binary chart format: uint32 header length, JSON header (padded to 8 bytes), then
+    // `count` float64 timestamps (ms) and `count` float64 prices, read in place.
+    function decodeBinaryChart(buffer) {
+        const headerLength = new DataView(buffer).getUint32(0, true);
+        const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+        const offset = 4 + headerLength;
+        const timestamps = new Float64Array(buffer, offset, header.count);
+        const prices = new Float64Array(buffer, offset + 8 * header.count, header.count);
+        header.price_history = Array.from(timestamps, (timestamp, i) => [timestamp, prices[i]]);
+        return header;
+    }
+
     async function fetchAndRenderChart(timeRangeHours) {
         const chartStatusEl = 'chartStatus';
         if (!priceChartCanvas) return;
@@ -214,9 +372,13 @@ document.addEventListener('DOMContentLoaded', () => {
         updateStatus(chartStatusEl, `Loading chart data for ${timeRangeHours}h...`, false, true);
 
         try {
-            const response = await fetch(`/chart/price_data?time_range_hours=${timeRangeHours}`);
+            // About one point per pixel of chart width; the server downsamples longer ranges to this
+            const maxPoints = Math.max(100, Math.round(priceChartCanvas.clientWidth || 1000));
+            const response = await fetch(`/chart/price_data?time_range_hours=${timeRangeHours}&max_points=${maxPoints}`, {
+                headers: { 'Accept': 'application/vnd.qnft.chart+binary' }
+            });
             if (!response.ok) throw new Error(`HTTP error ${response.status}`);
-            const data = await response.json();
+            const data = decodeBinaryChart(await response.arrayBuffer());
             updateStatus(chartStatusEl, ''); // Clear loading
 
             if (currentChartInstance) {
@@ -262,22 +424,7 @@ document.addEventListener('DOMContentLoaded', () => {
                             intersect: false,
                         },
                         annotation: { // For NFT events
-                            annotations: data.nft_events.map(event => ({
-                                type: 'point',
-                                xValue: event.timestamp,
-                                yValue: event.sol_price_at_mint, // Plot on the price line at mint time
-                                backgroundColor: event.type === 'long' ? 'rgba(0, 255, 0, 0.7)' : 'rgba(255, 0, 0, 0.7)',
-                                radius: 7,
-                                pointStyle: event.type === 'long' ? 'triangle' : 'rectRot', // up triangle for long, diamond for short
-                                rotation: event.type === 'long' ? 0 : 45, 
-                                // Custom tooltip for annotations (might require more specific Chart.js v3/v4 setup)
-                                callout: {
-                                    enabled: true,
-                                    content: `${event.nft_name} (${event.type})`,
-                                    yAdjust: -10
-                                }
-                                // For Chart.js v2, you might need a different approach for tooltips on annotations or draw custom points
-                            }))
+                            annotations: data.nft_events.map(mintAnnotation)
                         }
                     }
                 }
@@ -290,13 +437,52 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Live updates: new SOL/USDC ticks and mints are appended to the rendered chart
+    // instead of refetching the whole range.
+    function mintAnnotation(event) {
+        return {
+            type: 'point',
+            xValue: event.timestamp,
+            yValue: event.chart_price ?? event.sol_price_at_mint, // On the plotted line when history covers the mint
+            backgroundColor: event.type === 'long' ? 'rgba(0, 255, 0, 0.7)' : 'rgba(255, 0, 0, 0.7)',
+            radius: 7,
+            pointStyle: event.type === 'long' ? 'triangle' : 'rectRot',
+            rotation: event.type === 'long' ? 0 : 45,
+            callout: { enabled: true, content: `${event.nft_name} (${event.type})`, yAdjust: -10 }
+        };
+    }
+
+    function appendChartTick({ prices, timestamp }) {
+        if (!currentChartInstance || prices.solana_usdc === undefined) return;
+        const points = currentChartInstance.data.datasets[0].data;
+        points.push({ x: timestamp, y: prices.solana_usdc });
+        const rangeStart = timestamp - currentChartRangeHours * 3600 * 1000;
+        while (points.length && points[0].x < rangeStart) points.shift(); // Keep the window sliding
+        currentChartInstance.update('none');
+    }
+
+    function appendChartMint(event) {
+        if (!currentChartInstance) return;
+        const annotations = currentChartInstance.options.plugins.annotation.annotations;
+        annotations.push(mintAnnotation(event));
+        currentChartInstance.update('none');
+    }
+
+    let currentChartRangeHours = 24;
     const timeRangeSelect = document.getElementById('timeRange');
     if (timeRangeSelect && priceChartCanvas) {
         timeRangeSelect.addEventListener('change', (event) => {
-            fetchAndRenderChart(parseInt(event.target.value));
+            currentChartRangeHours = parseInt(event.target.value);
+            fetchAndRenderChart(currentChartRangeHours);
         });
         // Initial load
-        fetchAndRenderChart(parseInt(timeRangeSelect.value));
+        currentChartRangeHours = parseInt(timeRangeSelect.value);
+        fetchAndRenderChart(currentChartRangeHours);
+        subscribeToPriceStream({
+            price: appendChartTick,
+            mint: appendChartMint,
+            resync: () => fetchAndRenderChart(currentChartRangeHours)
+        });
     }
 
 }); // End DOMContentLoaded
@@ -0,0 +1,74 @@
+# QNFT/app/utils/compression.py
+import gzip
+import hashlib
+import threading
+import collections
+
+# Optional: brotli compresses JSON noticeably better than gzip; without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response compression for the API. Bodies above MIN_COMPRESS_BYTES of a compressible type
+# are encoded with the best encoding the client accepts. Encoded bodies are memoized by
+# content digest, so responses served again unchanged (cached chart windows, a page many
+# clients poll) are compressed once instead of on every request.
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # 0-11; higher is smaller but much slower
+MAX_MEMOIZED_BODIES = 128
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/vnd.qnft.columnar+json',
+    'application/vnd.qnft.chart+binary',
+    'text/html',
+    'text/css',
+    'application/javascript',
+}
+
+_encoded = collections.OrderedDict() # Format: {(digest, encoding): bytes}, least recently used first
+_encoded_lock = threading.Lock()
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def _encode(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0) # mtime=0: same body, same bytes
+
+def compress(body, encoding):
+    """Returns body encoded with encoding ('br' or 'gzip'), memoized by content."""
+    key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+    with _encoded_lock:
+        encoded = _encoded.get(key)
+        if encoded is not None:
+            _encoded.move_to_end(key)
+            return encoded
+    encoded = _encode(body, encoding)
+    with _encoded_lock:
+        _encoded[key] = encoded
+        while len(_encoded) > MAX_MEMOIZED_BODIES:
+            _encoded.popitem(last=False)
+    return encoded
+
+def compress_response(response, accept_encodings):
+    """
+    Compresses a Flask response in place if it is worth it and the client accepts an encoding
+    (accept_encodings: request.accept_encodings). Streamed responses are left alone.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    encoding = accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,20 +1,19 @@
 import logging
 
-# Configure basic logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 def encrypt_metadata_kyber(metadata_json_string: str) -> str:
     """
     Placeholder for Kyber-Dilithium based encryption of NFT metadata.
     For now, it simulates encryption by prepending a string.
     """
-    logging.info("KYBER ENCRYPTION: Placeholder function called. Real Kyber-Dilithium encryption would be applied here.")
+    logger.debug("KYBER ENCRYPTION: Placeholder function called. Real Kyber-Dilithium encryption would be applied here.")
     # In a real scenario, this would involve:
     # 1. Generating Kyber keys (or using existing ones).
     # 2. Using the public key to encrypt the metadata_json_string.
     # 3. Returning the ciphertext, possibly base64 encoded.
     encrypted_data = f"kyber_encrypted_{metadata_json_string}"
-    logging.info(f"KYBER ENCRYPTION: Simulated encrypted data length: {len(encrypted_data)}")
+    logger.debug("KYBER ENCRYPTION: Simulated encrypted data length: %s", len(encrypted_data))
     return encrypted_data
 
 def decrypt_metadata_kyber(encrypted_string: str) -> str:
@@ -22,7 +21,7 @@ def decrypt_metadata_kyber(encrypted_string: str) -> str:
     Placeholder for Kyber-Dilithium based decryption of NFT metadata.
     For now, it simulates decryption by removing the prepended string.
     """
-    logging.info("KYBER DECRYPTION: Placeholder function called. Real Kyber-Dilithium decryption would be applied here.")
+    logger.debug("KYBER DECRYPTION: Placeholder function called. Real Kyber-Dilithium decryption would be applied here.")
     # In a real scenario, this would involve:
     # 1. Using the Kyber private key.
     # 2. Decrypting the encrypted_string.
@@ -30,14 +29,16 @@ def decrypt_metadata_kyber(encrypted_string: str) -> str:
     prefix = "kyber_encrypted_"
     if encrypted_string.startswith(prefix):
         decrypted_data = encrypted_string[len(prefix):]
-        logging.info(f"KYBER DECRYPTION: Simulated decrypted data length: {len(decrypted_data)}")
+        logger.debug("KYBER DECRYPTION: Simulated decrypted data length: %s", len(decrypted_data))
         return decrypted_data
     else:
-        logging.warning("KYBER DECRYPTION: Prefix not found. Returning original string.")
+        logger.warning("KYBER DECRYPTION: Prefix not found. Returning original string.")
         return encrypted_string
 
 if __name__ == '__main__':
-    logging.info("--- Testing Cryptography Utils ---")
+    from app.utils.logging_config import configure_logging
+    configure_logging()
+    logger.info("--- Testing Cryptography Utils ---")
     sample_metadata = '{"name": "QNFT #001", "description": "A unique quantum NFT."}'
     
     print("\nTesting Kyber Encryption (Placeholder)...")
@@ -55,4 +56,4 @@ if __name__ == '__main__':
 
     assert decrypted == sample_metadata, "Decryption did not return the original metadata!"
     assert decrypted_fail == not_really_encrypted, "Decryption of non-prefixed string failed!"
-    logging.info("--- Cryptography Utils Test Complete ---")
+    logger.info("--- Cryptography Utils Test Complete ---")
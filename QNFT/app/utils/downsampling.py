@@ -0,0 +1,40 @@
+# QNFT/app/utils/downsampling.py
+import numpy as np
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013): keeps the first and last point and,
+# from each of n_out - 2 equal buckets in between, the point forming the largest triangle
+# with the point kept from the previous bucket and the average of the next bucket. Peaks
+# and dips survive, unlike with plain averaging or striding. Bucket averages are computed
+# for all buckets at once, and each bucket's triangle areas in a single array expression;
+# only the (inherently sequential) walk over buckets is a Python loop of n_out steps.
+
+def lttb_indices(x, y, n_out):
+    """Returns the sorted indices of the points LTTB keeps from (x, y) (every index if n_out >= len(x))."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("LTTB needs n_out >= 3 (first point, last point and at least one bucket).")
+
+    # Bucket i holds the middle points [edges[i], edges[i + 1])
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    average_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # The third triangle corner for bucket i is the next bucket's average (the last point for the last bucket)
+    next_x = np.append(average_x[1:], x[n - 1])
+    next_y = np.append(average_y[1:], y[n - 1])
+
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        areas = np.abs((ax - next_x[bucket]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[bucket] - ay))
+        previous = lo + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
@@ -0,0 +1,31 @@
+# QNFT/app/utils/json_stream.py
+import json
+
+# Optional: orjson serializes several times faster than the json module and returns bytes directly
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Incremental JSON encoding for large responses. A JSON array is written as it is read:
+# '[' first, then one chunk per batch of items, then ']', so the first bytes go out before
+# the whole collection is read and memory holds one batch instead of the full body.
+
+
+def dumps(obj):
+    """Compact JSON encoding of obj as UTF-8 bytes (orjson if installed)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def stream_json_array(batches):
+    """Yields the bytes of one JSON array holding every item of batches (an iterable of lists)."""
+    yield b'['
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        chunk = b','.join(dumps(item) for item in batch)
+        yield chunk if first else b',' + chunk
+        first = False
+    yield b']'
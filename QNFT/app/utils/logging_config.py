@@ -0,0 +1,124 @@
+# QNFT/app/utils/logging_config.py
+import os
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import logging.handlers
+
+# One logging setup for the whole app, replacing per-module basicConfig calls. Modules log
+# through logging.getLogger(__name__) with %-style arguments, so a message is only built
+# if its level is enabled. Request threads only put the record on a queue; a QueueListener
+# thread formats it and does the I/O. Levels are set per logger, and chatty per-item lines
+# (one per mint, one per NFT) go through sampled loggers that pass one record in N.
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+DEFAULT_LEVEL = 'INFO'
+# Format: "logger=LEVEL,logger=LEVEL", e.g. "app.services.solana_service=WARNING,werkzeug=ERROR"
+LEVELS_ENV_VAR = 'QNFT_LOG_LEVELS'
+DEFAULT_SAMPLE_EVERY = 100
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted: the listener thread builds the message, not the caller."""
+
+    def prepare(self, record):
+        if record.exc_info: # Tracebacks are rendered now, while they still describe this thread's state
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SampleFilter(logging.Filter):
+    """Passes the first record of every `every` logged with the same message template."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._counters = {} # Format: {msg: itertools.count()}
+
+    def filter(self, record):
+        counter = self._counters.get(record.msg)
+        if counter is None:
+            counter = self._counters.setdefault(record.msg, itertools.count())
+        return next(counter) % self.every == 0
+
+
+def sampled_logger(name, every=DEFAULT_SAMPLE_EVERY):
+    """Returns the logger `name` with a SampleFilter attached (once)."""
+    logger = logging.getLogger(name)
+    if not any(isinstance(existing, SampleFilter) for existing in logger.filters):
+        logger.addFilter(SampleFilter(every))
+    return logger
+
+def parse_levels(spec):
+    """'a=DEBUG,b.c=warning' -> {'a': 'DEBUG', 'b.c': 'WARNING'}. Raises ValueError on a malformed entry."""
+    levels = {}
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, separator, level = entry.partition('=')
+        level = level.strip().upper()
+        if not separator or not name.strip() or not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Invalid log level entry '{entry}'. Expected logger=LEVEL.")
+        levels[name.strip()] = level
+    return levels
+
+def configure_logging(level=None, module_levels=None, stream=None):
+    """
+    Routes all logging through a queue to a background listener writing to stream (default
+    stderr). level defaults to $QNFT_LOG_LEVEL or INFO, module_levels to $QNFT_LOG_LEVELS.
+    Calling it again only updates the levels.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel((level or os.environ.get('QNFT_LOG_LEVEL') or DEFAULT_LEVEL).upper())
+    if module_levels is None:
+        module_levels = parse_levels(os.environ.get(LEVELS_ENV_VAR))
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level.upper() if isinstance(module_level, str) else module_level)
+
+    with _configure_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.SimpleQueue()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        root.addHandler(_DeferredQueueHandler(log_queue))
+        _listener.start()
+        atexit.register(stop_logging)
+
+def _restart_listener_in_child():
+    """
+    Gives a forked child its own queue and listener. The inherited queue is a copy holding
+    records the parent's listener has not written yet; the parent still writes those, so
+    the child must not.
+    """
+    global _listener, _configure_lock
+    _configure_lock = threading.Lock() # Another thread may have held it at fork time
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _DeferredQueueHandler):
+            handler.queue = log_queue
+    _listener.start()
+
+def stop_logging():
+    """Flushes queued records and stops the listener thread (registered to run at exit)."""
+    global _listener
+    with _configure_lock:
+        listener, _listener = _listener, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in list(logging.getLogger().handlers):
+        if isinstance(handler, _DeferredQueueHandler):
+            logging.getLogger().removeHandler(handler)
+
+# Threads don't survive fork(): each forked worker (e.g. gunicorn's) restarts the listener
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_in_child)
@@ -0,0 +1,121 @@
+# QNFT/app/utils/skiplist.py
+import math
+import random
+
+# Indexable skiplist: a sorted collection of unique, comparable keys. Every link also stores
+# how many positions it skips (its width), so besides O(log n) insert and remove it answers
+# "what is the key at position i" and "what position does this key have" in O(log n).
+MAX_LEVELS = 24 # Enough for ~16M keys at the default promotion probability of 1/2
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+class IndexableSkipList:
+    """Sorted unique keys with O(log n) insert, remove, rank() and position lookup."""
+
+    def __init__(self, max_levels=MAX_LEVELS):
+        self._max_levels = max_levels
+        self._head = _Node(None, max_levels)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def _random_levels(self):
+        return min(self._max_levels, 1 - int(math.log2(1.0 - random.random())))
+
+    def insert(self, key):
+        chain = [None] * self._max_levels # Last node before key on each level
+        steps_at_level = [0] * self._max_levels
+        node = self._head
+        for level in reversed(range(self._max_levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new_node = _Node(key, self._random_levels())
+        steps = 0
+        for level in range(len(new_node.next)):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(len(new_node.next), self._max_levels):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        """Removes key. Raises KeyError if it is not present."""
+        chain = [None] * self._max_levels
+        node = self._head
+        for level in reversed(range(self._max_levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self._max_levels):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def rank(self, key):
+        """Returns the 0-based position of key. Raises KeyError if it is not present."""
+        node = self._head
+        position = 0
+        for level in reversed(range(self._max_levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        target = node.next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        return position
+
+    def _node_at(self, index):
+        node = self._head
+        remaining = index + 1 # The head is position 0
+        for level in reversed(range(self._max_levels)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('skiplist index out of range')
+        return self._node_at(index).key
+
+    def slice(self, start, count):
+        """Returns up to count keys starting at position start (O(log n + count))."""
+        if count <= 0 or start >= self._size:
+            return []
+        node = self._node_at(max(0, start))
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
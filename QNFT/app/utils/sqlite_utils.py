@@ -0,0 +1,44 @@
+# QNFT/app/utils/sqlite_utils.py
+import os
+import sqlite3
+import threading
+
+BUSY_TIMEOUT_SECONDS = 5.0 # How long a writer waits for another process's write lock
+
+_thread_local = threading.local()
+
+def connect_wal(path, timeout=BUSY_TIMEOUT_SECONDS):
+    """
+    Opens an autocommit SQLite connection in WAL mode, so readers in any worker process
+    never block on the single writer. synchronous=NORMAL keeps commits cheap; WAL still
+    guarantees the database is consistent after a crash.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def get_connection(path):
+    """
+    Returns this thread's connection to path, opening it on first use.
+    Connections are never shared across threads or inherited across fork()
+    (a worker forked by gunicorn opens its own).
+    """
+    connections = getattr(_thread_local, 'connections', None)
+    if connections is None or _thread_local.pid != os.getpid():
+        connections = _thread_local.connections = {}
+        _thread_local.pid = os.getpid()
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = connect_wal(path)
+    return conn
+
+def close_connections():
+    """Closes every connection opened by the calling thread."""
+    connections = getattr(_thread_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
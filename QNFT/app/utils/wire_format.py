@@ -0,0 +1,45 @@
+# QNFT/app/utils/wire_format.py
+import json
+import struct
+import numpy as np
+
+# Compact alternatives to the plain JSON bodies, picked by the client's Accept header.
+# Columnar JSON sends a list of records as one array per key, so key names appear once,
+# and a time series as its first timestamp plus deltas, so large epoch-ms integers
+# shrink to a few digits. The binary chart format is a length-prefixed JSON header
+# (everything but the price series) followed by two little-endian float64 arrays
+# (timestamps in ms, prices), padded so both can be read as Float64Arrays in place.
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_MIMETYPE = 'application/vnd.qnft.columnar+json'
+BINARY_MIMETYPE = 'application/vnd.qnft.chart+binary'
+HEADER_LENGTH = struct.Struct('<I')
+
+
+def columnar_records(records):
+    """[{key: value}, ...] -> {'count': n, 'columns': {key: [value, ...]}} (None where a record lacks a key)."""
+    keys = {}
+    for record in records:
+        keys.update(dict.fromkeys(record))
+    return {'count': len(records), 'columns': {key: [record.get(key) for record in records] for key in keys}}
+
+def delta_series(points):
+    """[[timestamp_ms, value], ...] -> {'t0': first timestamp, 'dt': [timestamp deltas], 'values': [...]}."""
+    timestamps = [point[0] for point in points]
+    return {
+        't0': timestamps[0] if timestamps else None,
+        'dt': [later - earlier for earlier, later in zip(timestamps, timestamps[1:])],
+        'values': [point[1] for point in points]
+    }
+
+def columnar_chart(chart_data):
+    """Columnar form of a get_price_chart_data() result."""
+    return dict(chart_data, price_history=delta_series(chart_data['price_history']), nft_events=columnar_records(chart_data['nft_events']))
+
+def binary_chart(chart_data):
+    """Binary form of a get_price_chart_data() result (see the layout above)."""
+    points = np.asarray(chart_data['price_history'], dtype='<f8').reshape(-1, 2)
+    header = dict(chart_data, count=len(points))
+    del header['price_history']
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-(HEADER_LENGTH.size + len(header_bytes)) % 8) # The arrays start 8-byte aligned
+    return HEADER_LENGTH.pack(len(header_bytes)) + header_bytes + points[:, 0].tobytes() + points[:, 1].tobytes()
@@ -0,0 +1,83 @@
+import pytest
+import datetime
+from unittest.mock import patch
+# Adjust import path based on your project structure
+from app.services import market_service, price_history
+from app.services.market_service import add_minted_nft_to_market, get_price_chart_data, _clear_market_store
+from app.services.chart_cache import ChartCache, ChartWindow, BUCKET_SECONDS
+import numpy as np
+
+DAY = 24 * 3600
+BUCKET_END = 1_800_000_000 - 1_800_000_000 % BUCKET_SECONDS
+
+@pytest.fixture(autouse=True)
+def clear_state():
+    """Every test starts with no NFTs, no price history and no cached windows."""
+    _clear_market_store()
+    price_history._reset_price_history()
+    yield
+    _clear_market_store()
+    price_history._reset_price_history()
+
+def _record_minutes(start_ts, minutes):
+    for i in range(minutes):
+        price_history.record_prices({'solana_usdc': 100.0 + (i % 90) / 10}, start_ts + i * 60)
+
+def _mint(nft_id, timestamp):
+    add_minted_nft_to_market({"id": nft_id, "name": nft_id,
+                              "mint_timestamp_iso": datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()})
+
+def _window(bucket_end, max_points=300): # 1440 points a day don't fit 4 x 300: read from 15m bars
+    return market_service._chart_window(price_history.get_series('solana_usdc'), DAY, bucket_end, max_points)
+
+def test_window_slides_instead_of_rereading():
+    _record_minutes(BUCKET_END - 2 * DAY, 2 * 24 * 60 + 60)
+    _mint("early", BUCKET_END - DAY + 600) # Falls out after one bucket
+    _mint("late", BUCKET_END + 300) # Falls in after one bucket
+    resolution, timestamps_ms, _, events = _window(BUCKET_END)
+    assert resolution == '15m' and [event['id'] for event in events] == ["early"]
+
+    with patch.object(market_service, '_mint_events_between', wraps=market_service._mint_events_between) as reads:
+        _, slid_ms, slid_prices, slid_events = _window(BUCKET_END + BUCKET_SECONDS)
+    start_ms, end_ms = reads.call_args[0]
+    assert end_ms - start_ms < BUCKET_SECONDS * 1000 # Only the closed bucket was read
+    assert [event['id'] for event in slid_events] == ["late"]
+    assert slid_ms[0] >= (BUCKET_END + BUCKET_SECONDS - DAY) * 1000 and slid_ms[-1] <= (BUCKET_END + BUCKET_SECONDS) * 1000
+    assert np.all(np.diff(slid_ms) > 0)
+    assert len(slid_ms) <= 300 + 1
+    assert dict(zip(slid_ms.tolist(), slid_prices.tolist()))[slid_events[0]['timestamp'] // 60000 * 60000] == slid_events[0]['chart_price']
+
+def test_late_mints_and_late_prices_reach_cached_windows():
+    _record_minutes(BUCKET_END - DAY, 24 * 60) # Read raw: every point is plotted
+    assert _window(BUCKET_END, 5000)[3] == []
+
+    _mint("backdated", BUCKET_END - 3600) # Inside the cached window
+    events = _window(BUCKET_END, 5000)[3]
+    assert [event['id'] for event in events] == ["backdated"]
+    assert events[0]['chart_price'] == 100.0 + ((24 * 60 - 60) % 90) / 10
+    assert len(_window(BUCKET_END, 5000)[3]) == 1 # Picked up once
+
+    price_history.record_prices({'solana_usdc': 500.0}, BUCKET_END - 7200 + 1) # A late point: the window is read again
+    assert 500.0 in _window(BUCKET_END, 5000)[2]
+
+def test_chart_data_matches_an_uncached_read():
+    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    _record_minutes(now - DAY - 3600, 25 * 60)
+    _mint("a", now - 5 * 3600)
+    _mint("b", now - 60)
+
+    cached = get_price_chart_data(time_range_hours=24, max_points=10_000)
+    assert cached == get_price_chart_data(time_range_hours=24, max_points=10_000) # Served from the cache
+    full = get_price_chart_data(time_range_hours=24, max_points=None)
+    assert cached['price_history'] == full['price_history'] # Everything fits: nothing downsampled
+    assert [event['id'] for event in cached['nft_events']] == ["a", "b"]
+    assert cached['price_history'][0][0] >= int((now - DAY) * 1000)
+
+def test_cache_evicts_least_recently_used_windows():
+    cache = ChartCache(max_windows=2)
+    empty = (np.empty(0, dtype=np.int64), np.empty(0))
+    for key in ("a", "b"):
+        cache.put(key, ChartWindow(DAY, BUCKET_END, 'raw', empty, [], None, 0))
+    cache.get("a")
+    cache.put("c", ChartWindow(DAY, BUCKET_END, 'raw', empty, [], None, 0))
+    assert cache.get("b") is None and cache.get("a") is not None and len(cache) == 2
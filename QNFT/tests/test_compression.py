@@ -0,0 +1,42 @@
+import gzip
+from unittest.mock import patch
+from flask import Flask, Response, jsonify, request
+# Adjust import path based on your project structure
+from app.utils import compression
+
+app = Flask(__name__)
+
+@app.route('/big')
+def big():
+    return jsonify([{'id': i, 'name': f'QNFT #{i}'} for i in range(200)])
+
+@app.route('/small')
+def small():
+    return jsonify({'ok': True})
+
+@app.route('/stream')
+def stream():
+    return Response((chunk for chunk in ['data: 1\n\n'] * 500), mimetype='text/event-stream')
+
+@app.after_request
+def _compress(response):
+    return compression.compress_response(response, request.accept_encodings)
+
+def test_large_json_is_gzipped_when_accepted():
+    with patch.object(compression, 'brotli', None):
+        client = app.test_client()
+        response = client.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.data) == client.get('/big').data
+        assert 'Content-Encoding' not in client.get('/big').headers # Not accepted
+        assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers # Too small
+        assert 'Content-Encoding' not in client.get('/stream', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_encoded_bodies_are_memoized():
+    body = b'{"price_history": []}' * 200
+    with patch.object(compression, '_encode', wraps=compression._encode) as encode:
+        first = compression.compress(body, 'gzip')
+        assert compression.compress(body, 'gzip') is first
+        assert encode.call_count == 1
+    assert gzip.decompress(first) == body
@@ -0,0 +1,43 @@
+import pytest
+import numpy as np
+# Adjust import path based on your project structure
+from app.utils.downsampling import lttb_indices
+
+def lttb_reference(x, y, n_out):
+    """Straightforward per-point LTTB, as in the original paper."""
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    selected, a = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((i + 2) * every) + 1, n)
+        if i == n_out - 3:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = sum(x[next_lo:next_hi]) / (next_hi - next_lo), sum(y[next_lo:next_hi]) / (next_hi - next_lo)
+        areas = [abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a])) for j in range(lo, hi)]
+        a = lo + areas.index(max(areas))
+        selected.append(a)
+    return selected + [n - 1]
+
+def test_matches_reference_implementation():
+    rng = np.random.default_rng(3)
+    x = np.cumsum(rng.uniform(1, 2, 1000))
+    y = np.cumsum(rng.normal(size=1000))
+    for n_out in (3, 10, 97, 500):
+        assert lttb_indices(x, y, n_out).tolist() == lttb_reference(x.tolist(), y.tolist(), n_out)
+
+def test_keeps_spikes_and_endpoints():
+    x = np.arange(10_000, dtype=float)
+    y = np.zeros(10_000)
+    y[4321] = 50.0
+    indices = lttb_indices(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 9999
+    assert 4321 in indices
+    assert np.all(np.diff(indices) > 0)
+
+def test_short_series_is_returned_whole():
+    assert lttb_indices([1.0, 2.0], [3.0, 4.0], 10).tolist() == [0, 1]
+    with pytest.raises(ValueError):
+        lttb_indices(np.arange(10.0), np.arange(10.0), 2)
@@ -42,15 +42,13 @@ def setup_dummy_folders_and_files():
 @patch('app.services.gif_generator.apply_quantum_transformation')
 @patch('app.services.gif_generator.generate_quantum_surroundings')
 @patch('app.services.gif_generator.apply_fibonacci_animation')
-@patch('app.services.gif_generator.get_btc_usdc_price')
-@patch('app.services.gif_generator.get_sol_usdc_price')
+@patch('app.services.gif_generator.get_price_snapshot')
 @patch('app.services.gif_generator.Image.Image.save') # Mock the save method of PIL Image instances
 @patch('app.services.gif_generator.Image.open') # Mock Image.open
 def test_generate_nft_gif_successful_orchestration(
     mock_image_open,
     mock_image_save,
-    mock_get_sol_price,
-    mock_get_btc_price,
+    mock_get_price_snapshot,
     mock_apply_fibonacci,
     mock_gen_surroundings,
     mock_apply_quantum_trans,
@@ -85,8 +83,7 @@ def test_generate_nft_gif_successful_orchestration(
     mock_apply_fibonacci.return_value = mock_animated_frames
 
     # Mock price fetchers
-    mock_get_btc_price.return_value = 50000.00
-    mock_get_sol_price.return_value = 150.00
+    mock_get_price_snapshot.return_value = {'bitcoin_usdc': 50000.00, 'solana_usdc': 150.00}
 
     # --- Call the function ---
     result = generate_nft_gif(
@@ -113,8 +110,7 @@ def test_generate_nft_gif_successful_orchestration(
     mock_apply_quantum_trans.assert_called_once() # Called with a temp path
     mock_gen_surroundings.assert_called_once()
     mock_apply_fibonacci.assert_called_once()
-    mock_get_btc_price.assert_called_once()
-    mock_get_sol_price.assert_called_once()
+    mock_get_price_snapshot.assert_called_once()
 
     # Check if the final GIF save was attempted
     # The first frame's save method is called with save_all=True
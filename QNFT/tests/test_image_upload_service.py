@@ -69,7 +69,7 @@ def test_handle_image_upload_success(mock_uuid, mock_makedirs):
 
 @patch('app.services.image_upload_service.os.makedirs')
 @patch('app.services.image_upload_service.uuid.uuid4')
-def test_handle_image_upload_save_exception(mock_uuid, mock_makedirs):
+def test_handle_image_upload_save_exception(mock_uuid, mock_makedirs, caplog):
     mock_uuid.return_value = MagicMock(hex='test_uuid_fail')
     
     mock_file = MagicMock()
@@ -84,6 +84,8 @@ def test_handle_image_upload_save_exception(mock_uuid, mock_makedirs):
     
     assert result['status'] == 'error'
     assert result['message'] == 'Failed to save file due to an internal error.'
+    assert "Error saving file test_uuid_fail_another.png: Disk full" in caplog.text
+    assert "Traceback" in caplog.text # Logged with its traceback
 
 # Note: MAX_CONTENT_LENGTH is primarily enforced by Flask.
 # If the service itself had a secondary check based on file_storage_object.seek/tell,
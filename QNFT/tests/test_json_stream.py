@@ -0,0 +1,17 @@
+import json
+from unittest.mock import patch
+# Adjust import path based on your project structure
+from app.utils import json_stream
+from app.utils.json_stream import stream_json_array
+
+def test_stream_is_one_valid_array():
+    batches = [[{'id': 1, 'name': 'QNFT #1'}, {'id': 2}], [], [{'id': 3, 'name': 'Café'}]]
+    chunks = list(stream_json_array(iter(batches)))
+    assert chunks[0] == b'[' and chunks[-1] == b']'
+    assert len(chunks) == 4 # One chunk per non-empty batch
+    assert json.loads(b''.join(chunks)) == [item for batch in batches for item in batch]
+    assert json.loads(b''.join(stream_json_array([]))) == []
+
+def test_stdlib_encoder_is_used_without_orjson():
+    with patch.object(json_stream, 'orjson', None):
+        assert json_stream.dumps({'a': [1, 2.5, None]}) == b'{"a":[1,2.5,null]}'
@@ -0,0 +1,72 @@
+import pytest
+import time
+import random
+import bisect
+# Adjust import path based on your project structure
+from app.services.leaderboard import Leaderboard, POINTS_PER_MINT, POINTS_PER_SOL_VOLUME, POINTS_PER_RARITY
+from app.services.market_store import InMemoryMarketStore
+from app.utils.skiplist import IndexableSkipList
+
+def test_skiplist_matches_sorted_list():
+    rng = random.Random(42)
+    skiplist, reference = IndexableSkipList(), []
+    for i in range(3000):
+        if reference and rng.random() < 0.4:
+            key = reference.pop(rng.randrange(len(reference)))
+            skiplist.remove(key)
+        else:
+            key = (rng.random(), i)
+            skiplist.insert(key)
+            bisect.insort(reference, key)
+    assert list(skiplist) == reference
+    for index in rng.sample(range(len(reference)), 50):
+        assert skiplist[index] == reference[index]
+        assert skiplist.rank(reference[index]) == index
+        assert skiplist.slice(index, 3) == reference[index:index + 3]
+    with pytest.raises(KeyError):
+        skiplist.remove((2.0, -1))
+
+def test_scores_and_ranks_follow_mints():
+    leaderboard = Leaderboard()
+    leaderboard.record_mint('alice', volume_sol=0.02, rarity=1.5)
+    leaderboard.record_mint('bob', volume_sol=0.02)
+    leaderboard.record_mint('bob', volume_sol=0.02)
+
+    top = leaderboard.top(10)
+    assert [entry['user'] for entry in top] == ['bob', 'alice']
+    assert top[0] == {'user': 'bob', 'rank': 1, 'score': round(2 * POINTS_PER_MINT + 0.04 * POINTS_PER_SOL_VOLUME, 4),
+                      'mints': 2, 'volume_sol': 0.04, 'rarity_held': 0.0}
+    assert leaderboard.wallet_rank('alice')['score'] == round(POINTS_PER_MINT + 0.02 * POINTS_PER_SOL_VOLUME + 1.5 * POINTS_PER_RARITY, 4)
+    assert leaderboard.wallet_rank('alice')['rank'] == 2
+    assert leaderboard.wallet_rank('nobody') is None
+
+def test_sync_counts_owned_nfts_from_the_store():
+    store = InMemoryMarketStore()
+    leaderboard = Leaderboard(rarity_score_fn=lambda seq: 2.0)
+    records = [{'nft': nft, 'mint_ms': None, 'sort_values': dict.fromkeys(('mint_time', 'btc_price', 'sol_price', 'mint_type'))} for nft in (
+        {'owner_wallet': 'carol', 'mint_fee_sol': 0.02}, {'owner_wallet': None}, {'owner_wallet': 'carol', 'mint_fee_sol': 'free'}
+    )]
+    store.add_many(records)
+    leaderboard.sync(store)
+    leaderboard.sync(store) # Nothing new: nothing counted twice
+    assert leaderboard.wallet_rank('carol')['mints'] == 2
+    assert leaderboard.wallet_rank('carol')['rarity_held'] == 4.0
+    assert len(leaderboard) == 1
+
+def test_reads_stay_fast_with_thousands_of_wallets():
+    rng = random.Random(1)
+    leaderboard = Leaderboard()
+    wallets = [f'wallet_{i}' for i in range(5000)]
+    for wallet in wallets + [rng.choice(wallets) for _ in range(15000)]:
+        leaderboard.record_mint(wallet, volume_sol=0.02, rarity=rng.random())
+
+    started = time.perf_counter()
+    for wallet in wallets[:1000]:
+        leaderboard.top(10)
+        leaderboard.wallet_rank(wallet)
+    per_read_ms = (time.perf_counter() - started) / 2000 * 1000
+    assert per_read_ms < 1.0
+
+    ranks = sorted(leaderboard.wallet_rank(wallet)['rank'] for wallet in wallets)
+    assert ranks == list(range(1, 5001)) # Every wallet has a distinct position
+    assert leaderboard.top(1)[0]['score'] == max(leaderboard.wallet_rank(wallet)['score'] for wallet in wallets)
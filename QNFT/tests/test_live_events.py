@@ -0,0 +1,142 @@
+import pytest
+import threading
+# Adjust import path based on your project structure
+from app.services import live_events, price_fetcher
+from app.services.live_events import EventChannel, format_sse
+
+@pytest.fixture(autouse=True)
+def reset_channels():
+    live_events._reset_channels()
+    yield
+    live_events._reset_channels()
+
+def read(stream, count):
+    return [next(stream) for _ in range(count)]
+
+def test_new_client_gets_snapshot_then_live_events():
+    channel = EventChannel('test')
+    channel.publish('price', {'old': True}) # Published before the client connected
+    stream = channel.stream(initial_events=[('snapshot', {'prices': {}})], heartbeat_seconds=0.05)
+    assert read(stream, 2) == ['retry: 3000\n\n', format_sse('snapshot', {'prices': {}})]
+
+    channel.publish('price', {'solana_usdc': 150.0})
+    assert next(stream) == format_sse('price', {'solana_usdc': 150.0}, 2)
+
+def test_idle_stream_sends_heartbeat():
+    stream = EventChannel('test').stream(heartbeat_seconds=0.01)
+    assert read(stream, 2)[1] == ': keepalive\n\n'
+
+def test_reconnect_replays_only_missed_events():
+    channel = EventChannel('test')
+    for i in range(1, 5):
+        channel.publish('price', {'n': i})
+    stream = channel.stream(last_event_id='2', initial_events=[('snapshot', {})])
+    assert read(stream, 2)[1] == format_sse('price', {'n': 3}, 3) + format_sse('price', {'n': 4}, 4)
+
+def test_reconnect_after_buffer_overflow_asks_for_resync():
+    channel = EventChannel('test', buffer_size=2)
+    for i in range(1, 6):
+        channel.publish('price', {'n': i})
+    stream = channel.stream(last_event_id='1')
+    assert read(stream, 2)[1] == format_sse('resync', {'last_event_id': 5}, 5)
+
+def test_many_subscribers_share_one_serialized_frame():
+    channel = EventChannel('test')
+    streams = [channel.stream(heartbeat_seconds=5) for _ in range(50)]
+    for stream in streams:
+        next(stream) # retry line
+    results = []
+    readers = [threading.Thread(target=lambda s=stream: results.append(next(s))) for stream in streams]
+    for reader in readers:
+        reader.start()
+    channel.publish('price', {'solana_usdc': 150.0})
+    for reader in readers:
+        reader.join(timeout=5)
+    assert len(results) == 50
+    assert len({id(frame) for frame in results}) == 1 # Encoded once, the same string object for everyone
+
+def test_fetched_prices_are_pushed_to_prices_channel():
+    price_fetcher._price_cache.clear()
+    try:
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(price_fetcher, '_fetch_prices_from_api', lambda pairs: {'bitcoin_usdc': 60000.0, 'solana_usdc': 150.0})
+            price_fetcher.get_price_snapshot()
+    finally:
+        price_fetcher._price_cache.clear()
+    frames, complete = live_events.get_channel(live_events.PRICES_CHANNEL).events_after(0)
+    assert complete and len(frames) == 1
+    assert '"solana_usdc":150.0' in frames[0]
+
+def test_minted_nft_is_pushed_as_chart_event():
+    from app.services.market_service import add_minted_nft_to_market, _clear_market_store
+    nft = {'id': 'live_nft', 'name': 'Live', 'mint_type': 'long', 'mint_timestamp_iso': '2026-01-01T00:00:00+00:00', 'sol_price_at_mint': 150.0}
+    add_minted_nft_to_market(nft)
+    _clear_market_store()
+    frames, _ = live_events.get_channel(live_events.PRICES_CHANNEL).events_after(0)
+    assert frames[-1].startswith('id: 1\nevent: mint\n')
+    assert '"id":"live_nft"' in frames[-1] and '"timestamp":1767225600000' in frames[-1]
+
+def test_publisher_ids_and_resync_after_restart():
+    channel = EventChannel('test', buffer_size=2)
+    for seq in (10, 12, 15):
+        channel.publish('nft', {'seq': seq}, seq) # Ids with gaps, e.g. store seqs
+    assert channel.events_after(12) == ([format_sse('nft', {'seq': 15}, 15)], True)
+    assert channel.events_after(10)[1] is True # Everything after 10 is still buffered
+    assert channel.events_after(9)[1] is False # ...but 10 itself fell out
+    with pytest.raises(ValueError):
+        channel.publish('nft', {}, 15)
+    channel.restart_at(20)
+    assert channel.events_after(15) == ([], False) and channel.events_after(20) == ([], True)
+
+def test_marketplace_feed_pushes_nfts_of_every_worker(tmp_path):
+    from app.services import market_service
+    from app.services.market_store import SQLiteMarketStore
+    path = str(tmp_path / "market.sqlite3")
+    SQLiteMarketStore(path).add_many([market_service._store_record({'id': 'before_startup'})])
+    market_service.configure_market_store(path)
+    try:
+        channel = live_events.get_channel(live_events.MARKETPLACE_CHANNEL)
+        assert channel.last_seq == 1 # NFTs already in the database are not replayed
+        market_service.add_minted_nft_to_market({'id': 'this_worker', 'mint_timestamp_iso': '2026-01-01T00:00:00+00:00'})
+        SQLiteMarketStore(path).add_many([market_service._store_record({'id': 'other_worker', 'mint_timestamp_iso': '2026-01-01T00:01:00+00:00'})])
+        threads = [threading.Thread(target=market_service._sync_indexes) for _ in range(8)] # Mints and the poller sync concurrently
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        frames, complete = channel.events_after(1)
+        assert complete and frames == [format_sse('nft', {'id': 'this_worker', 'mint_timestamp_iso': '2026-01-01T00:00:00+00:00'}, 2),
+                                       format_sse('nft', {'id': 'other_worker', 'mint_timestamp_iso': '2026-01-01T00:01:00+00:00'}, 3)]
+        mints, _ = live_events.get_channel(live_events.PRICES_CHANNEL).events_after(0)
+        assert [('"id":"this_worker"' in frame, '"id":"other_worker"' in frame) for frame in mints] == [(True, False), (False, True)]
+    finally:
+        market_service._clear_market_store()
+        market_service.configure_market_store(None)
+
+def test_market_poller_syncs_in_the_background(tmp_path):
+    from app.services import market_service
+    from app.services.market_store import SQLiteMarketStore
+    path = str(tmp_path / "market.sqlite3")
+    market_service.configure_market_store(path)
+    channel = live_events.get_channel(live_events.MARKETPLACE_CHANNEL)
+    market_service.start_market_poller(interval_seconds=0.01)
+    try:
+        assert market_service.start_market_poller() is market_service._poller_thread # One thread per process
+        SQLiteMarketStore(path).add_many([market_service._store_record({'id': 'other_worker'})])
+        frames, _, _ = channel.wait_for_events(0, timeout=5)
+        assert frames == [format_sse('nft', {'id': 'other_worker'}, 1)]
+    finally:
+        market_service.stop_market_poller()
+        market_service._clear_market_store()
+        market_service.configure_market_store(None)
+
+def test_configuring_the_same_store_keeps_buffered_events():
+    from app.services import market_service
+    market_service.add_minted_nft_to_market({'id': 'buffered'})
+    channel = live_events.get_channel(live_events.MARKETPLACE_CHANNEL)
+    last_seq = channel.last_seq
+    try:
+        market_service.configure_market_store(None) # As on every request with QNFT_MARKET_DB=""
+        assert channel.events_after(last_seq - 1)[0] == [format_sse('nft', {'id': 'buffered'}, last_seq)]
+    finally:
+        market_service._clear_market_store()
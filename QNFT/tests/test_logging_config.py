@@ -0,0 +1,91 @@
+import io
+import os
+import time
+import logging
+import threading
+import pytest
+# Adjust import path based on your project structure
+from app.utils import logging_config
+from app.utils.logging_config import configure_logging, stop_logging, sampled_logger, parse_levels, SampleFilter
+
+@pytest.fixture
+def log_stream():
+    """Routes logging to a StringIO through a fresh listener; restores the levels it changed."""
+    stop_logging()
+    stream = io.StringIO()
+    root_level = logging.getLogger().level
+    configure_logging(level='INFO', module_levels={'qnft.test.quiet': 'ERROR'}, stream=stream)
+    yield stream
+    stop_logging()
+    logging.getLogger().setLevel(root_level)
+    logging.getLogger('qnft.test.quiet').setLevel(logging.NOTSET)
+
+class _ThreadRecorder:
+    """Log argument that remembers which thread turned it into text."""
+    def __init__(self):
+        self.thread = None
+    def __str__(self):
+        self.thread = threading.current_thread()
+        return "formatted"
+
+def test_records_are_formatted_and_written_off_the_caller_thread(log_stream):
+    argument = _ThreadRecorder()
+    logging.getLogger('qnft.test').info("TEST: value %s", argument)
+    logging.getLogger('qnft.test').debug("TEST: hidden %s", argument) # Below INFO: never formatted
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger('qnft.test').exception("TEST: failed")
+    stop_logging() # Flushes the queue
+    output = log_stream.getvalue()
+    assert "INFO - qnft.test - TEST: value formatted" in output
+    assert "hidden" not in output
+    assert "ValueError: boom" in output
+    assert argument.thread is not None and argument.thread is not threading.current_thread()
+
+def test_module_levels(log_stream):
+    logging.getLogger('qnft.test.quiet').warning("TEST: quiet warning")
+    logging.getLogger('qnft.test.quiet').error("TEST: quiet error")
+    stop_logging()
+    assert "quiet warning" not in log_stream.getvalue()
+    assert "quiet error" in log_stream.getvalue()
+
+def test_sampled_logger_passes_one_in_n():
+    logger = sampled_logger('qnft.test.sampled', every=10)
+    assert sampled_logger('qnft.test.sampled') is logger and len(logger.filters) == 1
+    sample = SampleFilter(10)
+    passed = [sample.filter(logging.makeLogRecord({'msg': "item %s"})) for _ in range(25)]
+    assert passed.count(True) == 3 and passed[0]
+    assert sample.filter(logging.makeLogRecord({'msg': "other template %s"})) # Counted separately
+
+def test_parse_levels():
+    assert parse_levels(" app.services.solana_service=debug, werkzeug=ERROR ,") == {'app.services.solana_service': 'DEBUG', 'werkzeug': 'ERROR'}
+    assert parse_levels(None) == {}
+    for bad in ("werkzeug", "=DEBUG", "werkzeug=LOUD"):
+        with pytest.raises(ValueError):
+            parse_levels(bad)
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork()")
+def test_forked_child_does_not_rewrite_parent_records(tmp_path):
+    stop_logging()
+    log_path = tmp_path / "app.log"
+    with open(log_path, 'a', buffering=1) as stream:
+        configure_logging(level='INFO', module_levels={}, stream=stream)
+        handler = logging_config._listener.handlers[0]
+        handler.acquire() # Stalls the parent's listener so "parent" is still queued at fork time
+        try:
+            logging.getLogger('qnft.test').info("TEST: first")
+            logging.getLogger('qnft.test').info("TEST: parent")
+            time.sleep(0.1)
+            pid = os.fork()
+            if pid == 0:
+                logging.getLogger('qnft.test').info("TEST: child")
+                stop_logging()
+                os._exit(0)
+            os.waitpid(pid, 0)
+        finally:
+            handler.release()
+        stop_logging()
+    output = log_path.read_text()
+    assert output.count("TEST: parent") == 1
+    assert output.count("TEST: child") == 1
@@ -1,6 +1,8 @@
 import pytest
 import os
 import io
+import gzip
+import json
 from unittest.mock import patch, MagicMock
 # client fixture is from test_config.py
 
@@ -130,6 +132,28 @@ def test_mint_nft_route_success(mock_path_exists, mock_mint_service, client):
     # This requires a bit more setup or a way to inspect market_service._minted_nfts
     # For now, we trust the route calls the service, and service calls add_minted_nft_to_market
 
+@patch('app.services.solana_service.get_storage_for_uri')
+@patch('app.services.solana_service.get_price_snapshot')
+@patch('app.main.get_storage')
+def test_minted_nft_reaches_chart_and_stats(mock_get_storage, mock_prices, mock_asset_storage, client):
+    from app.services.market_service import _clear_market_store
+    _clear_market_store()
+    mock_get_storage.return_value.exists.return_value = True
+    mock_get_storage.return_value.uri.side_effect = lambda key: key
+    mock_asset_storage.side_effect = lambda location: (MagicMock(), location)
+    mock_prices.return_value = {'bitcoin_usdc': 60000.0, 'solana_usdc': 150.0}
+    try:
+        response = client.post('/mint_nft', json={'image_id': 'img.png', 'gif_server_path': 'final.gif', 'mint_type': 'long'})
+        assert response.status_code == 200
+        tx_id = response.get_json()['transaction_id']
+
+        chart = client.get('/chart/price_data?time_range_hours=1').get_json()
+        assert [event['id'] for event in chart['nft_events']] == [tx_id]
+        stats = client.get('/marketplace/stats').get_json()
+        assert stats['count'] == 1 and stats['long_count'] == 1
+    finally:
+        _clear_market_store()
+
 @patch('app.main.mint_qnft_service')
 def test_mint_nft_route_missing_data(mock_mint_service, client):
     payload = {'image_id': 'some_image.png'} # Missing other fields
@@ -166,6 +190,36 @@ def test_get_marketplace_nfts_route(client):
         assert 'name' in json_data[0]
         assert 'gif_url' in json_data[0]
 
+def test_get_marketplace_nfts_route_paginates(client):
+    from app.services.market_service import add_minted_nft_to_market
+    for i in range(3):
+        add_minted_nft_to_market({'id': f'route_page_{i}', 'name': f'Route {i}', 'mint_timestamp_iso': f'2099-01-01T00:00:0{i}+00:00'})
+    response = client.get('/marketplace/nfts?limit=2')
+    assert response.status_code == 200
+    assert [nft['id'] for nft in response.get_json()] == ['route_page_2', 'route_page_1'] # Newest first
+    assert 'rel="next"' in response.headers['Link']
+    next_page = client.get(f"/marketplace/nfts?limit=2&cursor={response.headers['X-Next-Cursor']}")
+    assert next_page.status_code == 200
+    assert next_page.get_json()[0]['id'] == 'route_page_0'
+
+def test_get_marketplace_nfts_route_invalid_params(client):
+    assert client.get('/marketplace/nfts?limit=abc').status_code == 400
+    assert client.get('/marketplace/nfts?sort=nope').status_code == 400
+    assert client.get('/marketplace/nfts?cursor=garbage').status_code == 400
+
+def test_get_marketplace_nfts_route_filters(client):
+    from app.services.market_service import add_minted_nft_to_market
+    for i, mint_type in enumerate(['long', 'short', 'long']):
+        add_minted_nft_to_market({'id': f'route_filter_{i}', 'name': f'Filter {i}', 'mint_type': mint_type,
+                                  'btc_price_at_mint': 990000.0 + i, 'mint_timestamp_iso': f'2099-02-01T00:00:0{i}+00:00'})
+    response = client.get('/marketplace/nfts?mint_type=long&btc_price_min=990000&limit=1')
+    assert response.status_code == 200
+    assert [nft['id'] for nft in response.get_json()] == ['route_filter_2']
+    assert 'mint_type=long' in response.headers['Link'] # The next page keeps the filters
+    next_page = client.get(f"/marketplace/nfts?mint_type=long&btc_price_min=990000&limit=1&cursor={response.headers['X-Next-Cursor']}")
+    assert [nft['id'] for nft in next_page.get_json()] == ['route_filter_0']
+    assert client.get('/marketplace/nfts?btc_price_min=cheap').status_code == 400
+
 def test_get_price_chart_data_route(client):
     response = client.get('/chart/price_data?time_range_hours=24')
     assert response.status_code == 200
@@ -175,13 +229,156 @@ def test_get_price_chart_data_route(client):
     assert isinstance(json_data['price_history'], list)
     assert isinstance(json_data['nft_events'], list)
 
+def test_all_nfts_are_streamed(client):
+    response = client.get('/marketplace/nfts/all')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert isinstance(json.loads(response.data), list)
+
+def test_compact_formats_are_negotiated(client):
+    columnar = client.get('/chart/price_data', headers={'Accept': 'application/vnd.qnft.columnar+json'})
+    assert columnar.mimetype == 'application/vnd.qnft.columnar+json'
+    assert set(json.loads(columnar.data)['price_history']) == {'t0', 'dt', 'values'}
+    assert 'Accept' in columnar.headers['Vary']
+    binary = client.get('/chart/price_data', headers={'Accept': 'application/vnd.qnft.chart+binary'})
+    assert binary.mimetype == 'application/vnd.qnft.chart+binary'
+    assert binary.data[4:].lstrip().startswith(b'{')
+
+    page = client.get('/marketplace/nfts?limit=50', headers={'Accept': 'application/vnd.qnft.columnar+json', 'Accept-Encoding': 'gzip'})
+    body = gzip.decompress(page.data) if page.headers.get('Content-Encoding') == 'gzip' else page.data
+    assert set(json.loads(body)) == {'count', 'columns'}
+    assert client.get('/marketplace/nfts', headers={'Accept': '*/*'}).mimetype == 'application/json'
+
 def test_get_price_chart_data_route_invalid_range(client):
     response = client.get('/chart/price_data?time_range_hours=abc')
     assert response.status_code == 400
     json_data = response.get_json()
     assert 'Invalid time_range_hours format' in json_data['message']
+    assert client.get('/chart/price_data?max_points=abc').status_code == 400
+    assert client.get('/chart/price_data?max_points=2').status_code == 400
+    assert client.get('/chart/price_data?max_points=500').status_code == 200
 
     response = client.get('/chart/price_data?time_range_hours=0')
     assert response.status_code == 400
     json_data = response.get_json()
     assert 'time_range_hours must be positive' in json_data['message']
+
+def test_price_ohlc_route(client):
+    response = client.get('/chart/ohlc?resolution=15m&time_range_hours=6')
+    assert response.status_code == 200
+    assert response.get_json()['resolution'] == '15m'
+    assert isinstance(response.get_json()['bars'], list)
+    assert client.get('/chart/ohlc?resolution=5m').status_code == 400
+    assert client.get('/chart/ohlc?time_range_hours=x').status_code == 400
+
+def test_resumable_upload_routes(client):
+    payload = b"\x89PNG" + b"x" * (64 * 1024)
+    chunk_size = 64 * 1024
+    response = client.post('/upload_image/resumable', json={'filename': 'phone.png', 'total_size': len(payload), 'chunk_size': chunk_size})
+    assert response.status_code == 201
+    upload_id = response.get_json()['upload_id']
+
+    response = client.put(f'/upload_image/resumable/{upload_id}/chunks/1', data=payload[chunk_size:])
+    assert response.status_code == 200
+
+    response = client.post(f'/upload_image/resumable/{upload_id}/finalize')
+    assert response.status_code == 409 # Chunk 0 still missing
+
+    response = client.get(f'/upload_image/resumable/{upload_id}')
+    assert response.get_json()['missing_chunks'] == [0]
+
+    client.put(f'/upload_image/resumable/{upload_id}/chunks/0', data=payload[:chunk_size])
+    response = client.post(f'/upload_image/resumable/{upload_id}/finalize')
+    assert response.status_code == 200
+    assert response.get_json()['file_id'].endswith('_phone.png')
+
+def test_resumable_upload_init_disallowed_extension(client):
+    response = client.post('/upload_image/resumable', json={'filename': 'test.pdf', 'total_size': 100})
+    assert response.status_code == 415
+
+@patch('app.main.get_prices_with_age')
+def test_current_prices_route(mock_get_prices, client):
+    mock_get_prices.return_value = {
+        'bitcoin_usdc': {'price': 60000.0, 'age_seconds': 12.5, 'stale': False},
+        'solana_usdc': {'price': None, 'age_seconds': None, 'stale': True}
+    }
+    response = client.get('/prices/current')
+    assert response.status_code == 200
+    assert response.get_json()['prices']['bitcoin_usdc']['price'] == 60000.0
+
+@patch('app.main.get_price_fetcher_stats')
+def test_price_fetcher_stats_route(mock_get_stats, client):
+    mock_get_stats.return_value = {'requests': 3, 'failures': 1, 'retries': 1, 'circuit_breaker': {'state': 'closed'}}
+    response = client.get('/prices/stats')
+    assert response.status_code == 200
+    assert response.get_json()['circuit_breaker']['state'] == 'closed'
+
+@patch('app.main.get_prices_with_age')
+def test_price_stream_route_pushes_snapshot_then_events(mock_get_prices, client):
+    from app.services import live_events
+    live_events._reset_channels()
+    mock_get_prices.return_value = {'solana_usdc': {'price': 150.0, 'age_seconds': 1.0, 'stale': False}}
+    response = client.get('/prices/stream', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = (chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in response.response)
+    assert next(chunks) == 'retry: 3000\n\n'
+    snapshot = next(chunks)
+    assert snapshot.startswith('event: snapshot\n') and '150.0' in snapshot
+
+    live_events.publish_price_tick({'solana_usdc': 151.0}, 1_700_000_000)
+    assert next(chunks) == 'id: 1\nevent: price\ndata: {"prices":{"solana_usdc":151.0},"timestamp":1700000000000}\n\n'
+    response.close()
+
+def test_marketplace_stream_route_pushes_new_nfts(client):
+    from app.services import live_events
+    from app.services.market_service import add_minted_nft_to_market
+    live_events._reset_channels()
+    add_minted_nft_to_market({'id': 'before_connect', 'name': 'Old'})
+    seen_seq = live_events.get_channel(live_events.MARKETPLACE_CHANNEL).last_seq # Event ids are store seqs
+    response = client.get('/marketplace/stream', headers={'Last-Event-ID': str(seen_seq)}, buffered=False)
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    chunks = (chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in response.response)
+    assert next(chunks) == 'retry: 3000\n\n'
+
+    add_minted_nft_to_market({'id': 'after_connect', 'name': 'New'})
+    assert next(chunks) == f'id: {seen_seq + 1}\nevent: nft\ndata: {{"id":"after_connect","name":"New"}}\n\n' # Resumed after seen_seq
+    response.close()
+
+def test_marketplace_rarest_route(client):
+    from app.services.market_service import add_minted_nft_to_market
+    add_minted_nft_to_market({'id': 'route_rare', 'name': 'Rare', 'mint_type': 'one_of_a_kind', 'mint_timestamp_iso': '2099-03-01T00:00:00+00:00',
+                              'attributes': [{'trait_type': 'Aura', 'value': 'unique'}]})
+    response = client.get('/marketplace/rarest?limit=1')
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data[0]['id'] == 'route_rare'
+    assert json_data[0]['rarity']['rank'] == 1
+    assert client.get('/marketplace/rarest?limit=abc').status_code == 400
+
+def test_leaderboard_routes(client):
+    from app.services.market_service import add_minted_nft_to_market
+    add_minted_nft_to_market({'id': 'route_lb', 'name': 'LB', 'owner_wallet': 'ROUTE_WALLET', 'mint_timestamp_iso': '2099-04-01T00:00:00+00:00'})
+    response = client.get('/leaderboard?limit=100')
+    assert response.status_code == 200
+    assert 'ROUTE_WALLET' in [entry['user'] for entry in response.get_json()]
+    entry = client.get('/leaderboard/ROUTE_WALLET').get_json()
+    assert entry['mints'] >= 1 and entry['rank'] >= 1
+    assert client.get('/leaderboard/NOBODY').status_code == 404
+    assert client.get('/leaderboard?limit=0').status_code == 400
+
+def test_marketplace_stats_route(client):
+    from app.services.market_service import add_minted_nft_to_market
+    add_minted_nft_to_market({'id': 'stats_route', 'name': 'Stats', 'mint_type': 'long', 'btc_price_at_mint': 61000.0,
+                              'sol_price_at_mint': 150.0, 'mint_timestamp_iso': '2098-01-01T00:30:00+00:00'})
+    start_ms = 4039372800000 # 2098-01-01T00:00:00Z
+    response = client.get(f'/marketplace/stats?start={start_ms}&end={start_ms + 3600 * 1000}')
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data['count'] == 1
+    assert json_data['btc_price_at_mint']['floor'] == 61000.0
+    assert json_data['long_count'] == 1
+
+def test_marketplace_stats_route_invalid_window(client):
+    assert client.get('/marketplace/stats?start=abc').status_code == 400
+    assert client.get('/marketplace/stats?start=2000&end=1000').status_code == 400
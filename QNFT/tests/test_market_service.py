@@ -1,4 +1,5 @@
 import pytest
+import logging
 import datetime
 from unittest.mock import patch
 # Adjust import path based on your project structure
@@ -7,13 +8,22 @@ from app.services.market_service import (
     get_marketplace_nfts, 
     get_price_chart_data,
     _minted_nfts, # For clearing/direct manipulation in tests
-    _populate_dummy_nfts # To test its behavior
+    _populate_dummy_nfts, # To test its behavior
+    _clear_market_store,
+    get_marketplace_page,
+    add_minted_nfts_to_market,
+    get_marketplace_nfts_filtered,
+    get_rarest_nfts,
+    get_leaderboard,
+    get_wallet_leaderboard_entry
 )
+from app.services import market_service, price_history
+from app.services.market_query import parse_filters
 
 @pytest.fixture(autouse=True)
 def clear_nft_store():
-    """Clears the in-memory NFT store before each test."""
-    _minted_nfts.clear()
+    """Clears the in-memory NFT store (and its time index) before each test."""
+    _clear_market_store()
 
 def test_add_and_get_marketplace_nfts():
     assert len(get_marketplace_nfts()) == 0 # Starts empty due to fixture
@@ -63,6 +73,19 @@ def test_get_price_chart_data_structure():
         assert isinstance(chart_data['price_history'][0][0], int) # timestamp ms
         assert isinstance(chart_data['price_history'][0][1], float) # price
 
+def test_get_price_chart_data_serves_recorded_history():
+    price_history._reset_price_history()
+    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    price_history.record_prices({'solana_usdc': 140.0}, now - 30 * 3600) # Outside 24h
+    price_history.record_prices({'solana_usdc': 150.0}, now - 2 * 3600)
+    price_history.record_prices({'solana_usdc': 151.5}, now - 60)
+
+    chart_data = get_price_chart_data(time_range_hours=24)
+    assert [point[1] for point in chart_data['price_history']] == [150.0, 151.5]
+    assert chart_data['price_history'][0][0] == int((now - 2 * 3600) * 1000)
+    assert get_price_chart_data(time_range_hours=24)['price_history'] == chart_data['price_history'] # Stable across calls
+    price_history._reset_price_history()
+
 def test_get_price_chart_data_nft_events_filtering():
     now = datetime.datetime.now(datetime.timezone.utc)
     
@@ -115,48 +138,246 @@ def test_get_price_chart_data_nft_events_filtering():
     assert "bad_ts_nft" not in event_ids_48h
 
 
-# Placeholder tests for new functions (rarity filter, leaderboard)
-# These would need more setup if the underlying logic was more than placeholder
+def test_chart_events_come_from_time_index_in_mint_order():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for hours_ago, nft_id in [(1, "newest"), (5, "oldest"), (3, "middle")]: # Inserted out of order
+        add_minted_nft_to_market({"id": nft_id, "name": nft_id, "mint_type": "long",
+                                  "mint_timestamp_iso": (now - datetime.timedelta(hours=hours_ago)).isoformat()})
+
+    with patch('app.services.market_service._parse_mint_time') as mock_parse:
+        events = get_price_chart_data(time_range_hours=4)['nft_events']
+    mock_parse.assert_not_called() # Parsed once on insert, never per request
+    assert [event['id'] for event in events] == ["middle", "newest"]
+
+def test_chart_events_get_price_from_recorded_history():
+    price_history._reset_price_history()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    price_history.record_prices({'solana_usdc': 150.0}, (now - datetime.timedelta(hours=3)).timestamp())
+    price_history.record_prices({'solana_usdc': 155.0}, (now - datetime.timedelta(hours=1)).timestamp())
+    for minutes_ago, nft_id in [(200, "before_history"), (150, "first_point"), (30, "second_point")]:
+        add_minted_nft_to_market({"id": nft_id, "name": nft_id, "sol_price_at_mint": 1.0,
+                                  "mint_timestamp_iso": (now - datetime.timedelta(minutes=minutes_ago)).isoformat()})
+
+    events = get_price_chart_data(time_range_hours=24)['nft_events']
+    assert {event['id']: event['chart_price'] for event in events} == {"before_history": None, "first_point": 150.0, "second_point": 155.0}
+    price_history._reset_price_history()
+
+def test_price_chart_is_downsampled_but_markers_stay_on_the_line():
+    price_history._reset_price_history()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    start = now.timestamp() - 20 * 3600
+    for i in range(5000):
+        price_history.record_prices({'solana_usdc': 150.0 + (i % 37) * 0.1}, start + i * 14)
+    for minutes_ago, nft_id in [(700, "a"), (301, "b"), (5, "c")]:
+        add_minted_nft_to_market({"id": nft_id, "name": nft_id,
+                                  "mint_timestamp_iso": (now - datetime.timedelta(minutes=minutes_ago)).isoformat()})
+
+    chart_data = get_price_chart_data(time_range_hours=24, max_points=200)
+    assert len(chart_data['price_history']) <= 200
+    assert [event['id'] for event in chart_data['nft_events']] == ["a", "b", "c"] # Never dropped
+    plotted = dict(map(tuple, chart_data['price_history']))
+    full = get_price_chart_data(time_range_hours=24, max_points=None)
+    assert len(full['price_history']) == 5000
+    for event, full_event in zip(chart_data['nft_events'], full['nft_events']):
+        assert event['chart_price'] == full_event['chart_price'] # Taken from full-resolution history
+        point_ms = max(ts for ts, _ in full['price_history'] if ts <= event['timestamp'])
+        assert plotted[point_ms] == event['chart_price'] # ...and that point is plotted
+    price_history._reset_price_history()
+
+
+def _add_priced_nfts(count):
+    base = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    for i in range(count):
+        add_minted_nft_to_market({"id": f"nft{i}", "name": f"NFT {i}", "mint_type": "long" if i % 2 else "short",
+                                  "mint_timestamp_iso": (base + datetime.timedelta(minutes=i)).isoformat(),
+                                  "sol_price_at_mint": float(100 + (i * 7) % 10)})
+
+def _collect_pages(**kwargs):
+    ids, cursor = [], None
+    while True:
+        page = get_marketplace_page(cursor=cursor, **kwargs)
+        assert page['status'] == 'success'
+        ids.extend(nft['id'] for nft in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+def test_marketplace_pages_newest_first_by_default():
+    _add_priced_nfts(7)
+    first = get_marketplace_page(limit=3)
+    assert [nft['id'] for nft in first['items']] == ["nft6", "nft5", "nft4"]
+    assert _collect_pages(limit=3) == [f"nft{i}" for i in range(6, -1, -1)]
+
+def test_marketplace_pages_sorted_by_price_with_stable_ties():
+    _add_priced_nfts(20)
+    ids = _collect_pages(limit=4, sort_by='sol_price', order='asc')
+    assert len(ids) == 20 and len(set(ids)) == 20 # Every NFT exactly once, ties included
+    nfts = {nft['id']: nft for nft in get_marketplace_nfts()}
+    prices = [nfts[nft_id]['sol_price_at_mint'] for nft_id in ids]
+    assert prices == sorted(prices)
+
+def test_marketplace_cursor_does_not_shift_when_new_mints_arrive():
+    _add_priced_nfts(6)
+    first = get_marketplace_page(limit=3)
+    add_minted_nft_to_market({"id": "brand_new", "name": "New", "mint_timestamp_iso": datetime.datetime.now(datetime.timezone.utc).isoformat()})
+    second = get_marketplace_page(limit=3, cursor=first['next_cursor'])
+    assert [nft['id'] for nft in second['items']] == ["nft2", "nft1", "nft0"]
+    assert second['next_cursor'] is None
+
+def test_marketplace_page_rejects_bad_parameters():
+    _add_priced_nfts(3)
+    assert get_marketplace_page(sort_by='rarity')['status'] == 'error'
+    assert get_marketplace_page(limit=0)['status'] == 'error'
+    assert 'Invalid cursor' in get_marketplace_page(cursor='not-a-cursor')['message']
+    cursor = get_marketplace_page(limit=1, sort_by='sol_price')['next_cursor']
+    assert 'different sort order' in get_marketplace_page(cursor=cursor, sort_by='mint_time')['message']
+
+
+def _add_filterable_nfts():
+    base_time = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+    nfts = [{
+        'id': f'filter{i}', 'name': f'Filter {i}', 'mint_type': 'long' if i % 2 else 'short',
+        'mint_timestamp_iso': (base_time + datetime.timedelta(hours=i)).isoformat(),
+        'btc_price_at_mint': 60000.0 + i * 100, 'sol_price_at_mint': 100.0 + i,
+        'attributes': [{'trait_type': 'Background', 'value': 'gold' if i in (7, 9) else 'plain'}] # The rare ones
+    } for i in range(10)]
+    add_minted_nfts_to_market(nfts)
+    return base_time
+
 @patch('app.services.market_service.check_feature_access', return_value=True) # Assume user has access
-def test_get_marketplace_nfts_filtered_placeholder(mock_check_access):
-    _populate_dummy_nfts()
-    # Test with VIP user who has access
-    filters = {'rarity_min': 0.8} # Example filter
-    filtered_nfts = get_marketplace_nfts_filtered(filters=filters, user_wallet_address="VIP_USER")
-    # Placeholder function currently returns all, so we check that
-    assert len(filtered_nfts) == len(_minted_nfts)
-    # To test the access denial, you'd mock check_feature_access to return False
-    # and verify the filter was removed or an error/specific response was given.
-    
-    # Test basic call without filters
+def test_get_marketplace_nfts_filtered_uses_filters(mock_check_access):
+    base_time = _add_filterable_nfts()
+    result = get_marketplace_nfts_filtered(filters={'rarity_min': 0.5, 'mint_type': 'long'}, user_wallet_address="VIP_USER")
+    assert [nft['id'] for nft in result['items']] == ['filter9', 'filter7'] # Newest first
+    mock_check_access.assert_called_once_with("VIP_USER", "rarity_filtering")
+
+    result = get_marketplace_nfts_filtered(filters={
+        'btc_price_min': 60200.0, 'btc_price_max': 60600.0,
+        'minted_after': int((base_time + datetime.timedelta(hours=3)).timestamp() * 1000)
+    }, sort_by='sol_price', order='asc')
+    assert [nft['id'] for nft in result['items']] == ['filter3', 'filter4', 'filter5', 'filter6']
+
+    # Basic call without filters: every NFT, one page at a time
     all_nfts = get_marketplace_nfts_filtered()
-    assert len(all_nfts) == len(_minted_nfts)
+    assert len(all_nfts['items']) == len(_minted_nfts)
+
+def test_get_marketplace_nfts_filtered_paginates():
+    _add_filterable_nfts()
+    ids, cursor = [], None
+    while True:
+        page = get_marketplace_nfts_filtered(filters={'sol_price_max': 107.0}, sort_by='btc_price', limit=3, cursor=cursor)
+        ids.extend(nft['id'] for nft in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert ids == [f'filter{i}' for i in range(7, -1, -1)]
+
+def test_get_marketplace_nfts_filtered_rejects_bad_filters():
+    assert get_marketplace_nfts_filtered(filters={'color': 'red'})['status'] == 'error'
+    assert get_marketplace_nfts_filtered(filters={'btc_price_min': 'cheap'})['status'] == 'error'
+    assert get_marketplace_nfts_filtered(filters={'mint_type': 'long'}, sort_by='rarity')['status'] == 'error'
+
+def test_get_rarest_nfts():
+    _add_filterable_nfts()
+    result = get_rarest_nfts(limit=2)
+    assert [nft['id'] for nft in result['items']] == ['filter9', 'filter7'] # Equally rare: newest first
+    assert [nft['rarity']['rank'] for nft in result['items']] == [1, 1]
+    assert result['items'][0]['rarity']['percentile'] == pytest.approx(8 / 9)
+    assert get_rarest_nfts(limit=0)['status'] == 'error'
 
+def test_filter_planner_starts_from_most_selective_index():
+    _add_filterable_nfts()
+    parsed = parse_filters({'mint_type': 'long', 'sol_price_min': 108.0, 'btc_price_min': 0.0})
+    predicates = market_service._query_index._predicates(parsed)
+    assert [predicate.count for predicate in predicates] == [2, 5, 10]
+    assert market_service._query_index.matching_seqs(parsed) == {9} # filter9, probed against the broad btc filter
+
+def test_filtered_page_walks_sort_order_for_broad_filters(monkeypatch):
+    nfts = [{'id': f'nft{i}', 'mint_type': 'long' if i % 3 else 'short', 'btc_price_at_mint': float(i % 7),
+             'sol_price_at_mint': 100.0 + i} for i in range(200)]
+    add_minted_nfts_to_market(nfts)
+    index = market_service._query_index
+    index.sync(market_service._store)
+
+    def all_pages(filters, order):
+        parsed, seqs, after = parse_filters(filters), [], None
+        while True:
+            page, has_more = index.page(parsed, 'btc_price', order, after, 7)
+            seqs.extend(seq for _, seq in page)
+            if not has_more:
+                return seqs
+            after = page[-1][0]
+
+    def expected(keep, order):
+        ranked = sorted((nft['btc_price_at_mint'], seq) for seq, nft in enumerate(nfts) if keep(nft))
+        return [seq for _, seq in (ranked if order == 'asc' else ranked[::-1])]
+
+    # A broad filter never builds (or sorts) its full matching set
+    with monkeypatch.context() as patched:
+        patched.setattr(index, '_matching_seqs', lambda predicates: pytest.fail("broad filter sorted its matches"))
+        for order in ('asc', 'desc'):
+            assert all_pages({'mint_type': 'long'}, order) == expected(lambda nft: nft['mint_type'] == 'long', order)
+    # A selective one sorts its few matches instead of walking every NFT
+    for order in ('asc', 'desc'):
+        assert all_pages({'sol_price_max': 105.0}, order) == expected(lambda nft: nft['sol_price_at_mint'] <= 105.0, order)
 
 @patch('app.services.market_service.check_feature_access', return_value=False) # User does NOT have access
 def test_get_marketplace_nfts_filtered_rarity_access_denied(mock_check_access_denied):
-    _populate_dummy_nfts()
-    original_filters = {'rarity_min': 0.8, 'other_filter': 'value'}
-    
-    # Call the function with a user who doesn't have rarity_filtering access
-    # The service should log a warning and ignore the 'rarity_min' filter.
-    # The `filters` dict passed to the function is modified in place by current implementation.
-    # This tests that the 'rarity_min' key is removed from the filters dictionary.
-    # A copy is made to check its state after the call.
-    filters_copy = original_filters.copy()
-    
-    get_marketplace_nfts_filtered(filters=filters_copy, user_wallet_address="BASIC_USER_NO_ACCESS")
-    
-    # Check that 'rarity_min' was removed by the function due to lack of access
-    assert 'rarity_min' not in filters_copy 
-    assert 'other_filter' in filters_copy # Other filters should remain untouched
+    _add_filterable_nfts()
+    filters = {'rarity_min': 0.8, 'mint_type': 'long'}
+
+    # The service logs a warning and removes 'rarity_min' (in place) for users without rarity_filtering access
+    result = get_marketplace_nfts_filtered(filters=filters, user_wallet_address="BASIC_USER_NO_ACCESS")
+
+    assert 'rarity_min' not in filters
+    assert 'mint_type' in filters # Other filters should remain untouched
+    assert len(result['items']) == 5 # Every long NFT, not only the rare ones
 
-def test_get_leaderboard_placeholder():
+def test_get_marketplace_nfts_filtered_rarity_requires_wallet():
+    _add_filterable_nfts()
+    filters = {'rarity_min': 0.8}
+    assert len(get_marketplace_nfts_filtered(filters=filters)['items']) == 10
+    assert filters == {}
+
+def test_get_leaderboard_ranks_wallets_by_minting():
+    add_minted_nfts_to_market([
+        {'id': 'lb1', 'name': 'LB 1', 'mint_type': 'long', 'owner_wallet': 'WALLET_A', 'mint_fee_sol': 0.02},
+        {'id': 'lb2', 'name': 'LB 2', 'mint_type': 'long', 'owner_wallet': 'WALLET_B', 'mint_fee_sol': 0.02},
+        {'id': 'lb3', 'name': 'LB 3', 'mint_type': 'short', 'owner_wallet': 'WALLET_B', 'mint_fee_sol': 0.02},
+    ])
     leaderboard = get_leaderboard()
-    assert isinstance(leaderboard, list)
-    if leaderboard: # If it returns data (it's a placeholder, so it should)
-        assert "user" in leaderboard[0]
-        assert "score" in leaderboard[0]
-        assert "rank" in leaderboard[0]
-        assert leaderboard[0]['rank'] == 1 # Based on dummy data provided in service
-    assert len(leaderboard) >= 3 # Based on dummy data size
+    assert [entry['user'] for entry in leaderboard] == ['WALLET_B', 'WALLET_A']
+    assert leaderboard[0]['rank'] == 1
+    assert leaderboard[0]['mints'] == 2
+    assert get_wallet_leaderboard_entry('WALLET_A')['rank'] == 2
+    assert get_wallet_leaderboard_entry('NO_MINTS') is None
+
+    add_minted_nft_to_market({'id': 'lb4', 'name': 'LB 4', 'owner_wallet': 'WALLET_A'})
+    add_minted_nft_to_market({'id': 'lb5', 'name': 'LB 5', 'owner_wallet': 'WALLET_A'})
+    assert get_leaderboard(limit=1)[0]['user'] == 'WALLET_A' # Updated by the new mints, no rebuild
+
+def test_long_price_chart_is_read_from_rollups():
+    price_history._reset_price_history()
+    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    start = now - 30 * 24 * 3600
+    for i in range(30 * 24 * 60): # 30 days of one point per minute
+        price_history.record_prices({'solana_usdc': 100.0 + (i % 1440) / 100}, start + i * 60)
+    add_minted_nft_to_market({"id": "old", "name": "old", "mint_timestamp_iso": datetime.datetime.fromtimestamp(start + 654321, datetime.timezone.utc).isoformat()})
+
+    chart_data = get_price_chart_data(time_range_hours=30 * 24, max_points=500)
+    assert chart_data['resolution'] == '1h' # 720 bars fit 4 x 500; 15m bars (2880) don't
+    assert len(chart_data['price_history']) <= 501
+    timestamps = [ts for ts, _ in chart_data['price_history']]
+    assert timestamps == sorted(timestamps)
+    event = chart_data['nft_events'][0]
+    tick_ms = int((start + 654321 // 60 * 60) * 1000) # The last tick at or before the mint
+    assert event['chart_price'] == 100.0 + (654321 // 60 % 1440) / 100
+    assert [tick_ms, event['chart_price']] in chart_data['price_history'] # Marker point kept exactly
+    assert get_price_chart_data(time_range_hours=1, max_points=500)['resolution'] == 'raw'
+    price_history._reset_price_history()
+
+def test_metadata_timestamp_format_is_parsed_once(caplog):
+    assert market_service._parse_mint_time({'mint_timestamp_iso': '2026-01-01 00:00:00 UTC'}) == datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    with caplog.at_level(logging.WARNING, logger='app.services.market_service'):
+        add_minted_nft_to_market({'id': 'bad_ts', 'name': 'B', 'mint_timestamp_iso': 'yesterday'})
+    assert len([record for record in caplog.records if 'bad_ts' in record.getMessage()]) == 1
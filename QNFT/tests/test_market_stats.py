@@ -0,0 +1,82 @@
+import pytest
+import datetime
+import numpy as np
+# Adjust import path based on your project structure
+from app.services import market_service
+from app.services.market_service import (
+    add_minted_nfts_to_market, configure_market_store, get_marketplace_stats, _clear_market_store
+)
+from app.services.market_stats import MarketColumns, HOUR_MS
+from app.services.market_store import InMemoryMarketStore, SQLiteMarketStore
+
+BASE_MS = 1_700_000_000_000 - 1_700_000_000_000 % HOUR_MS # On an hour boundary
+
+def nft(i, minute, mint_type='long', btc=60000.0, sol=150.0):
+    return {'id': f'nft{i}', 'name': f'NFT {i}', 'mint_type': mint_type, 'btc_price_at_mint': btc, 'sol_price_at_mint': sol,
+            'mint_timestamp_iso': datetime.datetime.fromtimestamp((BASE_MS + minute * 60000) / 1000, datetime.timezone.utc).isoformat()}
+
+@pytest.fixture(autouse=True)
+def clear_nft_store():
+    _clear_market_store()
+    yield
+    _clear_market_store()
+
+def test_window_aggregates():
+    add_minted_nfts_to_market([
+        nft(0, 10, 'long', 60000.0, 150.0),
+        nft(1, 20, 'short', 62000.0, None),
+        nft(2, 70, 'long', 61000.0, 140.0),
+        nft(3, 200, 'short', 10.0, 1.0), # Outside the window below
+    ])
+    stats = get_marketplace_stats(start_ms=BASE_MS, end_ms=BASE_MS + 2 * HOUR_MS)['stats']
+    assert stats['count'] == 3
+    assert stats['btc_price_at_mint'] == {'floor': 60000.0, 'average': 61000.0, 'max': 62000.0, 'count': 3}
+    assert stats['sol_price_at_mint'] == {'floor': 140.0, 'average': 145.0, 'max': 150.0, 'count': 2} # Missing price skipped
+    assert stats['mints_per_hour'] == 1.5
+    assert stats['hourly_mints'] == [[BASE_MS, 2], [BASE_MS + HOUR_MS, 1]]
+    assert (stats['long_count'], stats['short_count'], stats['long_short_ratio']) == (2, 1, 2.0)
+
+def test_empty_window_and_bad_window():
+    stats = get_marketplace_stats(start_ms=BASE_MS, end_ms=BASE_MS + HOUR_MS)['stats']
+    assert stats['count'] == 0
+    assert stats['btc_price_at_mint']['floor'] is None
+    assert stats['long_short_ratio'] is None
+    assert get_marketplace_stats(start_ms=BASE_MS + 1, end_ms=BASE_MS)['status'] == 'error'
+
+def test_out_of_order_mints_and_growth_match_a_full_recompute():
+    rng = np.random.default_rng(7)
+    minutes = rng.integers(0, 10_000, size=3000)
+    nfts = [nft(i, int(minute), ['long', 'short', 'other'][i % 3], float(rng.uniform(50000, 70000)), float(rng.uniform(100, 200)))
+            for i, minute in enumerate(minutes)]
+    for start in range(0, len(nfts), 500): # Several incremental batches, past the initial capacity
+        add_minted_nfts_to_market(nfts[start:start + 500])
+
+    start_ms, end_ms = BASE_MS + 2000 * 60000, BASE_MS + 6000 * 60000
+    stats = get_marketplace_stats(start_ms=start_ms, end_ms=end_ms)['stats']
+    in_window = [item for item, minute in zip(nfts, minutes) if 2000 <= minute <= 6000]
+    assert stats['count'] == len(in_window)
+    assert stats['btc_price_at_mint']['floor'] == min(item['btc_price_at_mint'] for item in in_window)
+    assert stats['long_count'] == sum(item['mint_type'] == 'long' for item in in_window)
+
+def test_columns_follow_rows_added_by_another_worker(tmp_path):
+    path = str(tmp_path / 'market.sqlite3')
+    configure_market_store(path)
+    try:
+        add_minted_nfts_to_market([nft(0, 5)])
+        other_worker = SQLiteMarketStore(path)
+        other_worker.add_many([market_service._store_record(nft(1, 6, 'short'))])
+
+        stats = get_marketplace_stats(start_ms=BASE_MS, end_ms=BASE_MS + HOUR_MS)['stats']
+        assert (stats['count'], stats['long_count'], stats['short_count']) == (2, 1, 1)
+    finally:
+        configure_market_store(None)
+
+def test_sync_only_reads_new_rows():
+    store = InMemoryMarketStore()
+    columns = MarketColumns(capacity=2)
+    store.add_many([market_service._store_record(nft(i, i)) for i in range(3)])
+    columns.sync(store)
+    store.add_many([market_service._store_record(nft(3, 3))])
+    assert store.rows_after(columns._last_seq) == [store.rows_after(-1)[-1]]
+    columns.sync(store)
+    assert len(columns) == 4
@@ -0,0 +1,98 @@
+import pytest
+import datetime
+import threading
+# Adjust import path based on your project structure
+from app.services import market_service
+from app.services.market_service import (
+    add_minted_nft_to_market, add_minted_nfts_to_market, configure_market_store,
+    get_marketplace_nfts, get_marketplace_page, get_price_chart_data, _clear_market_store
+)
+from app.services.market_store import SQLiteMarketStore
+from app.utils.sqlite_utils import connect_wal
+
+BASE_TIME = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=10)
+
+def make_nfts(count):
+    return [{
+        "id": f"nft{i}", "name": f"NFT {i}", "mint_type": ["long", "short", None][i % 3],
+        "mint_timestamp_iso": (BASE_TIME + datetime.timedelta(minutes=i)).isoformat() if i % 5 else "not a date",
+        "btc_price_at_mint": float(60000 + (i * 13) % 7) if i % 4 else None,
+        "sol_price_at_mint": float(100 + (i * 7) % 5),
+    } for i in range(count)]
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "market.sqlite3")
+    configure_market_store(path)
+    yield path
+    configure_market_store(None)
+    _clear_market_store()
+
+def all_pages(**kwargs):
+    ids, cursor = [], None
+    while True:
+        page = get_marketplace_page(cursor=cursor, **kwargs)
+        ids.extend(nft['id'] for nft in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+def test_sqlite_store_roundtrip_and_persistence(db_path):
+    nfts = make_nfts(5)
+    add_minted_nfts_to_market(nfts)
+    assert get_marketplace_nfts() == nfts
+
+    configure_market_store(None) # Simulate a restart of the worker
+    configure_market_store(db_path)
+    assert get_marketplace_nfts() == nfts
+    assert nfts[0] not in market_service._minted_nfts # Nothing was written to the in-memory store
+
+def test_sqlite_pages_match_in_memory_store(db_path):
+    nfts = make_nfts(23)
+    add_minted_nfts_to_market(nfts)
+    sqlite_orders = {(sort_by, order): all_pages(limit=4, sort_by=sort_by, order=order)
+                     for sort_by in market_service.SORT_KEYS for order in ('asc', 'desc')}
+
+    configure_market_store(None)
+    _clear_market_store()
+    add_minted_nfts_to_market(nfts)
+    for (sort_by, order), ids in sqlite_orders.items():
+        assert len(ids) == 23
+        assert all_pages(limit=4, sort_by=sort_by, order=order) == ids, (sort_by, order)
+
+def test_sqlite_chart_range_uses_mint_time_index(db_path):
+    add_minted_nfts_to_market(make_nfts(12))
+    event_ids = [event['id'] for event in get_price_chart_data(time_range_hours=24)['nft_events']]
+    assert event_ids == [f"nft{i}" for i in range(12) if i % 5] # Unparseable timestamps are not charted
+    plan = connect_wal(db_path).execute(
+        "EXPLAIN QUERY PLAN " + SQLiteMarketStore._RANGE_SQL, (0, 1)).fetchall()
+    assert any('idx_nfts_mint_ms' in row[-1] for row in plan)
+
+def test_readers_are_not_blocked_by_an_open_write(db_path):
+    add_minted_nft_to_market(make_nfts(1)[0])
+    writer = connect_wal(db_path)
+    writer.execute('BEGIN IMMEDIATE')
+    writer.execute(SQLiteMarketStore._INSERT_SQL, ('pending', None, None, None, None, '{}'))
+
+    counts = []
+    reader = threading.Thread(target=lambda: counts.append(len(get_marketplace_nfts())))
+    reader.start()
+    reader.join(timeout=2)
+    assert counts == [1] # Read the last committed state without waiting for the writer
+    writer.execute('ROLLBACK')
+
+def test_failed_batch_is_rolled_back(db_path):
+    with pytest.raises(TypeError):
+        add_minted_nfts_to_market([make_nfts(1)[0], {"id": "bad", "blob": object()}]) # Not JSON-serializable
+    assert get_marketplace_nfts() == []
+
+def test_both_stores_iterate_in_batches(db_path):
+    nfts = make_nfts(11)
+    add_minted_nfts_to_market(nfts)
+    assert [len(batch) for batch in market_service.iter_marketplace_nfts(batch_size=4)] == [4, 4, 3]
+    assert [nft for batch in market_service.iter_marketplace_nfts(batch_size=4) for nft in batch] == nfts
+
+    configure_market_store(None)
+    _clear_market_store()
+    add_minted_nfts_to_market(nfts)
+    assert [nft for batch in market_service.iter_marketplace_nfts(batch_size=4) for nft in batch] == nfts
@@ -1,17 +1,31 @@
 import pytest
 import responses # For mocking HTTP requests
 import time
+import threading
+from unittest.mock import patch, MagicMock
 # Adjust import path based on your project structure
-from app.services.price_fetcher import get_btc_usdc_price, get_sol_usdc_price, _price_cache, CACHE_DURATION_SECONDS
+from app.services import price_fetcher
+from app.services.price_fetcher import (
+    get_btc_usdc_price, get_sol_usdc_price, get_price_snapshot, get_prices_with_age,
+    start_price_refresher, stop_price_refresher,
+    _price_cache, CACHE_DURATION_SECONDS, MAX_STALE_SECONDS
+)
 
-COINGECKO_API_URL_BTC = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usdc"
-COINGECKO_API_URL_SOL = "https://api.coingecko.com/api/v3/simple/price?ids=solana&vs_currencies=usdc"
+# A cache miss on any tracked pair refreshes all tracked pairs with one request
+COINGECKO_API_URL_TRACKED = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,solana&vs_currencies=usdc"
+COINGECKO_API_URL_BTC = COINGECKO_API_URL_TRACKED
+COINGECKO_API_URL_SOL = COINGECKO_API_URL_TRACKED
 
 @pytest.fixture(autouse=True)
-def clear_cache_and_reset_responses():
+def clear_cache_and_reset_responses(monkeypatch):
     """Clears the cache before each test and ensures responses is reset."""
     _price_cache.clear()
+    price_fetcher._reset_http_state()
+    monkeypatch.setattr(price_fetcher, '_backoff_delay', lambda attempt: 0) # Retry without sleeping
     responses.reset() # Reset responses library state
+    yield
+    price_fetcher._join_background_refresh(timeout=5) # Don't leak a refresh into the next test
+    price_fetcher.configure_shared_cache(None)
 
 @responses.activate
 def test_get_btc_usdc_price_success():
@@ -92,9 +106,27 @@ def test_cache_expiration():
     original_timestamp = _price_cache['solana_usdc']['timestamp']
     _price_cache['solana_usdc']['timestamp'] = original_timestamp - CACHE_DURATION_SECONDS - 10 # Move it back in time
 
+    # Stale-while-revalidate: the expired price is served immediately and refreshed in the background
+    price_stale = get_sol_usdc_price()
+    assert price_stale == 160.00
+    price_fetcher._join_background_refresh(timeout=5)
+    assert len(responses.calls) == 2 # The background refresh made a second API call
+
     price_after_expiry = get_sol_usdc_price()
-    assert price_after_expiry == 165.00 # Should fetch new price
-    assert len(responses.calls) == 2 # Should have made a second API call
+    assert price_after_expiry == 165.00 # Refreshed price
+    assert len(responses.calls) == 2
+
+@responses.activate
+def test_too_stale_price_is_fetched_inline():
+    responses.add(
+        responses.GET,
+        COINGECKO_API_URL_SOL,
+        json={"solana": {"usdc": 170.00}},
+        status=200
+    )
+    _price_cache['solana_usdc'] = {'price': 120.00, 'timestamp': time.time() - MAX_STALE_SECONDS - 1}
+    assert get_sol_usdc_price() == 170.00 # Too old to serve, caller waits for a fresh price
+    assert len(responses.calls) == 1
 
 @responses.activate
 def test_get_price_api_error_404():
@@ -156,3 +188,248 @@ def test_get_price_currency_not_found_in_response():
     )
     price = get_btc_usdc_price() # This function specifically looks for 'usdc'
     assert price is None
+
+@responses.activate
+def test_single_request_fills_all_tracked_pairs():
+    responses.add(
+        responses.GET,
+        COINGECKO_API_URL_TRACKED,
+        json={"bitcoin": {"usdc": 52000.00}, "solana": {"usdc": 155.00}},
+        status=200
+    )
+    assert get_btc_usdc_price() == 52000.00
+    assert get_sol_usdc_price() == 155.00 # Filled by the same request
+    assert len(responses.calls) == 1
+    assert _price_cache['bitcoin_usdc']['timestamp'] == _price_cache['solana_usdc']['timestamp']
+
+@responses.activate
+def test_get_price_snapshot():
+    responses.add(
+        responses.GET,
+        COINGECKO_API_URL_TRACKED,
+        json={"bitcoin": {"usdc": 53000.00}, "solana": {"usdc": 157.00}},
+        status=200
+    )
+    snapshot = get_price_snapshot()
+    assert snapshot == {'bitcoin_usdc': 53000.00, 'solana_usdc': 157.00}
+    assert get_price_snapshot() == snapshot # Served from cache
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test_get_price_snapshot_partial_response():
+    responses.add(
+        responses.GET,
+        COINGECKO_API_URL_TRACKED,
+        json={"bitcoin": {"usdc": 54000.00}}, # SOL missing from the response
+        status=200
+    )
+    snapshot = get_price_snapshot()
+    assert snapshot == {'bitcoin_usdc': 54000.00, 'solana_usdc': None}
+    assert 'solana_usdc' not in _price_cache
+
+@responses.activate
+def test_get_price_snapshot_untracked_pair_joins_the_request():
+    responses.add(
+        responses.GET,
+        "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,solana,ethereum&vs_currencies=usdc",
+        json={"bitcoin": {"usdc": 1.0}, "solana": {"usdc": 2.0}, "ethereum": {"usdc": 3.0}},
+        status=200
+    )
+    assert get_price_snapshot([('ethereum', 'usdc')]) == {'ethereum_usdc': 3.0}
+    assert len(responses.calls) == 1
+    assert _price_cache['bitcoin_usdc']['price'] == 1.0
+
+@responses.activate
+def test_get_prices_with_age_never_waits():
+    responses.add(
+        responses.GET,
+        COINGECKO_API_URL_TRACKED,
+        json={"bitcoin": {"usdc": 55000.00}, "solana": {"usdc": 158.00}},
+        status=200
+    )
+    # Cold cache: returns immediately with no price and refreshes in the background
+    prices = get_prices_with_age()
+    assert prices['bitcoin_usdc'] == {'price': None, 'age_seconds': None, 'stale': True}
+    price_fetcher._join_background_refresh(timeout=5)
+
+    prices = get_prices_with_age()
+    assert prices['bitcoin_usdc']['price'] == 55000.00
+    assert prices['solana_usdc']['stale'] is False
+    assert 0 <= prices['solana_usdc']['age_seconds'] < CACHE_DURATION_SECONDS
+    assert len(responses.calls) == 1
+
+def test_price_refresher_keeps_cache_warm():
+    refreshed = threading.Event()
+    def fake_fetch(pairs):
+        refreshed.set()
+        return {'bitcoin_usdc': 56000.00, 'solana_usdc': 159.00}
+
+    with patch.object(price_fetcher, '_fetch_prices_from_api', side_effect=fake_fetch) as mock_fetch:
+        start_price_refresher(interval_seconds=60)
+        try:
+            assert refreshed.wait(timeout=5)
+            assert start_price_refresher() is price_fetcher._refresher_thread # Idempotent
+        finally:
+            stop_price_refresher(timeout=5)
+        assert get_price_snapshot() == {'bitcoin_usdc': 56000.00, 'solana_usdc': 159.00}
+        assert mock_fetch.call_count == 1 # Reader was served from the refreshed cache
+
+def test_concurrent_cache_misses_share_one_fetch():
+    fetch_started = threading.Event()
+    release_fetch = threading.Event()
+    def slow_fetch(pairs):
+        fetch_started.set()
+        release_fetch.wait(timeout=5)
+        return {'bitcoin_usdc': 57000.00, 'solana_usdc': 160.00}
+
+    results = []
+    with patch.object(price_fetcher, '_fetch_prices_from_api', side_effect=slow_fetch) as mock_fetch:
+        readers = [threading.Thread(target=lambda: results.append(get_price_snapshot())) for _ in range(20)]
+        for reader in readers:
+            reader.start()
+        assert fetch_started.wait(timeout=5)
+        time.sleep(0.05) # Let the other readers pile up on the in-flight fetch
+        release_fetch.set()
+        for reader in readers:
+            reader.join(timeout=5)
+
+    assert mock_fetch.call_count == 1 # Exactly one upstream request for the whole herd
+    assert len(results) == 20
+    assert all(result == {'bitcoin_usdc': 57000.00, 'solana_usdc': 160.00} for result in results)
+    assert price_fetcher._inflight_fetches == {}
+
+def test_failed_fetch_is_shared_and_not_cached():
+    with patch.object(price_fetcher, '_fetch_prices_from_api', return_value={}) as mock_fetch:
+        assert get_price_snapshot() == {'bitcoin_usdc': None, 'solana_usdc': None}
+        assert get_price_snapshot() == {'bitcoin_usdc': None, 'solana_usdc': None}
+    assert mock_fetch.call_count == 2 # Failures are not cached, the next miss tries again
+    assert _price_cache == {}
+
+@responses.activate
+def test_transient_error_is_retried():
+    responses.add(responses.GET, COINGECKO_API_URL_TRACKED, json={"error": "busy"}, status=503)
+    responses.add(responses.GET, COINGECKO_API_URL_TRACKED, json={"bitcoin": {"usdc": 58000.00}, "solana": {"usdc": 161.00}}, status=200)
+    assert get_btc_usdc_price() == 58000.00
+    assert len(responses.calls) == 2
+    stats = price_fetcher.get_price_fetcher_stats()
+    assert stats['requests'] == 2
+    assert stats['retries'] == 1
+    assert stats['circuit_breaker']['state'] == 'closed'
+    assert stats['latency_ms']['samples'] == 2
+
+@responses.activate
+def test_client_error_is_not_retried():
+    responses.add(responses.GET, COINGECKO_API_URL_TRACKED, json={"error": "bad request"}, status=400)
+    assert get_btc_usdc_price() is None
+    assert len(responses.calls) == 1
+    assert price_fetcher.get_price_fetcher_stats()['circuit_breaker']['consecutive_failures'] == 0
+
+@responses.activate
+def test_circuit_breaker_opens_and_serves_last_known_price():
+    _price_cache['bitcoin_usdc'] = {'price': 52000.00, 'timestamp': time.time() - MAX_STALE_SECONDS - 1}
+    responses.add(responses.GET, COINGECKO_API_URL_TRACKED, json={"error": "down"}, status=503)
+
+    for _ in range(price_fetcher.BREAKER_FAILURE_THRESHOLD):
+        assert get_btc_usdc_price() == 52000.00 # API down: last known price instead of None
+    assert price_fetcher.get_price_fetcher_stats()['circuit_breaker']['state'] == 'open'
+
+    calls_before = len(responses.calls)
+    assert get_btc_usdc_price() == 52000.00
+    assert len(responses.calls) == calls_before # Fails fast without touching the API
+    assert price_fetcher.get_price_fetcher_stats()['circuit_breaker']['rejected_requests'] == 1
+
+@responses.activate
+def test_circuit_breaker_half_open_trial_closes_it(monkeypatch):
+    breaker = price_fetcher._circuit_breaker
+    for _ in range(price_fetcher.BREAKER_FAILURE_THRESHOLD):
+        breaker.record_failure()
+    assert breaker.snapshot()['state'] == 'open'
+    assert get_btc_usdc_price() is None # Still open: no request made
+
+    breaker.opened_at = time.time() - price_fetcher.BREAKER_RESET_TIMEOUT_SECONDS
+    responses.add(responses.GET, COINGECKO_API_URL_TRACKED, json={"bitcoin": {"usdc": 59000.00}, "solana": {"usdc": 162.00}}, status=200)
+    assert get_btc_usdc_price() == 59000.00
+    assert len(responses.calls) == 1
+    assert breaker.snapshot()['state'] == 'closed'
+
+
+# --- Shared cross-process cache ---
+
+def _publish_as_other_worker(prices, timestamp):
+    """Writes prices to the shared cache the way another worker's fetch would."""
+    price_fetcher._publish_shared_prices(prices, timestamp)
+
+@responses.activate
+def test_shared_cache_warms_a_new_process(tmp_path):
+    price_fetcher.configure_shared_cache(str(tmp_path / "prices.sqlite3"))
+    _publish_as_other_worker({'bitcoin_usdc': 61000.00, 'solana_usdc': 163.00}, time.time() - 5)
+    price_fetcher.configure_shared_cache(None)
+    _price_cache.clear() # Simulate a restart: the in-process cache is gone
+
+    price_fetcher.configure_shared_cache(str(tmp_path / "prices.sqlite3"))
+    assert _price_cache['bitcoin_usdc']['price'] == 61000.00
+    assert get_price_snapshot() == {'bitcoin_usdc': 61000.00, 'solana_usdc': 163.00}
+    assert len(responses.calls) == 0
+
+@responses.activate
+def test_cache_miss_uses_price_fetched_by_another_worker(tmp_path):
+    price_fetcher.configure_shared_cache(str(tmp_path / "prices.sqlite3"))
+    _publish_as_other_worker({'bitcoin_usdc': 62000.00, 'solana_usdc': 164.00}, time.time())
+    assert get_btc_usdc_price() == 62000.00 # Not in this process's cache, but shared
+    assert len(responses.calls) == 0
+
+@responses.activate
+def test_fetched_prices_are_published_to_shared_cache(tmp_path):
+    price_fetcher.configure_shared_cache(str(tmp_path / "prices.sqlite3"))
+    responses.add(responses.GET, COINGECKO_API_URL_TRACKED, json={"bitcoin": {"usdc": 63000.00}, "solana": {"usdc": 165.00}}, status=200)
+    assert get_btc_usdc_price() == 63000.00
+    entries = price_fetcher._load_shared_prices()
+    assert entries['bitcoin_usdc']['price'] == 63000.00
+    assert entries['solana_usdc']['price'] == 165.00
+
+@responses.activate
+def test_waits_for_another_workers_fetch_instead_of_duplicating_it(tmp_path):
+    price_fetcher.configure_shared_cache(str(tmp_path / "prices.sqlite3"))
+    lease_name = 'bitcoin_usdc,solana_usdc'
+    conn = price_fetcher.get_connection(str(tmp_path / "prices.sqlite3"))
+    conn.execute("INSERT INTO fetch_leases VALUES (?, ?, ?)", (lease_name, 'other-worker', time.time() + 5))
+
+    other_worker = threading.Timer(0.2, _publish_as_other_worker, args=({'bitcoin_usdc': 64000.00, 'solana_usdc': 166.00}, time.time()))
+    other_worker.start()
+    try:
+        assert get_btc_usdc_price() == 64000.00
+    finally:
+        other_worker.join()
+    assert len(responses.calls) == 0
+
+@responses.activate
+def test_retries_stop_at_the_fetch_deadline(monkeypatch):
+    responses.add(responses.GET, COINGECKO_API_URL_TRACKED, json={"error": "busy"}, status=503)
+    monkeypatch.setattr(price_fetcher, 'FETCH_DEADLINE_SECONDS', 0.2) # Less than one retry needs
+    assert price_fetcher.FETCH_DEADLINE_SECONDS < price_fetcher.FETCH_WAIT_TIMEOUT_SECONDS
+    assert get_btc_usdc_price() is None
+    assert len(responses.calls) == 1
+    assert price_fetcher.get_price_fetcher_stats()['circuit_breaker']['consecutive_failures'] == 1
+
+@responses.activate
+def test_other_request_errors_are_counted_and_trip_the_breaker():
+    responses.add(responses.GET, COINGECKO_API_URL_TRACKED, body=price_fetcher.requests.exceptions.InvalidJSONError("bad"))
+    assert get_btc_usdc_price() is None
+    assert len(responses.calls) == 1 # Not retried
+    stats = price_fetcher.get_price_fetcher_stats()
+    assert stats['failures'] == 1 and stats['circuit_breaker']['consecutive_failures'] == 1
+
+def test_hedged_fetches_go_through_the_circuit_breaker():
+    client = MagicMock()
+    client.fetch_sync.return_value = {} # Every provider failed
+    price_fetcher.configure_price_providers(client)
+    try:
+        for _ in range(price_fetcher.BREAKER_FAILURE_THRESHOLD):
+            assert get_btc_usdc_price() is None
+        assert price_fetcher.get_price_fetcher_stats()['circuit_breaker']['state'] == 'open'
+        calls = client.fetch_sync.call_count
+        assert get_btc_usdc_price() is None
+        assert client.fetch_sync.call_count == calls # Rejected without asking the providers
+    finally:
+        price_fetcher.configure_price_providers(None)
+        price_fetcher._reset_http_state() # Don't leave the breaker open for other modules' tests
@@ -0,0 +1,97 @@
+import pytest
+import time
+from unittest.mock import patch
+# Adjust import path based on your project structure
+from app.services import price_fetcher, price_history
+from app.services.price_history import PriceSeries, configure_price_history, get_price_history, get_series, record_prices
+
+@pytest.fixture(autouse=True)
+def reset_history():
+    """Every test starts with empty, in-memory history."""
+    price_history._reset_price_history()
+    yield
+    price_history._reset_price_history()
+
+def test_range_query_is_inclusive_and_sorted():
+    series = PriceSeries()
+    for timestamp, price in [(100.0, 1.0), (200.0, 2.0), (300.0, 3.0), (250.0, 2.5)]: # One late point
+        series.append(timestamp, price)
+
+    timestamps, prices = series.range(200.0, 300.0)
+    assert list(timestamps) == [200.0, 250.0, 300.0]
+    assert list(prices) == [2.0, 2.5, 3.0]
+    assert list(series.range(301.0, 400.0)[0]) == []
+    assert series.latest() == (300.0, 3.0)
+
+def test_get_price_history_returns_millisecond_points():
+    record_prices({'solana_usdc': 150.25, 'bitcoin_usdc': None}, 1_700_000_000.5)
+    assert get_price_history('solana_usdc', 1_700_000_000, 1_700_000_001) == [[1_700_000_000_500, 150.25]]
+    assert len(get_series('bitcoin_usdc')) == 0 # Missing prices are not recorded
+
+def test_history_persists_across_restarts(tmp_path):
+    configure_price_history(str(tmp_path))
+    record_prices({'solana_usdc': 151.0}, 1000.0)
+    record_prices({'solana_usdc': 152.0}, 1060.0)
+
+    price_history._reset_price_history() # Simulate a restart
+    configure_price_history(str(tmp_path))
+    assert get_price_history('solana_usdc', 0, 2000) == [[1_000_000, 151.0], [1_060_000, 152.0]]
+
+def test_series_sees_records_appended_by_another_process(tmp_path):
+    path = str(tmp_path / "solana_usdc.bin")
+    this_worker, other_worker = PriceSeries(path), PriceSeries(path)
+    this_worker.append(1000.0, 151.0)
+    other_worker.append(1030.0, 151.5)
+    assert list(this_worker.range(0, 2000)[1]) == [151.0, 151.5]
+
+    with open(path, 'ab') as f:
+        f.write(price_history.RECORD.pack(1060.0, 152.0)[:8]) # A record still being written
+    assert len(this_worker.range(0, 2000)[0]) == 2
+
+def test_fetched_prices_are_recorded():
+    price_fetcher._price_cache.clear()
+    try:
+        with patch.object(price_fetcher, '_fetch_prices_from_api', return_value={'bitcoin_usdc': 60000.0, 'solana_usdc': 150.0}):
+            price_fetcher.get_price_snapshot()
+            price_fetcher.get_price_snapshot() # Cache hit: nothing new to record
+    finally:
+        price_fetcher._price_cache.clear()
+    now = time.time()
+    assert [point[1] for point in get_price_history('solana_usdc', now - 60, now)] == [150.0]
+    assert len(get_series('bitcoin_usdc')) == 1
+
+def test_rollups_keep_ohlc_bars_per_resolution():
+    series = PriceSeries()
+    for timestamp, price in [(0.0, 10.0), (20.0, 12.0), (50.0, 9.0), (70.0, 11.0), (3600.0, 20.0), (40.0, 13.0)]: # One late point
+        series.append(timestamp, price)
+
+    minute = series.bars('1m', 0, 4000)
+    assert list(minute['start']) == [0.0, 60.0, 3600.0]
+    assert (minute['open'][0], minute['high'][0], minute['low'][0], minute['close'][0]) == (10.0, 13.0, 9.0, 9.0)
+    hour = series.bars('1h', 0, 4000)
+    assert list(hour['open']) == [10.0, 20.0] and list(hour['close']) == [11.0, 20.0]
+    assert list(hour['last_ts']) == [70.0, 3600.0]
+    assert list(series.bars('1d', 0, 4000)['high']) == [20.0]
+    assert list(series.bars('1m', 65, 4000)['start']) == [60.0, 3600.0] # The bar 65 falls in is included
+
+def test_rollups_are_rebuilt_from_disk(tmp_path):
+    configure_price_history(str(tmp_path))
+    for i in range(120):
+        record_prices({'solana_usdc': 100.0 + i}, 1000.0 + i * 30)
+
+    price_history._reset_price_history() # Simulate a restart
+    configure_price_history(str(tmp_path))
+    bars = price_history.get_price_ohlc('solana_usdc', '15m', 0, 10_000)
+    assert bars[0] == [900_000, 100.0, 126.0, 100.0, 126.0] # 1000s..1780s fall in the bar starting at 900s
+    assert len(bars) == 5
+
+def test_pick_resolution_prefers_the_finest_that_fits():
+    series = PriceSeries()
+    for i in range(3 * 24 * 60): # Three days of one point per minute
+        series.append(i * 60.0, 1.0)
+    end = 3 * 24 * 3600.0
+    assert series.pick_resolution(0, end) == 'raw'
+    assert series.pick_resolution(0, 3600, 100) == 'raw'
+    assert series.pick_resolution(0, end, 300) == '15m'
+    assert series.pick_resolution(0, end, 100) == '1h'
+    assert series.pick_resolution(0, end, 2) == '1d' # Nothing fits: the coarsest
@@ -0,0 +1,171 @@
+import pytest
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+# Adjust import path based on your project structure
+from app.services import price_fetcher
+from app.services.price_providers import (
+    BinanceProvider, CoinbaseProvider, CoinGeckoProvider, HedgedPriceClient, PriceProvider, build_hedged_client
+)
+
+pytest.importorskip("aiohttp")
+
+BTC, SOL = ('bitcoin', 'usdc'), ('solana', 'usdc')
+
+
+class StubPriceServer:
+    """Local HTTP server answering one provider's price endpoint after a configurable delay."""
+
+    def __init__(self, body, delay=0.0, status=200):
+        self.body, self.delay, self.status = body, delay, status
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(self.path)
+                time.sleep(stub.delay)
+                payload = json.dumps(stub.body).encode('utf-8')
+                try:
+                    self.send_response(stub.status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # The client cancelled this straggler
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_servers():
+    servers = []
+    def start(body, delay=0.0, status=200):
+        server = StubPriceServer(body, delay, status)
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.close()
+
+def coingecko_body(btc, sol):
+    return {'bitcoin': {'usdc': btc}, 'solana': {'usdc': sol}}
+
+def binance_body(btc, sol):
+    return [{'symbol': 'BTCUSDC', 'price': str(btc)}, {'symbol': 'SOLUSDC', 'price': str(sol)}]
+
+
+def test_first_mode_takes_fastest_answer_and_cancels_stragglers(stub_servers):
+    slow = CoinGeckoProvider(stub_servers(coingecko_body(60000.0, 150.0), delay=1.0).base_url)
+    fast = BinanceProvider(stub_servers(binance_body(60100.0, 151.0)).base_url)
+    client = HedgedPriceClient([slow, fast], mode='first', deadline_seconds=2.0)
+
+    started = time.perf_counter()
+    assert client.fetch_sync([BTC, SOL]) == {BTC: 60100.0, SOL: 151.0}
+    assert time.perf_counter() - started < 0.8 # Did not wait for the slow provider
+    assert slow.stats.cancelled == 1
+    assert fast.stats.successes == 1
+
+def test_median_mode_combines_answers(stub_servers):
+    client = HedgedPriceClient([
+        CoinGeckoProvider(stub_servers(coingecko_body(60000.0, 150.0)).base_url),
+        BinanceProvider(stub_servers(binance_body(60100.0, 151.0)).base_url),
+        CoinbaseProvider(stub_servers({'data': {'amount': '75000.00', 'base': 'BTC', 'currency': 'USDC'}}).base_url),
+    ], mode='median', deadline_seconds=2.0)
+
+    prices = client.fetch_sync([BTC, SOL])
+    assert prices[BTC] == 60100.0 # The outlier does not move the median
+    assert prices[SOL] == 151.0 # The stub answers every Coinbase pair with 75000, still the median of three
+
+def test_median_mode_ignores_answers_after_the_deadline(stub_servers):
+    late = CoinGeckoProvider(stub_servers(coingecko_body(99999.0, 999.0), delay=1.5).base_url)
+    client = HedgedPriceClient([
+        late,
+        BinanceProvider(stub_servers(binance_body(60100.0, 151.0)).base_url),
+    ], mode='median', deadline_seconds=0.4)
+
+    started = time.perf_counter()
+    assert client.fetch_sync([BTC, SOL]) == {BTC: 60100.0, SOL: 151.0}
+    assert time.perf_counter() - started < 1.0
+    assert late.stats.cancelled == 1
+
+def test_failed_provider_is_replaced_by_next_ranked(stub_servers):
+    broken = CoinGeckoProvider(stub_servers({'error': 'down'}, status=503).base_url)
+    backup = BinanceProvider(stub_servers(binance_body(60200.0, 152.0)).base_url)
+    backup.stats.ewma_latency = 10.0 # Ranked last, so only asked once the first provider fails
+    client = HedgedPriceClient([broken, backup], mode='first', deadline_seconds=2.0, fanout=1)
+
+    assert client.fetch_sync([BTC, SOL]) == {BTC: 60200.0, SOL: 152.0}
+    assert broken.stats.failures == 1
+    assert '503' in broken.stats.last_error
+
+def test_slow_provider_is_demoted(stub_servers):
+    slow = CoinGeckoProvider(stub_servers(coingecko_body(60000.0, 150.0), delay=0.3).base_url)
+    fast = BinanceProvider(stub_servers(binance_body(60100.0, 151.0)).base_url)
+    client = HedgedPriceClient([slow, fast], mode='median', deadline_seconds=2.0)
+    for _ in range(3):
+        client.fetch_sync([BTC, SOL])
+
+    assert client.ranked_providers() == [fast, slow]
+    assert list(client.stats()) == ['binance', 'coingecko']
+
+def test_build_hedged_client_rejects_unknown_provider():
+    with pytest.raises(ValueError):
+        build_hedged_client(['coingecko', 'nope'])
+
+def test_provider_without_fetch_cannot_be_created():
+    class NoFetchProvider(PriceProvider):
+        name = 'nofetch'
+        default_base_url = 'http://localhost'
+    with pytest.raises(TypeError):
+        NoFetchProvider()
+
+def test_price_fetcher_uses_hedged_client(stub_servers):
+    client = HedgedPriceClient([BinanceProvider(stub_servers(binance_body(60300.0, 153.0)).base_url)], deadline_seconds=2.0)
+    price_fetcher._price_cache.clear()
+    price_fetcher.configure_price_providers(client)
+    try:
+        with patch.object(price_fetcher, '_fetch_prices_from_api') as mock_coingecko:
+            assert price_fetcher.get_price_snapshot() == {'bitcoin_usdc': 60300.0, 'solana_usdc': 153.0}
+        mock_coingecko.assert_not_called()
+        assert 'binance' in price_fetcher.get_price_fetcher_stats()['providers']
+    finally:
+        price_fetcher.configure_price_providers(None)
+        price_fetcher._price_cache.clear()
+
+def test_coinbase_keeps_other_pairs_when_one_fails():
+    import asyncio
+    provider = CoinbaseProvider('http://unused')
+    async def fetch_pair(session, pair, ticker):
+        if pair == SOL:
+            raise ValueError('SOL-USDC not listed')
+        return pair, 60000.0
+    with patch.object(provider, '_fetch_pair', side_effect=fetch_pair):
+        assert asyncio.run(provider.fetch(None, [BTC, SOL])) == {BTC: 60000.0}
+        with pytest.raises(ValueError):
+            asyncio.run(provider.fetch(None, [SOL])) # Nothing answered: the provider failed
+
+def test_invalid_deadline_setting_falls_back_to_default(monkeypatch):
+    from app.services import price_providers
+    monkeypatch.setenv('QNFT_PRICE_PROVIDERS', 'binance')
+    monkeypatch.setenv('QNFT_PRICE_HEDGE_DEADLINE_MS', 'soon')
+    monkeypatch.setattr(price_fetcher, '_hedged_env_configured', False)
+    try:
+        price_fetcher.configure_hedged_providers()
+        assert price_fetcher._hedged_client.deadline_seconds == price_providers.DEFAULT_DEADLINE_SECONDS
+        price_fetcher.configure_hedged_providers() # Only the first call reads the environment
+    finally:
+        price_fetcher.configure_price_providers(None)
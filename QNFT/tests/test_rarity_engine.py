@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import patch
+# Adjust import path based on your project structure
+from app.services import rarity_engine
+from app.services.market_store import InMemoryMarketStore
+from app.services.rarity_engine import RarityIndex, nft_traits
+
+def make_nft(mint_type='long', btc=60000.0, sol=150.0, **attributes):
+    return {'mint_type': mint_type, 'btc_price_at_mint': btc, 'sol_price_at_mint': sol,
+            'attributes': [{'trait_type': trait_type, 'value': value} for trait_type, value in attributes.items()]}
+
+def add(store, index, *nfts):
+    store.add_many([{'nft': nft, 'mint_ms': None, 'sort_values': dict.fromkeys(('mint_time', 'btc_price', 'sol_price', 'mint_type'))} for nft in nfts])
+    index.sync(store)
+
+@pytest.fixture
+def store_and_index():
+    return InMemoryMarketStore(), RarityIndex()
+
+def test_traits_band_prices_and_skip_continuous_attributes():
+    traits = dict(nft_traits(make_nft('short', 61234.5, 153.2, **{'Timestamp': 'now', 'Background': 'gold', 'Mint Type': 'x'})))
+    assert traits == {'Mint Type': 'short', 'BTC Price Band': 61000.0, 'SOL Price Band': 150.0, 'Background': 'gold'}
+
+def test_counters_are_updated_incrementally(store_and_index):
+    store, index = store_and_index
+    add(store, index, make_nft('long'), make_nft('short'))
+    add(store, index, make_nft('long'))
+    assert index._trait_counts['Mint Type'] == {'long': 2, 'short': 1}
+    assert len(index) == 3
+
+def test_rarest_nft_is_ranked_first(store_and_index):
+    store, index = store_and_index
+    add(store, index, *[make_nft('long') for _ in range(8)], make_nft('short'), make_nft('long', sol=300.0, Background='gold'))
+    assert index.top(2) == [9, 8] # Two rare traits beat one
+    assert index.rarity(9) == {'score': pytest.approx(index._score(index._traits_of[9]), abs=1e-6), 'percentile': 1.0, 'rank': 1}
+    assert index.percentile(0) == 0.0
+    assert index.count_between(0.5, None) == 2
+    assert index.seqs_between(0.9, 1.0) == {9}
+
+def test_missing_trait_type_counts_as_a_shared_value(store_and_index):
+    store, index = store_and_index
+    add(store, index, make_nft(), make_nft(), make_nft(Background='plain'))
+    # Two NFTs lack Background, one has it: the one with it is rarer
+    assert index.top(1) == [2]
+
+def test_scores_are_memoized_per_version(store_and_index):
+    store, index = store_and_index
+    add(store, index, *[make_nft('long') for _ in range(50)], make_nft('short'))
+    with patch.object(rarity_engine.math, 'log', wraps=rarity_engine.math.log) as log:
+        index.top(5)
+        index.count_between(0.5, None)
+        index.rarity(3)
+    assert log.call_count == 2 * 3 # Two distinct trait combinations, three trait types, computed once
+
+    add(store, index, make_nft('short'))
+    assert index.rarity(50)['percentile'] == pytest.approx(50 / 51) # Ranking rebuilt for the new version
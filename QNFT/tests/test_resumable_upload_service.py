@@ -0,0 +1,138 @@
+import pytest
+import io
+import os
+import time
+import threading
+# Adjust import path based on your project structure
+from app.services import storage_service
+from app.services import resumable_upload_service
+from app.services.resumable_upload_service import (
+    init_resumable_upload,
+    store_upload_chunk,
+    get_upload_status,
+    finalize_resumable_upload,
+    expire_upload_sessions,
+    MIN_CHUNK_SIZE_BYTES,
+    SESSION_TTL_SECONDS
+)
+
+TEST_ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+TEST_MAX_SIZE_BYTES = 5 * 1024 * 1024 # 5MB, should match app config
+CHUNK_SIZE = MIN_CHUNK_SIZE_BYTES
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    storage_service._storage_instances.clear()
+    yield str(tmp_path)
+    storage_service._storage_instances.clear()
+
+def _chunks(payload):
+    return [payload[i:i + CHUNK_SIZE] for i in range(0, len(payload), CHUNK_SIZE)]
+
+def _init(upload_folder, payload, filename="photo.png"):
+    return init_resumable_upload(filename, len(payload), upload_folder, TEST_ALLOWED_EXTENSIONS, TEST_MAX_SIZE_BYTES, chunk_size=CHUNK_SIZE)
+
+def test_resumable_upload_resume_after_disconnect(upload_folder):
+    payload = os.urandom(CHUNK_SIZE * 3 + 100)
+    session = _init(upload_folder, payload)
+    assert session['status'] == 'success'
+    assert session['total_chunks'] == 4
+    upload_id = session['upload_id']
+    chunks = _chunks(payload)
+
+    # Client sends chunks 2 and 0, then drops off
+    assert store_upload_chunk(upload_id, 2, chunks[2], upload_folder)['status'] == 'success'
+    assert store_upload_chunk(upload_id, 0, chunks[0], upload_folder)['status'] == 'success'
+
+    status = get_upload_status(upload_id, upload_folder)
+    assert status['received_chunks'] == [0, 2]
+    assert status['missing_chunks'] == [1, 3]
+
+    incomplete = finalize_resumable_upload(upload_id, upload_folder, TEST_ALLOWED_EXTENSIONS, TEST_MAX_SIZE_BYTES)
+    assert incomplete['status'] == 'error'
+    assert 'incomplete' in incomplete['message']
+
+    # ...and resumes with only the missing ones
+    for index in status['missing_chunks']:
+        assert store_upload_chunk(upload_id, index, chunks[index], upload_folder)['status'] == 'success'
+
+    result = finalize_resumable_upload(upload_id, upload_folder, TEST_ALLOWED_EXTENSIONS, TEST_MAX_SIZE_BYTES)
+    assert result['status'] == 'success'
+    assert result['file_id'].endswith('_photo.png')
+    with open(os.path.join(upload_folder, result['file_id']), 'rb') as f:
+        assert f.read() == payload
+
+    # A retried finalize returns the same image instead of storing a duplicate
+    retried = finalize_resumable_upload(upload_id, upload_folder, TEST_ALLOWED_EXTENSIONS, TEST_MAX_SIZE_BYTES)
+    assert retried['file_id'] == result['file_id']
+    assert get_upload_status(upload_id, upload_folder)['received_chunks'] == [] # Chunks cleaned up
+
+def test_init_resumable_upload_validation(upload_folder):
+    result = init_resumable_upload("doc.pdf", 1000, upload_folder, TEST_ALLOWED_EXTENSIONS, TEST_MAX_SIZE_BYTES)
+    assert result['status'] == 'error'
+    assert "File type not allowed" in result['message']
+
+    result = init_resumable_upload("big.png", TEST_MAX_SIZE_BYTES + 1, upload_folder, TEST_ALLOWED_EXTENSIONS, TEST_MAX_SIZE_BYTES)
+    assert result['status'] == 'error'
+    assert "exceeds maximum size" in result['message']
+
+    result = init_resumable_upload("photo.png", 0, upload_folder, TEST_ALLOWED_EXTENSIONS, TEST_MAX_SIZE_BYTES)
+    assert result['status'] == 'error'
+    assert "Invalid total_size" in result['message']
+
+def test_store_upload_chunk_rejects_bad_chunks(upload_folder):
+    payload = os.urandom(CHUNK_SIZE + 10)
+    upload_id = _init(upload_folder, payload)['upload_id']
+
+    assert "Invalid chunk index" in store_upload_chunk(upload_id, 2, b"x", upload_folder)['message']
+    assert "Invalid chunk size" in store_upload_chunk(upload_id, 0, b"short", upload_folder)['message']
+    assert "Invalid chunk size" in store_upload_chunk(upload_id, 1, b"x" * 11, upload_folder)['message']
+    assert store_upload_chunk(upload_id, 1, payload[CHUNK_SIZE:], upload_folder)['status'] == 'success'
+
+def test_unknown_or_malformed_upload_id(upload_folder):
+    assert get_upload_status("0" * 32, upload_folder)['message'] == 'Upload session not found.'
+    assert store_upload_chunk("../../etc", 0, b"x", upload_folder)['message'] == 'Upload session not found.'
+
+def test_expired_sessions_are_deleted(upload_folder, monkeypatch):
+    payload = os.urandom(CHUNK_SIZE + 10)
+    old = _init(upload_folder, payload)['upload_id']
+    store_upload_chunk(old, 0, _chunks(payload)[0], upload_folder)
+    store = storage_service.get_storage(upload_folder)
+    store.save_fileobj(f"resumable/{'a' * 32}/0", io.BytesIO(b'orphan chunk'))
+
+    real_time = time.time
+    monkeypatch.setattr(resumable_upload_service.time, 'time', lambda: real_time() + SESSION_TTL_SECONDS + 1)
+    monkeypatch.setattr(resumable_upload_service, '_last_sweep', 0.0)
+    assert get_upload_status(old, upload_folder)['status'] == 'error'
+    fresh = _init(upload_folder, payload)['upload_id']
+
+    assert expire_upload_sessions(upload_folder, force=True) == 0 # Already swept by the init above
+    assert store.list_keys(f"resumable/{old}/") == []
+    assert store.list_keys(f"resumable/{'a' * 32}/") == []
+    assert get_upload_status(fresh, upload_folder)['status'] == 'success'
+
+def test_concurrent_finalize_stores_the_image_once(upload_folder, monkeypatch):
+    payload = os.urandom(CHUNK_SIZE + 10)
+    upload_id = _init(upload_folder, payload)['upload_id']
+    for index, chunk in enumerate(_chunks(payload)):
+        store_upload_chunk(upload_id, index, chunk, upload_folder)
+
+    calls = []
+    real_handle = resumable_upload_service.handle_image_upload
+    def slow_handle(*args, **kwargs):
+        calls.append(1)
+        time.sleep(0.05)
+        return real_handle(*args, **kwargs)
+    monkeypatch.setattr(resumable_upload_service, 'handle_image_upload', slow_handle)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(finalize_resumable_upload(
+        upload_id, upload_folder, TEST_ALLOWED_EXTENSIONS, TEST_MAX_SIZE_BYTES))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [r['status'] for r in results] == ['success'] * 4
+    assert len({r['file_id'] for r in results}) == 1
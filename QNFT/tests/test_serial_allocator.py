@@ -0,0 +1,80 @@
+import os
+import pytest
+import threading
+import multiprocessing
+# Adjust import path based on your project structure
+from app.services import serial_allocator
+from app.services.serial_allocator import SerialAllocator, configure_serial_allocator, next_nft_serial, _reset_serial_allocator
+from app.utils.sqlite_utils import close_connections
+
+@pytest.fixture(autouse=True)
+def reset_allocator():
+    _reset_serial_allocator()
+    yield
+    _reset_serial_allocator()
+    close_connections()
+
+def _allocate(db_path, count, results):
+    allocator = SerialAllocator(db_path, block_size=7)
+    results.extend(allocator.next_serial() for _ in range(count))
+
+def _allocate_in_process(db_path, count, queue):
+    results = []
+    _allocate(db_path, count, results)
+    queue.put(results)
+
+def test_in_memory_serials_start_at_one():
+    assert [next_nft_serial() for _ in range(3)] == [1, 2, 3]
+    allocator = SerialAllocator(block_size=2)
+    assert [allocator.next_serial() for _ in range(5)] == [1, 2, 3, 4, 5]
+
+def test_threads_never_share_a_serial(tmp_path):
+    allocator = SerialAllocator(str(tmp_path / "market.sqlite3"), block_size=5)
+    results = []
+    def worker():
+        results.extend(allocator.next_serial() for _ in range(200))
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == list(range(1, 1601))
+
+def test_allocators_sharing_a_database_reserve_disjoint_blocks(tmp_path):
+    db_path = str(tmp_path / "market.sqlite3")
+    first, second = SerialAllocator(db_path, block_size=10), SerialAllocator(db_path, block_size=10)
+    assert first.next_serial() == 1
+    assert second.next_serial() == 11 # Its own block, not the rest of the first one's
+    assert [first.next_serial() for _ in range(10)][-1] == 21 # Next block is reserved after 11-20
+
+    # A new allocator (a restarted worker) continues after every reserved block: no serial is reused
+    assert SerialAllocator(db_path, block_size=10).next_serial() == 31
+
+def test_processes_never_share_a_serial(tmp_path):
+    db_path = str(tmp_path / "market.sqlite3")
+    SerialAllocator(db_path) # Creates the table before the workers race
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    workers = [context.Process(target=_allocate_in_process, args=(db_path, 50, queue)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    results = [serial for _ in workers for serial in queue.get(timeout=60)]
+    for worker in workers:
+        worker.join()
+    assert len(results) == 150 and len(set(results)) == 150
+
+def test_configured_allocator_persists_and_discards_block_after_fork(tmp_path):
+    db_path = str(tmp_path / "market.sqlite3")
+    configure_serial_allocator(db_path, block_size=10)
+    assert next_nft_serial() == 1
+    configure_serial_allocator(db_path) # Same path: no-op, keeps the current block
+    assert next_nft_serial() == 2
+    serial_allocator._discard_block_in_child()
+    assert next_nft_serial() == 11
+
+def test_configuring_again_keeps_counting():
+    configure_serial_allocator(None) # As on every request with QNFT_MARKET_DB=""
+    assert next_nft_serial() == 1
+    configure_serial_allocator(None)
+    configure_serial_allocator("")
+    assert [next_nft_serial() for _ in range(2)] == [2, 3]
@@ -1,17 +1,16 @@
 import pytest
 from unittest.mock import patch
 # Adjust import path based on your project structure
-from app.services.solana_service import prepare_nft_metadata, _nft_serial_number, ADMIN_WALLET_ADDRESS
+from app.services.solana_service import prepare_nft_metadata, ADMIN_WALLET_ADDRESS
+from app.services.serial_allocator import _reset_serial_allocator
 from app.utils.cryptography_utils import encrypt_metadata_kyber # Test its actual placeholder behavior
 
 @pytest.fixture(autouse=True)
 def reset_serial_number():
-    """Resets the global serial number before each test."""
-    global _nft_serial_number
-    original_serial = _nft_serial_number
-    _nft_serial_number = 0
+    """Every test starts from a fresh in-memory allocator (serial 1)."""
+    _reset_serial_allocator()
     yield
-    _nft_serial_number = original_serial
+    _reset_serial_allocator()
 
 
 def test_prepare_nft_metadata_structure_and_encryption():
@@ -90,13 +89,12 @@ def test_prepare_nft_metadata_no_prices_or_user_desc():
 
 # Placeholder test for mint_qnft - primarily to show how dependencies would be mocked
 # Actual minting logic is heavily placeholder, so this test mostly verifies orchestration of calls.
-@patch('app.services.solana_service.get_btc_usdc_price', return_value=60000.0)
-@patch('app.services.solana_service.get_sol_usdc_price', return_value=200.0)
+@patch('app.services.solana_service.get_price_snapshot', return_value={'bitcoin_usdc': 60000.0, 'solana_usdc': 200.0})
 @patch('app.services.solana_service.prepare_nft_metadata') # Mock the already tested metadata prep
 @patch('app.services.solana_service.get_user_public_key', return_value="TEST_USER_WALLET")
 @patch('app.services.solana_service.get_user_wallet_balance', return_value=1.0) # Sufficient balance
 def test_mint_qnft_orchestration(
-    mock_get_balance, mock_get_pub_key, mock_prepare_meta, mock_get_sol, mock_get_btc
+    mock_get_balance, mock_get_pub_key, mock_prepare_meta, mock_get_snapshot
 ):
     from app.services.solana_service import mint_qnft # Import here to use fresh mocks
     
@@ -115,8 +113,9 @@ def test_mint_qnft_orchestration(
     assert result['status'] == 'success'
     assert result['message'] == 'NFT Minted (Simulated)'
     assert 'transaction_id' in result
-    mock_get_btc.assert_called_once()
-    mock_get_sol.assert_called_once()
+    mock_get_snapshot.assert_called_once()
+    assert mock_prepare_meta.call_args.kwargs['btc_price'] == 60000.0
+    assert mock_prepare_meta.call_args.kwargs['sol_price'] == 200.0
     mock_prepare_meta.assert_called_once()
     mock_get_pub_key.assert_called_once()
     mock_get_balance.assert_called_once_with("TEST_USER_WALLET")
@@ -0,0 +1,106 @@
+import pytest
+import io
+import os
+# Adjust import path based on your project structure
+from app.services import storage_service
+from app.services.storage_service import LocalStorage, get_storage, get_storage_for_uri
+
+TEST_BUCKET = "qnft-test-bucket"
+
+@pytest.fixture(autouse=True)
+def reset_storage_instances():
+    """Ensures every test resolves fresh storage backends."""
+    storage_service._storage_instances.clear()
+    yield
+    storage_service._storage_instances.clear()
+
+def test_local_storage_roundtrip(tmp_path):
+    store = LocalStorage(str(tmp_path / "uploads"))
+    assert not store.exists("a.png")
+
+    path = store.save_fileobj("a.png", io.BytesIO(b"x" * 200_000))
+    assert path == os.path.join(str(tmp_path / "uploads"), "a.png")
+    assert store.exists("a.png")
+    assert b"".join(store.iter_chunks("a.png", chunk_size=64 * 1024)) == b"x" * 200_000
+
+    with store.local_copy("a.png") as local_path:
+        assert local_path == path # No copy needed for local files
+
+    with store.write_path("b.gif") as write_path:
+        with open(write_path, "wb") as f:
+            f.write(b"GIF89a")
+    assert store.exists("b.gif")
+    assert store.public_url("b.gif") is None
+
+    store.delete("a.png")
+    store.delete("a.png") # Deleting a missing object is not an error
+    assert not store.exists("a.png")
+
+def test_get_storage_defaults_to_local(tmp_path):
+    store = get_storage(str(tmp_path))
+    assert isinstance(store, LocalStorage)
+    assert get_storage(str(tmp_path)) is store # Cached per folder
+
+    store_for_uri, key = get_storage_for_uri(os.path.join(str(tmp_path), "final_x.gif"))
+    assert store_for_uri is store
+    assert key == "final_x.gif"
+
+
+# --- S3 backend, exercised against moto's in-process S3 stand-in ---
+
+@pytest.fixture
+def s3_client():
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=TEST_BUCKET)
+        yield client
+
+def test_s3_storage_roundtrip(s3_client, tmp_path):
+    store = storage_service.S3Storage(TEST_BUCKET, prefix="uploads/", client=s3_client)
+    assert not store.exists("a.png")
+
+    assert store.save_fileobj("a.png", io.BytesIO(b"image-bytes")) == f"s3://{TEST_BUCKET}/uploads/a.png"
+    assert store.exists("a.png")
+    assert b"".join(store.iter_chunks("a.png", chunk_size=4)) == b"image-bytes"
+
+    with store.local_copy("a.png") as local_path:
+        with open(local_path, "rb") as f:
+            assert f.read() == b"image-bytes"
+    assert not os.path.exists(local_path) # Temp download is cleaned up
+
+    assert TEST_BUCKET in store.public_url("a.png")
+    store.delete("a.png")
+    assert not store.exists("a.png")
+
+def test_s3_storage_large_gif_uses_multipart_upload(s3_client, tmp_path):
+    from boto3.s3.transfer import TransferConfig
+    five_mb = 5 * 1024 * 1024 # S3's minimum part size
+    store = storage_service.S3Storage(
+        TEST_BUCKET, prefix="generated_gifs/", client=s3_client,
+        transfer_config=TransferConfig(multipart_threshold=five_mb, multipart_chunksize=five_mb, max_concurrency=4)
+    )
+    payload = os.urandom(five_mb * 2 + 1024)
+
+    with store.write_path("final_big.gif") as write_path:
+        with open(write_path, "wb") as f:
+            f.write(payload)
+
+    head = s3_client.head_object(Bucket=TEST_BUCKET, Key="generated_gifs/final_big.gif")
+    assert head["ContentType"] == "image/gif"
+    assert head["ETag"].strip('"').endswith("-3") # Multipart ETags carry the part count
+    assert b"".join(store.iter_chunks("final_big.gif")) == payload
+
+def test_get_storage_s3_uses_folder_name_as_prefix(s3_client, monkeypatch):
+    monkeypatch.setattr(storage_service, "STORAGE_BACKEND", "s3")
+    monkeypatch.setattr(storage_service, "S3_BUCKET", TEST_BUCKET)
+    monkeypatch.setattr(storage_service, "_s3_client", s3_client)
+
+    store = get_storage("/srv/qnft/app/static/generated_gifs")
+    assert isinstance(store, storage_service.S3Storage)
+    assert store.uri("final_x.gif") == f"s3://{TEST_BUCKET}/generated_gifs/final_x.gif"
+
+    store_for_uri, key = get_storage_for_uri(f"s3://{TEST_BUCKET}/generated_gifs/final_x.gif")
+    assert store_for_uri.bucket == TEST_BUCKET
+    assert key == "generated_gifs/final_x.gif"
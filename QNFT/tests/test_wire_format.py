@@ -0,0 +1,43 @@
+import json
+import struct
+import numpy as np
+# Adjust import path based on your project structure
+from app.utils.wire_format import columnar_records, delta_series, columnar_chart, binary_chart, HEADER_LENGTH
+
+CHART = {
+    'price_history': [[1_700_000_000_000, 150.5], [1_700_000_060_000, 151.0], [1_700_000_120_500, 149.25]],
+    'nft_events': [{'id': 'a', 'timestamp': 1_700_000_030_000, 'chart_price': 150.5}, {'id': 'b', 'timestamp': 1_700_000_100_000}],
+    'resolution': 'raw'
+}
+
+def test_columnar_records_keep_every_key_once():
+    records = [{'id': 'a', 'price': 1.0}, {'id': 'b', 'owner': 'w'}]
+    assert columnar_records(records) == {'count': 2, 'columns': {'id': ['a', 'b'], 'price': [1.0, None], 'owner': [None, 'w']}}
+    assert columnar_records([]) == {'count': 0, 'columns': {}}
+
+def test_delta_series_round_trips():
+    encoded = delta_series(CHART['price_history'])
+    assert encoded == {'t0': 1_700_000_000_000, 'dt': [60_000, 60_500], 'values': [150.5, 151.0, 149.25]}
+    timestamps = np.cumsum([encoded['t0']] + encoded['dt']).tolist()
+    assert [list(point) for point in zip(timestamps, encoded['values'])] == CHART['price_history']
+    assert delta_series([]) == {'t0': None, 'dt': [], 'values': []}
+
+def test_columnar_chart_is_smaller_than_json():
+    columnar = columnar_chart(CHART)
+    assert columnar['resolution'] == 'raw' and columnar['nft_events']['columns']['id'] == ['a', 'b']
+    day = dict(CHART, price_history=[[1_700_000_000_000 + i * 60_000, 150.0 + i % 7] for i in range(1440)])
+    assert len(json.dumps(columnar_chart(day))) < 0.7 * len(json.dumps(day))
+
+def test_binary_chart_layout():
+    body = binary_chart(CHART)
+    (header_length,) = HEADER_LENGTH.unpack_from(body)
+    offset = HEADER_LENGTH.size + header_length
+    assert offset % 8 == 0 # The arrays can be read in place as Float64Arrays
+    header = json.loads(body[HEADER_LENGTH.size:offset])
+    assert header == {'nft_events': CHART['nft_events'], 'resolution': 'raw', 'count': 3}
+    timestamps = np.frombuffer(body, dtype='<f8', count=3, offset=offset)
+    prices = np.frombuffer(body, dtype='<f8', count=3, offset=offset + 24)
+    assert timestamps.astype(np.int64).tolist() == [point[0] for point in CHART['price_history']]
+    assert prices.tolist() == [point[1] for point in CHART['price_history']]
+    assert len(body) == offset + 48
+    assert struct.unpack_from('<I', binary_chart(dict(CHART, price_history=[])))[0] % 8 == 4 # Empty series: header only